@@ -0,0 +1,102 @@
+"""Measure single-stream download throughput across chunk sizes.
+
+A fake IPFS API (the one used by the tests) serves an in-memory blob, so
+the numbers reflect the Python overhead of the download path rather than
+a real daemon. Two paths are measured for each chunk size:
+
+- `client`: iterating `IPFSClient.cat_stream` directly.
+- `app`: a full `/download_raw` through the Flask app on a local WSGI server.
+
+    python benchmarks/bench_download_throughput.py --size-mb 512 --chunk-kb 8 64 1024 4096 --output results.json
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+os.environ.setdefault('CACHE_MAX_BYTES', '0')
+os.environ.setdefault('ZIP_CACHE_MAX_BYTES', '0')
+os.environ.setdefault('METADATA_DB', ':memory:')
+
+import requests
+from flask import Flask
+from werkzeug.serving import make_server
+from fake_ipfs import FakeIPFSServer
+from api import routes
+from api.ipfs_client import IPFSClient
+
+def measure(consume, size):
+    start_time = time.perf_counter()
+    first_byte = None
+    chunks = 0
+    received = 0
+    for chunk in consume():
+        if first_byte is None:
+            first_byte = time.perf_counter() - start_time
+        chunks += 1
+        received += len(chunk)
+    elapsed = time.perf_counter() - start_time
+    assert received == size, f"received {received} of {size} bytes"
+    return {
+        "seconds": elapsed,
+        "ttfb_seconds": first_byte,
+        "chunks": chunks,
+        "mb_per_second": size / elapsed / (1024 * 1024),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=512)
+    parser.add_argument('--chunk-kb', type=int, nargs='+', default=[8, 64, 256, 1024, 4096])
+    parser.add_argument('--paths', nargs='+', default=['client', 'app'], choices=['client', 'app'])
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement; the fastest is kept")
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    size = args.size_mb * 1024 * 1024
+    ipfs = FakeIPFSServer().start()
+    cid = ipfs.put(os.urandom(1024 * 1024) * args.size_mb)
+    client = IPFSClient(base_url=ipfs.base_url)
+
+    routes.ipfs_client = client
+    app = Flask(__name__)
+    app.register_blueprint(routes.bp)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app_url = f'http://127.0.0.1:{server.server_port}/download_raw?cid={cid}'
+    session = requests.Session()
+
+    results = []
+    try:
+        for chunk_kb in args.chunk_kb:
+            chunk_size = chunk_kb * 1024
+            # The route reads with the client's default chunk size, so pin it per run
+            client.cat_stream = functools.partial(IPFSClient.cat_stream, client, chunk_size=chunk_size)
+            for path in args.paths:
+                if path == 'client':
+                    consume = lambda: client.cat_stream(cid)
+                else:
+                    consume = lambda: session.get(app_url, stream=True).iter_content(chunk_size)
+                result = min((measure(consume, size) for _ in range(args.repeat)), key=lambda r: r['seconds'])
+                result.update({"path": path, "chunk_kb": chunk_kb, "size_mb": args.size_mb})
+                results.append(result)
+                print(f"{path:<7} {chunk_kb:>6} KB  {result['mb_per_second']:9.1f} MB/s  "
+                      f"{result['chunks']:>8} chunks  TTFB {result['ttfb_seconds'] * 1000:7.2f} ms")
+    finally:
+        server.shutdown()
+        ipfs.stop()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Compare IPFS add time and sequential cat throughput across DAG layouts.
+
+Unlike the other benchmarks this needs a real Kubo daemon, since the DAG
+layout only matters to how the daemon chunks, hashes and links blocks. The
+API defaults to IPFS_HOST:IPFS_PORT, as for the service. For every layout
+and file size a file of random bytes is written to a temporary directory,
+then:
+
+- `add`: streamed to `/add` with `IPFSClient.add_stream`, as uploads are.
+- `cat`: read back in full with `IPFSClient.cat_stream`, as downloads are.
+
+The best of `--repeat` runs is kept. Every run adds new random content, so
+the daemon cannot answer from blocks it already has. Added content is
+pinned; run `ipfs pin ls` / `ipfs repo gc` on a scratch node to reclaim it.
+
+    python benchmarks/bench_ingest.py --sizes-mb 64 1024 --layouts default raw-1mib trickle-1mib --output results.json
+
+Pass `--fake` to smoke-test the script against the in-process fake API;
+its numbers say nothing about layouts.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+from api.ipfs_client import AddOptions, IPFSClient, KUBO_ADD_OPTIONS, default_api_url
+
+MB = 1024 * 1024
+
+LAYOUTS = {
+    'default': KUBO_ADD_OPTIONS,
+    'raw-256k': AddOptions('size-262144', True, 1, 'sha2-256', False),
+    'raw-1mib': AddOptions('size-1048576', True, 1, 'sha2-256', False),
+    'trickle-1mib': AddOptions('size-1048576', True, 1, 'sha2-256', True),
+    'blake3-1mib': AddOptions('size-1048576', True, 1, 'blake3', False),
+    'buzhash': AddOptions('buzhash', True, 1, 'sha2-256', False),
+}
+
+def write_random_file(directory, size):
+    path = os.path.join(directory, f'{time.time_ns()}.bin')
+    with open(path, 'wb') as f:
+        for _ in range(size // MB):
+            f.write(os.urandom(MB))
+        f.write(os.urandom(size % MB))
+    return path
+
+def measure(client, directory, size, options):
+    path = write_random_file(directory, size)
+    try:
+        start_time = time.perf_counter()
+        with open(path, 'rb') as f:
+            cid = client.add_stream(f, options=options)
+        add_seconds = time.perf_counter() - start_time
+    finally:
+        os.unlink(path)
+
+    start_time = time.perf_counter()
+    received = sum(len(chunk) for chunk in client.cat_stream(cid))
+    cat_seconds = time.perf_counter() - start_time
+    assert received == size, f"read {received} of {size} bytes of {cid}"
+    return {"cid": cid, "add_seconds": add_seconds, "cat_seconds": cat_seconds}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--api', default=None, help="IPFS API URL, e.g. http://localhost:5001/api/v0")
+    parser.add_argument('--sizes-mb', type=int, nargs='+', default=[64, 512])
+    parser.add_argument('--layouts', nargs='+', default=list(LAYOUTS), choices=list(LAYOUTS))
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement; the fastest is kept")
+    parser.add_argument('--fake', action='store_true', help="Run against the fake IPFS API used by the tests")
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    logging.getLogger('api').setLevel(logging.WARNING)
+    ipfs = None
+    if args.fake:
+        from fake_ipfs import FakeIPFSServer
+        ipfs = FakeIPFSServer().start()
+        api_url = ipfs.base_url
+    else:
+        api_url = args.api or default_api_url()
+    client = IPFSClient(base_url=api_url)
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for size_mb in args.sizes_mb:
+                size = size_mb * MB
+                for name in args.layouts:
+                    runs = [measure(client, directory, size, LAYOUTS[name]) for _ in range(args.repeat)]
+                    add_seconds = min(run['add_seconds'] for run in runs)
+                    cat_seconds = min(run['cat_seconds'] for run in runs)
+                    result = {
+                        "layout": name,
+                        "options": LAYOUTS[name].to_dict(),
+                        "size_mb": size_mb,
+                        "add_seconds": add_seconds,
+                        "add_mb_per_second": size_mb / add_seconds,
+                        "cat_seconds": cat_seconds,
+                        "cat_mb_per_second": size_mb / cat_seconds,
+                        "cids": [run['cid'] for run in runs],
+                    }
+                    results.append(result)
+                    print(f"{name:<13} {size_mb:>6} MB  add {result['add_mb_per_second']:8.1f} MB/s  "
+                          f"cat {result['cat_mb_per_second']:8.1f} MB/s")
+    finally:
+        if ipfs is not None:
+            ipfs.stop()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
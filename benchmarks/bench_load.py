@@ -0,0 +1,262 @@
+"""Load test upload, download and zip throughput against an in-process app.
+
+The Flask app runs on a local threaded WSGI server and talks to the fake
+IPFS API used by the tests, so nothing outside this process is needed and
+runs are reproducible. For every scenario, file size and concurrency level
+a fixed number of requests is sent and the script reports:
+
+- throughput (MB/s of payload) and requests per second
+- p50/p99 latency and time to first byte
+- peak RSS of the whole process during the run, and its growth over the
+  RSS before the run. The fake IPFS server keeps downloaded content in
+  memory, so the growth is the better signal for regressions.
+
+Scenarios:
+
+- `upload`: `POST /upload` with a streamed multipart body.
+- `download`: `GET /download_raw` of a stored blob.
+- `zip`: `POST /download_zip` of `--zip-files` blobs.
+
+    python benchmarks/bench_load.py --sizes-mb 1 64 --concurrency 1 8 --output results.json
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+os.environ.setdefault('CACHE_MAX_BYTES', '0')
+os.environ.setdefault('ZIP_CACHE_MAX_BYTES', '0')
+os.environ.setdefault('METADATA_DB', ':memory:')
+
+import requests
+from flask import Flask
+from werkzeug.serving import make_server
+from fake_ipfs import FakeIPFSServer
+from api import routes
+from api.ipfs_client import IPFSClient, multipart_body
+
+MB = 1024 * 1024
+READ_CHUNK = 1024 * 1024
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+def current_rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * PAGE_SIZE
+
+class RSSSampler:
+    """Tracks the peak RSS of this process while a scenario runs.
+
+    Falls back to the process-lifetime peak from `getrusage` where
+    `/proc` is not available.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while True:
+            self.peak = max(self.peak, current_rss())
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self):
+        try:
+            self.baseline = current_rss()
+        except OSError:
+            self.baseline = None
+            return self
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.baseline is None:
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            return
+        self._stop.set()
+        self._thread.join()
+
+class RepeatingBody:
+    """A file-like request body of `size` bytes built by repeating `block`.
+
+    Having a length lets requests send it with a Content-Length instead of
+    chunked encoding, without holding the whole body in memory.
+    """
+
+    def __init__(self, block, size, filename):
+        boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self._parts = multipart_body(self._chunks(block, size), boundary, filename)
+        head, tail = next(multipart_body([], boundary, filename)), f'\r\n--{boundary}--\r\n'.encode()
+        self._length = len(head) + size + len(tail)
+        self._buffer = b''
+
+    @staticmethod
+    def _chunks(block, size):
+        while size > 0:
+            chunk = block[:size]
+            size -= len(chunk)
+            yield chunk
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            part = next(self._parts, None)
+            if part is None:
+                break
+            self._buffer += part
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+def timed_request(session, method, url, **kwargs):
+    """Send a request and drain its body; returns (latency, ttfb, bytes received, status)."""
+    start_time = time.perf_counter()
+    first_byte = None
+    received = 0
+    with session.request(method, url, stream=True, **kwargs) as response:
+        for chunk in response.iter_content(READ_CHUNK):
+            if first_byte is None:
+                first_byte = time.perf_counter() - start_time
+            received += len(chunk)
+        status = response.status_code
+    latency = time.perf_counter() - start_time
+    return latency, first_byte if first_byte is not None else latency, received, status
+
+class Scenarios:
+    def __init__(self, app_url, ipfs, block, zip_files):
+        self.app_url = app_url
+        self.ipfs = ipfs
+        self.block = block
+        self.zip_files = zip_files
+        self._stored = {}
+
+    def _stored_cids(self, size, count):
+        """CIDs of `count` distinct blobs of `size` bytes, stored once per size."""
+        cids = self._stored.setdefault(size, [])
+        while len(cids) < count:
+            prefix = len(cids).to_bytes(8, 'big')
+            cids.append(self.ipfs.put(prefix + (self.block * (size // len(self.block) + 1))[:size - len(prefix)]))
+        return cids
+
+    def prepare(self, name, size):
+        """Return a function that sends one request and the payload bytes it moves."""
+        if name == 'upload':
+            url = f'{self.app_url}/upload'
+
+            def send(session):
+                body = RepeatingBody(self.block, size, 'model.bin')
+                return timed_request(session, 'POST', url, data=body, headers={'Content-Type': body.content_type})
+            return send, size
+
+        if name == 'download':
+            url = f'{self.app_url}/download_raw?cid={self._stored_cids(size, 1)[0]}'
+            return lambda session: timed_request(session, 'GET', url), size
+
+        files = {f'file{index}.bin': cid for index, cid in enumerate(self._stored_cids(size, self.zip_files))}
+        url = f'{self.app_url}/download_zip'
+        return lambda session: timed_request(session, 'POST', url, json={'files': files}), size * self.zip_files
+
+def run_scenario(send, concurrency, count):
+    local = threading.local()
+
+    def one(_):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return send(local.session)
+
+    with RSSSampler() as rss, ThreadPoolExecutor(concurrency) as executor:
+        start_time = time.perf_counter()
+        results = list(executor.map(one, range(count)))
+        elapsed = time.perf_counter() - start_time
+    return results, elapsed, rss
+
+def summarize(results, elapsed, rss, payload_bytes):
+    latencies = [latency for latency, _, _, status in results if status == 200]
+    ttfbs = [ttfb for _, ttfb, _, status in results if status == 200]
+    ok = len(latencies)
+    summary = {
+        "requests": len(results),
+        "errors": len(results) - ok,
+        "seconds": elapsed,
+        "requests_per_second": ok / elapsed,
+        "mb_per_second": ok * payload_bytes / elapsed / MB,
+        "bytes_received": sum(received for _, _, received, _ in results),
+        "peak_rss_mb": rss.peak / MB,
+        "rss_growth_mb": (rss.peak - rss.baseline) / MB if rss.baseline is not None else None,
+    }
+    if ok:
+        summary.update({
+            "latency_p50_seconds": percentile(latencies, 0.5),
+            "latency_p99_seconds": percentile(latencies, 0.99),
+            "ttfb_p50_seconds": percentile(ttfbs, 0.5),
+            "ttfb_p99_seconds": percentile(ttfbs, 0.99),
+        })
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', default=['upload', 'download', 'zip'], choices=['upload', 'download', 'zip'])
+    parser.add_argument('--sizes-mb', type=int, nargs='+', default=[1, 16, 128])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=16, help="Requests per measurement")
+    parser.add_argument('--zip-files', type=int, default=4, help="Files per zip download")
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    logging.getLogger('api').setLevel(logging.WARNING)
+    # Uploaded content is only counted, so uploads do not grow the fake server's memory
+    ipfs = FakeIPFSServer(store_content=False).start()
+    routes.ipfs_client = IPFSClient(base_url=ipfs.base_url)
+    app = Flask(__name__)
+    app.register_blueprint(routes.bp)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    scenarios = Scenarios(f'http://127.0.0.1:{server.server_port}', ipfs, os.urandom(MB), args.zip_files)
+
+    results = []
+    try:
+        for name in args.scenarios:
+            for size_mb in args.sizes_mb:
+                send, payload_bytes = scenarios.prepare(name, size_mb * MB)
+                for concurrency in args.concurrency:
+                    result = summarize(*run_scenario(send, concurrency, args.requests), payload_bytes)
+                    result.update({"scenario": name, "size_mb": size_mb, "concurrency": concurrency})
+                    results.append(result)
+                    p50 = result.get('latency_p50_seconds', float('nan')) * 1000
+                    p99 = result.get('latency_p99_seconds', float('nan')) * 1000
+                    ttfb = result.get('ttfb_p50_seconds', float('nan')) * 1000
+                    print(f"{name:<8} {size_mb:>6} MB  x{concurrency:<3} {result['mb_per_second']:9.1f} MB/s  "
+                          f"p50 {p50:8.1f} ms  p99 {p99:8.1f} ms  TTFB {ttfb:7.1f} ms  "
+                          f"RSS {result['peak_rss_mb']:7.1f} MB  errors {result['errors']}")
+    finally:
+        server.shutdown()
+        ipfs.stop()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Compare lightweight ONNX signature parsing against building an onnxruntime session.
+
+Each (size, method) pair runs in a fresh subprocess so peak RSS is measured
+in isolation. Models are written straight to disk with a single large
+initializer, so multi-GB models can be generated without holding them in
+memory. Protobuf caps a single-file model at 2 GB, which is also the
+largest model onnxruntime can load this way.
+
+    python benchmarks/bench_onnx_inspection.py --sizes-mb 1 64 1024 --output results.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from onnx import helper, TensorProto
+
+COLUMNS = 1024
+
+def encode_varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def length_delimited_header(field, length):
+    return encode_varint(field << 3 | 2) + encode_varint(length)
+
+def write_model(path, size_mb):
+    """Write a MatMul model whose weight tensor makes it roughly `size_mb` MB."""
+    rows = max(1, size_mb * 1024 * 1024 // (4 * COLUMNS))
+    raw_length = rows * COLUMNS * 4
+
+    graph = helper.make_graph(
+        [helper.make_node('MatMul', ['X', 'W'], ['Y'])],
+        'benchmark',
+        [helper.make_tensor_value_info('X', TensorProto.FLOAT, ['batch', rows])],
+        [helper.make_tensor_value_info('Y', TensorProto.FLOAT, ['batch', COLUMNS])],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 17)], producer_name='benchmark')
+    model.ir_version = 8
+    graph_bytes = graph.SerializeToString()
+    model.ClearField('graph')
+    model_bytes = model.SerializeToString()
+
+    tensor_header = (
+        encode_varint(1 << 3) + encode_varint(rows)
+        + encode_varint(1 << 3) + encode_varint(COLUMNS)
+        + encode_varint(2 << 3) + encode_varint(TensorProto.FLOAT)
+        + length_delimited_header(8, 1) + b'W'
+        + length_delimited_header(9, raw_length)
+    )
+    initializer_header = length_delimited_header(5, len(tensor_header) + raw_length) + tensor_header
+    graph_length = len(graph_bytes) + len(initializer_header) + raw_length
+
+    with open(path, 'wb') as f:
+        f.write(model_bytes)
+        f.write(length_delimited_header(7, graph_length))
+        f.write(graph_bytes)
+        f.write(initializer_header)
+        chunk = bytes(16 * 1024 * 1024)
+        remaining = raw_length
+        while remaining:
+            f.write(chunk[:min(len(chunk), remaining)])
+            remaining -= min(len(chunk), remaining)
+    return os.path.getsize(path)
+
+def inspect(method, path):
+    """Run one inspection in this process and return its timing and peak RSS."""
+    start_time = time.time()
+    if method == 'lazy':
+        from api.onnx_metadata import read_onnx_signature_from_file
+        with open(path, 'rb') as f:
+            signature = read_onnx_signature_from_file(f)
+        inputs = signature['input_types']
+    else:
+        import onnxruntime as ort
+        with open(path, 'rb') as f:
+            session = ort.InferenceSession(f.read())
+        inputs = [{"name": i.name, "type": i.type, "shape": i.shape} for i in session.get_inputs()]
+    elapsed = time.time() - start_time
+    return {
+        "method": method,
+        "seconds": elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "inputs": inputs,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes-mb', type=int, nargs='+', default=[1, 64, 1024])
+    parser.add_argument('--methods', nargs='+', default=['lazy', 'session'], choices=['lazy', 'session'])
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    parser.add_argument('--inspect', nargs=2, metavar=('METHOD', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.inspect:
+        print(json.dumps(inspect(*args.inspect)))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size_mb in args.sizes_mb:
+            path = os.path.join(temp_dir, f'model_{size_mb}MB.onnx')
+            file_size = write_model(path, size_mb)
+            for method in args.methods:
+                output = subprocess.run(
+                    [sys.executable, __file__, '--inspect', method, path],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                result.update({"size_mb": size_mb, "file_size": file_size})
+                results.append(result)
+                print(f"{size_mb:>6} MB  {method:<8} {result['seconds']:8.3f} s  peak RSS {result['peak_rss_mb']:8.1f} MB")
+            os.remove(path)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""Admission control: per-client token buckets for request rate and
+bandwidth, and a bounded queue in front of large transfers.
+"""
+import logging
+import math
+import threading
+import time
+from config.model_config import (
+    RATE_LIMIT_REQUESTS_PER_SECOND, RATE_LIMIT_REQUEST_BURST, RATE_LIMIT_BYTES_PER_SECOND, RATE_LIMIT_BYTES_BURST,
+    RATE_LIMIT_EXEMPT, RATE_LIMIT_API_KEYS, TRANSFER_SLOTS, TRANSFER_QUEUE_SIZE, TRANSFER_QUEUE_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+# Above this many tracked clients, clients whose buckets have refilled are forgotten
+MAX_TRACKED_CLIENTS = 10000
+
+class TokenBucket:
+    """Holds up to `burst` tokens, refilled at `rate` tokens per second."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        # Called with the lock held
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self, amount=1):
+        """Take `amount` tokens if they are available; returns 0, or the seconds until they will be."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate
+
+    def consume(self, amount):
+        """Take `amount` tokens even if that leaves the bucket in debt.
+
+        Returns the seconds the caller should wait for the debt to be paid
+        back, which is how bandwidth is shaped without rejecting anything.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+    @property
+    def full(self):
+        with self._lock:
+            self._refill()
+            return self._tokens >= self.burst
+
+class TransferSlots:
+    """Lets `slots` transfers run at once, with at most `queue_size` more waiting for a slot."""
+
+    def __init__(self, slots, queue_size, timeout):
+        self.slots = slots
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._active = 0
+        self._waiting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if needed; returns False if the queue is full or the wait timed out."""
+        with self._condition:
+            if self._active >= self.slots:
+                if self._waiting >= self.queue_size:
+                    return False
+                self._waiting += 1
+                try:
+                    if not self._condition.wait_for(lambda: self._active < self.slots, self.timeout):
+                        return False
+                finally:
+                    self._waiting -= 1
+            self._active += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+
+    def status(self):
+        with self._condition:
+            return {"slots": self.slots, "active": self._active, "waiting": self._waiting}
+
+class ShapedStream:
+    """Wraps `wsgi.input` so reading the request body draws from a byte bucket."""
+
+    def __init__(self, stream, bucket):
+        self._stream = stream
+        self._bucket = bucket
+
+    def _charge(self, data):
+        self._pace(len(data))
+        return data
+
+    def _pace(self, length):
+        delay = self._bucket.consume(length)
+        if delay:
+            time.sleep(delay)
+
+    def read(self, *args):
+        return self._charge(self._stream.read(*args))
+
+    def readline(self, *args):
+        return self._charge(self._stream.readline(*args))
+
+    def readinto(self, buffer):
+        # Werkzeug's LimitedStream reads the body through readinto when it can
+        length = self._stream.readinto(buffer)
+        self._pace(length or 0)
+        return length
+
+    def __iter__(self):
+        for line in self._stream:
+            yield self._charge(line)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+class ShapedBody:
+    """Response iterable that paces its chunks to what a byte bucket allows."""
+
+    def __init__(self, body, bucket):
+        self._body = body
+        self._bucket = bucket
+
+    def __iter__(self):
+        for chunk in self._body:
+            delay = self._bucket.consume(len(chunk))
+            if delay:
+                time.sleep(delay)
+            yield chunk
+
+    def close(self):
+        if hasattr(self._body, 'close'):
+            self._body.close()
+
+class Client:
+    def __init__(self, request_bucket, byte_bucket):
+        self.request_bucket = request_bucket
+        self.byte_bucket = byte_bucket
+
+class AdmissionController:
+    """Decides which requests to serve, and how fast, per client.
+
+    Each client has a request bucket, checked when a request arrives, and
+    a byte bucket that request and response bodies are paced by, so a
+    bulk downloader is slowed down on its own instead of starving others.
+    Transfers additionally need one of the shared `TransferSlots`. A rate
+    of 0 disables that limit, as does 0 transfer slots.
+
+    Clients are told apart by API key only for the configured `api_keys`
+    and exempt `key:` entries. Any other key is ignored, so a client cannot
+    get fresh buckets, or an exemption, by making keys up.
+    """
+
+    def __init__(
+        self,
+        request_rate=RATE_LIMIT_REQUESTS_PER_SECOND, request_burst=RATE_LIMIT_REQUEST_BURST,
+        byte_rate=RATE_LIMIT_BYTES_PER_SECOND, byte_burst=RATE_LIMIT_BYTES_BURST,
+        transfer_slots=TRANSFER_SLOTS, queue_size=TRANSFER_QUEUE_SIZE, queue_timeout=TRANSFER_QUEUE_TIMEOUT,
+        exempt=tuple(client.strip() for client in RATE_LIMIT_EXEMPT.split(',') if client.strip()),
+        api_keys=tuple(key.strip() for key in RATE_LIMIT_API_KEYS.split(',') if key.strip()),
+    ):
+        self.request_rate = request_rate
+        self.request_burst = request_burst
+        self.byte_rate = byte_rate
+        self.byte_burst = byte_burst
+        self.exempt = frozenset(exempt)
+        self.api_keys = frozenset(api_keys) | {client[4:] for client in self.exempt if client.startswith('key:')}
+        self.transfers = TransferSlots(transfer_slots, queue_size, queue_timeout) if transfer_slots > 0 else None
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.request_rate > 0 or self.byte_rate > 0 or self.transfers is not None
+
+    def reserve_threads(self, threads):
+        """Shrink the transfer queue so running and queued transfers leave one of `threads` free.
+
+        Queued transfers wait on a request thread, so without this a queue
+        of downloads could leave none for cheap endpoints like `/metrics`.
+        """
+        if self.transfers is None:
+            return
+        queue_size = max(0, min(self.transfers.queue_size, threads - self.transfers.slots - 1))
+        if queue_size < self.transfers.queue_size:
+            logger.warning(
+                f"Limiting the transfer queue to {queue_size}: {self.transfers.slots} slots "
+                f"and {self.transfers.queue_size} queued transfers would use all {threads} threads"
+            )
+            self.transfers.queue_size = queue_size
+
+    def identify(self, api_key, address):
+        """The client id of a request: its API key if that is configured, else its address."""
+        return f'key:{api_key}' if api_key in self.api_keys else address
+
+    def client(self, client_id):
+        """The buckets of `client_id`, or None if it is exempt."""
+        if client_id in self.exempt:
+            return None
+        with self._lock:
+            client = self._clients.get(client_id)
+            if client is None:
+                if len(self._clients) >= MAX_TRACKED_CLIENTS:
+                    self._forget_idle_clients()
+                client = self._clients[client_id] = Client(
+                    TokenBucket(self.request_rate, self.request_burst) if self.request_rate > 0 else None,
+                    TokenBucket(self.byte_rate, self.byte_burst) if self.byte_rate > 0 else None,
+                )
+            return client
+
+    def _forget_idle_clients(self):
+        # Called with the lock held; a client with full buckets is the same as a new one
+        for client_id, client in list(self._clients.items()):
+            buckets = [bucket for bucket in (client.request_bucket, client.byte_bucket) if bucket is not None]
+            if all(bucket.full for bucket in buckets):
+                del self._clients[client_id]
+
+    def admit(self, client):
+        """Take a token from the client's request bucket; returns 0, or the seconds to retry after."""
+        if client is None or client.request_bucket is None:
+            return 0
+        return client.request_bucket.try_take()
+
+    def status(self):
+        with self._lock:
+            clients = len(self._clients)
+        return {
+            "clients": clients,
+            "requests_per_second": self.request_rate,
+            "bytes_per_second": self.byte_rate,
+            "transfers": self.transfers.status() if self.transfers is not None else None,
+        }
+
+def retry_after(seconds):
+    """Format a wait as a Retry-After value in whole seconds."""
+    return str(max(1, math.ceil(seconds)))
@@ -0,0 +1,75 @@
+import logging
+import time
+import uuid
+import httpx
+from api.ipfs_client import AddOptions, cat_params, default_api_url, ls_file_size
+from config.model_config import ASYNC_IPFS_MAX_CONNECTIONS, DOWNLOAD_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+async def multipart_body(chunks, boundary, filename='filename'):
+    """Async counterpart of `ipfs_client.multipart_body` for an async chunk iterator."""
+    yield (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        'Content-Type: application/octet-stream\r\n\r\n'
+    ).encode()
+    async for chunk in chunks:
+        if chunk:
+            yield chunk
+    yield f'\r\n--{boundary}--\r\n'.encode()
+
+class AsyncIPFSClient:
+    """Non-blocking IPFS API client for the ASGI app.
+
+    All requests share one pooled `httpx.AsyncClient`, so a long download
+    only holds a connection, not a thread. Reads have no timeout because
+    streams of large models legitimately stay open for a long time.
+    """
+
+    def __init__(self, base_url=None, max_connections=ASYNC_IPFS_MAX_CONNECTIONS):
+        self.base_url = base_url or default_api_url()
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(None, connect=10.0),
+        )
+        logging.info(f"Async IPFS Client initialized with base URL: {self.base_url}")
+
+    async def add_stream(self, chunks, options=None):
+        """Add an async iterable of byte chunks to IPFS with chunked transfer encoding, in the DAG layout `options`."""
+        start_time = time.time()
+        boundary = uuid.uuid4().hex
+        response = await self.client.post(
+            f'{self.base_url}/add',
+            content=multipart_body(chunks, boundary),
+            headers={'Content-Type': f'multipart/form-data; boundary={boundary}'},
+            params={'stream-channels': 'true', 'progress': 'false', **(options or AddOptions()).params()},
+        )
+        response.raise_for_status()
+
+        final_cid = response.json().get('Hash')
+        if final_cid is None:
+            raise Exception("No CID received from IPFS")
+
+        logger.info(f"File upload completed. CID: {final_cid}, Time: {time.time() - start_time:.2f} seconds")
+        return final_cid
+
+    async def cat(self, cid, offset=None, length=None):
+        response = await self.client.post(f'{self.base_url}/cat', params=cat_params(cid, offset, length))
+        response.raise_for_status()
+        return response.content
+
+    async def cat_stream(self, cid, offset=None, length=None, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """Yield the content of a CID as it arrives, releasing the connection when done."""
+        async with self.client.stream('POST', f'{self.base_url}/cat', params=cat_params(cid, offset, length)) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(chunk_size):
+                yield chunk
+
+    async def get_file_size(self, cid):
+        response = await self.client.post(f'{self.base_url}/ls', params={'arg': f'/ipfs/{cid}'})
+        response.raise_for_status()
+        return ls_file_size(response.json())
+
+    async def aclose(self):
+        await self.client.aclose()
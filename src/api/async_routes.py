@@ -0,0 +1,362 @@
+"""ASGI (Starlette) variant of the storage API.
+
+Serves the same `/upload`, `/download`, `/download_raw`, `/get_file_size`
+and `/download_zip` contract as the Flask blueprint, but IPFS traffic goes
+through `AsyncIPFSClient`, so a slow stream holds a connection rather than
+a worker thread.
+"""
+import logging
+import os
+import time
+import anyio
+from http import HTTPStatus
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_if_range_header, parse_options_header, parse_range_header
+from api.async_ipfs_client import AsyncIPFSClient
+from api.ipfs_client import AddOptions
+from api.cache import CIDCache, iter_file_range
+from api.metadata import MetadataStore
+from api.onnx_metadata import read_onnx_signature
+from api.onnx_tensors import (
+    MANIFEST_MAX_BYTES, NotAManifest, TensorData, parse_manifest, piece_ranges, pieces_length, reassembly_pieces,
+)
+from api.prefetch import AsyncCIDPrefetcher
+from api.streaming import AsyncStreamingUpload
+from api.zip_stream import astream_zip, parse_zip_request, ZIP_COMPRESSION_MODES
+from config.model_config import ZIP_COMPRESSION
+
+MAX_FILE_SIZE = 10 * 1024 * 1024 * 1024  # 10GB
+
+logger = logging.getLogger(__name__)
+
+ipfs_client = AsyncIPFSClient()
+cid_cache = CIDCache()
+metadata_store = MetadataStore()
+
+class RangeNotSatisfiable(Exception):
+    def __init__(self, file_size):
+        super().__init__(f"Range not satisfiable for {file_size} bytes")
+        self.file_size = file_size
+
+def is_stream_requested(request):
+    return request.query_params.get('stream', '').lower() == 'true'
+
+async def cid_file_size(cid):
+    """Return the size of a CID, asking IPFS only the first time it is looked up."""
+    metadata = metadata_store.get(cid)
+    if metadata is not None and metadata['size'] is not None:
+        return metadata['size']
+    file_size = await ipfs_client.get_file_size(cid)
+    metadata_store.put(cid, size=file_size)
+    return file_size
+
+def requested_range(request, file_cid, file_size):
+    """Return the (start, stop) bounds of a single-range request, with the same rules as the Flask app."""
+    byte_range = parse_range_header(request.headers.get('Range'))
+    if byte_range is None or file_size == 0:
+        return None
+    if 'If-Range' in request.headers:
+        if_range = parse_if_range_header(request.headers['If-Range'])
+        if if_range.date is not None or if_range.etag != file_cid:
+            return None
+    if byte_range.units != 'bytes' or len(byte_range.ranges) != 1:
+        return None
+    bounds = byte_range.range_for_length(file_size)
+    if bounds is None:
+        raise RangeNotSatisfiable(file_size)
+    return bounds
+
+def range_not_satisfiable(e):
+    return PlainTextResponse(
+        'Requested Range Not Satisfiable',
+        status_code=HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE,
+        headers={'Content-Range': f'bytes */{e.file_size}'},
+    )
+
+def download_response(body, file_cid, file_size=None, bounds=None, headers=None):
+    """Build a streaming download response with the CID as ETag, as a 206 if `bounds` is set."""
+    headers = dict(headers or {})
+    headers['ETag'] = f'"{file_cid}"'
+    headers['Accept-Ranges'] = 'bytes'
+    status_code = HTTPStatus.OK
+    if bounds is not None:
+        start, stop = bounds
+        status_code = HTTPStatus.PARTIAL_CONTENT
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{file_size}'
+        headers['Content-Length'] = str(stop - start)
+    elif file_size is not None:
+        headers['Content-Length'] = str(file_size)
+    return StreamingResponse(body, status_code=status_code, media_type='application/octet-stream', headers=headers)
+
+def send_cached_file(request, file_cid, file, headers=None):
+    """Serve an open cache file; Starlette reads the sync iterator on its thread pool."""
+    file_size = os.fstat(file.fileno()).st_size
+    try:
+        bounds = requested_range(request, file_cid, file_size)
+    except RangeNotSatisfiable:
+        file.close()
+        raise
+    start, stop = bounds if bounds is not None else (0, file_size)
+    return download_response(iter_file_range(file, start, stop), file_cid, file_size, bounds, headers=headers)
+
+async def find_manifest(request, cid):
+    """Return the manifest if `cid` is a model stored in the tensors layout, with the same rules as the Flask app."""
+    manifest = metadata_store.get_manifest(cid)
+    if manifest is None and request.query_params.get('layout', '').lower() == 'tensors':
+        manifest = parse_manifest(cid, await ipfs_client.cat(cid, length=MANIFEST_MAX_BYTES + 1))
+        metadata_store.put_manifest(cid, manifest)
+    return manifest
+
+async def send_onnx_tensors(request, file_cid, manifest, headers=None):
+    """Serve a model stored in the tensors layout as a single `.onnx` file, streamed from its graph and tensors."""
+    graph = await ipfs_client.cat(manifest['graph'])
+    tensor_cids = {tensor['location']: tensor['cid'] for tensor in manifest['tensors']}
+    pieces = reassembly_pieces(graph, {tensor['location']: tensor['size'] for tensor in manifest['tensors']})
+    file_size = pieces_length(pieces)
+    bounds = requested_range(request, file_cid, file_size)
+    start, stop = bounds if bounds is not None else (0, file_size)
+    logger.info(f"Reassembling {file_cid} from {len(tensor_cids)} tensors")
+
+    async def generate():
+        for piece, low, high in piece_ranges(pieces, start, stop):
+            if not isinstance(piece, TensorData):
+                yield piece[low:high]
+            else:
+                async for chunk in ipfs_client.cat_stream(tensor_cids[piece.location], offset=low, length=high - low):
+                    yield chunk
+
+    return download_response(generate(), file_cid, file_size, bounds, headers=headers)
+
+async def read_onnx_signature_from_ipfs(cid, size):
+    """Parse an ONNX signature with ranged IPFS reads, running the parser on a worker thread."""
+    def read_at(offset, length):
+        return anyio.from_thread.run(ipfs_client.cat, cid, offset, length)
+    return await anyio.to_thread.run_sync(read_onnx_signature, read_at, size)
+
+async def upload(request):
+    start_time = time.time()
+    try:
+        add_options = AddOptions.from_params(request.query_params)
+    except ValueError as e:
+        return PlainTextResponse(str(e), status_code=400)
+    mimetype, options = parse_options_header(request.headers.get('Content-Type', ''))
+    boundary = options.get('boundary')
+    if mimetype != 'multipart/form-data' or not boundary:
+        logger.error("Upload requires a multipart/form-data body")
+        return PlainTextResponse('No file part', status_code=400)
+
+    content_length = request.headers.get('Content-Length')
+    if content_length is not None and not (content_length.isascii() and content_length.isdigit()):
+        logger.error(f"Invalid Content-Length header: {content_length}")
+        return PlainTextResponse('Invalid Content-Length header', status_code=400)
+    if content_length is not None and int(content_length) > MAX_FILE_SIZE + 64 * 1024:
+        logger.error(f"Request size {content_length} exceeds maximum allowed size {MAX_FILE_SIZE}")
+        return PlainTextResponse(f"Maximum file size limit ({MAX_FILE_SIZE} bytes) exceeded.", status_code=HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+    upload = AsyncStreamingUpload(request.stream(), boundary, max_size=MAX_FILE_SIZE)
+    if not await upload.open():
+        logger.error("No file part in the request")
+        return PlainTextResponse('No file part', status_code=400)
+    if upload.filename == '':
+        logger.error("No selected file")
+        return PlainTextResponse('No selected file', status_code=400)
+
+    try:
+        logger.info(f"Starting streaming IPFS upload for file: {upload.filename}")
+        file_cid = await ipfs_client.add_stream(upload, options=add_options)
+        logger.info(f"IPFS upload completed. CID: {file_cid}, size: {upload.size} bytes")
+    except RequestEntityTooLarge:
+        logger.error(f"File size exceeds maximum allowed size {MAX_FILE_SIZE}")
+        return PlainTextResponse(f"Maximum file size limit ({MAX_FILE_SIZE} bytes) exceeded.", status_code=HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    except Exception as e:
+        logger.error(f"IPFS upload failed: {str(e)}")
+        return PlainTextResponse(f"IPFS upload failed: {str(e)}", status_code=500)
+
+    response_data = {
+        "filename": upload.filename,
+        "cid": file_cid,
+        "size": upload.size,
+        "dag_layout": add_options.to_dict(),
+    }
+    input_types = None
+    output_types = None
+
+    # The body has already been streamed to IPFS, so the signature is read
+    # back from the new CID; only the model's interface fields are fetched.
+    if upload.filename.lower().endswith('.onnx'):
+        try:
+            onnx_info = await read_onnx_signature_from_ipfs(file_cid, upload.size)
+            onnx_info.pop('bytes_read')
+            input_types = onnx_info.pop('input_types')
+            output_types = onnx_info.pop('output_types')
+            response_data.update({"input_types": input_types, "output_types": output_types, "onnx_info": onnx_info})
+        except Exception as e:
+            logger.error(f"Error reading ONNX file: {str(e)}")
+
+    metadata_store.put(
+        file_cid,
+        size=upload.size,
+        filename=upload.filename,
+        input_types=input_types,
+        output_types=output_types,
+        dag_layout=add_options.to_dict(),
+    )
+    response_data["total_time"] = time.time() - start_time
+    return JSONResponse(response_data)
+
+async def download(request):
+    file_cid = request.query_params.get('cid')
+
+    if not file_cid:
+        return PlainTextResponse('Empty CID', status_code=400)
+
+    try:
+        headers = {'Content-Disposition': f'attachment;filename={file_cid}'}
+
+        manifest = await find_manifest(request, file_cid)
+        if manifest is not None:
+            return await send_onnx_tensors(request, file_cid, manifest, headers=headers)
+
+        cached_file = cid_cache.open(file_cid)
+        if cached_file is not None:
+            return send_cached_file(request, file_cid, cached_file, headers=headers)
+
+        if 'Range' in request.headers:
+            file_size = await cid_file_size(file_cid)
+            bounds = requested_range(request, file_cid, file_size)
+            if bounds is not None:
+                start, stop = bounds
+                chunks = ipfs_client.cat_stream(file_cid, offset=start, length=stop - start)
+                return download_response(chunks, file_cid, file_size, bounds, headers=headers)
+
+        if is_stream_requested(request):
+            async def generate():
+                try:
+                    async for chunk in ipfs_client.cat_stream(file_cid):
+                        yield chunk
+                except Exception as e:
+                    logger.error(f"Error in streaming: {str(e)}")
+                    yield str(e).encode()
+
+            return download_response(generate(), file_cid, headers=headers)
+        else:
+            file_content = await ipfs_client.cat(file_cid)
+            headers.update({'ETag': f'"{file_cid}"', 'Accept-Ranges': 'bytes'})
+            return Response(file_content, media_type='application/octet-stream', headers=headers)
+    except RangeNotSatisfiable as e:
+        return range_not_satisfiable(e)
+    except NotAManifest as e:
+        return PlainTextResponse(str(e), status_code=400)
+    except Exception as e:
+        logger.error(f"Error in download: {str(e)}")
+        return PlainTextResponse(f"Internal Server Error: {str(e)}", status_code=500)
+
+async def download_raw(request):
+    file_cid = request.query_params.get('cid')
+
+    if not file_cid:
+        return PlainTextResponse('Empty CID', status_code=400)
+
+    try:
+        # Checked first: the manifest's own bytes in the cache are not the model
+        manifest = await find_manifest(request, file_cid)
+        if manifest is not None:
+            return await send_onnx_tensors(request, file_cid, manifest)
+
+        cached_file = cid_cache.open(file_cid)
+        if cached_file is not None:
+            logger.info(f"Serving CID {file_cid} from cache")
+            return send_cached_file(request, file_cid, cached_file)
+
+        file_size = await cid_file_size(file_cid)
+        logger.info(f"File size for CID {file_cid}: {file_size}")
+
+        bounds = requested_range(request, file_cid, file_size)
+        if bounds is not None:
+            start, stop = bounds
+            chunks = ipfs_client.cat_stream(file_cid, offset=start, length=stop - start)
+            return download_response(chunks, file_cid, file_size, bounds)
+
+        async def generate():
+            bytes_sent = 0
+            async for chunk in ipfs_client.cat_stream(file_cid):
+                bytes_sent += len(chunk)
+                yield chunk
+            logger.info(f"Total bytes sent: {bytes_sent}")
+
+        return download_response(generate(), file_cid, file_size)
+    except RangeNotSatisfiable as e:
+        return range_not_satisfiable(e)
+    except NotAManifest as e:
+        return PlainTextResponse(str(e), status_code=400)
+    except Exception as e:
+        logger.error(f"Error in download_raw: {str(e)}")
+        return PlainTextResponse(f"Internal Server Error: {str(e)}", status_code=500)
+
+async def get_file_size(request):
+    file_cid = request.query_params.get('cid')
+
+    if not file_cid:
+        logger.error("No CID provided")
+        return JSONResponse({"error": "No CID provided"}, status_code=400)
+
+    try:
+        manifest = await find_manifest(request, file_cid)
+        file_size = manifest['size'] if manifest is not None else await cid_file_size(file_cid)
+        logger.info(f"Size of file with CID {file_cid}: {file_size} bytes")
+        return JSONResponse({"cid": file_cid, "size": file_size})
+    except NotAManifest as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except Exception as e:
+        logger.error(f"Error getting file size for CID {file_cid}: {str(e)}")
+        return JSONResponse({"error": f"Error getting file size: {str(e)}"}, status_code=500)
+
+async def deflate_write(entry, chunk):
+    await anyio.to_thread.run_sync(entry.write, chunk)
+
+async def download_zip(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    try:
+        files, zip_name, compression_mode = parse_zip_request(data, ZIP_COMPRESSION)
+    except ValueError as e:
+        logger.error(str(e))
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    logger.info(f"Creating zip file: {zip_name} with {len(files)} files ({compression_mode})")
+
+    async def generate():
+        prefetcher = AsyncCIDPrefetcher(ipfs_client.cat_stream, files.items())
+        # Deflating is CPU bound, so it is moved off the event loop
+        write = deflate_write if compression_mode == 'deflated' else None
+        try:
+            async for chunk in astream_zip(prefetcher.entries(), ZIP_COMPRESSION_MODES[compression_mode], write):
+                yield chunk
+            logger.info(f"Finished streaming zip file: {zip_name}")
+        except Exception as e:
+            # Stop without writing the central directory so the client sees a broken archive
+            logger.error(f"Error generating zip file: {str(e)}")
+        finally:
+            await prefetcher.close()
+
+    return StreamingResponse(
+        generate(),
+        media_type='application/zip',
+        headers={'Content-Disposition': f'attachment; filename={zip_name}'},
+    )
+
+async def cache_stats(request):
+    return JSONResponse(cid_cache.stats())
+
+routes = [
+    Route('/upload', upload, methods=['POST']),
+    Route('/download', download, methods=['GET']),
+    Route('/download_raw', download_raw, methods=['GET']),
+    Route('/get_file_size', get_file_size, methods=['GET']),
+    Route('/download_zip', download_zip, methods=['POST']),
+    Route('/cache_stats', cache_stats, methods=['GET']),
+]
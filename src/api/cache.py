@@ -0,0 +1,261 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from config.model_config import CACHE_DIR, CACHE_MAX_BYTES, DOWNLOAD_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+TEMP_PREFIX = '.tmp-'
+# Temp files untouched for this long belong to fills whose process died
+STALE_TEMP_SECONDS = 3600
+
+def iter_file_range(file, start, stop, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Yield bytes `[start, stop)` of an open cache file, closing it when done."""
+    with file:
+        file.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            chunk = file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+class NotCacheable(Exception):
+    """Raised by a `fetch` after its last chunk: what it produced is served, but not cached."""
+
+class _Fill:
+    def __init__(self, path):
+        self.path = path
+        self.size = 0
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+
+class CIDCache:
+    """On-disk LRU cache of IPFS content keyed by CID.
+
+    CIDs are immutable, so entries never need invalidating; they are only
+    evicted, least recently used first, once the cache grows past
+    `max_bytes`. A miss starts a background fetch into a temp file that
+    every concurrent request for the same CID tails as it grows, so IPFS is
+    asked only once and a slow client never holds back the others. A
+    `max_bytes` of 0 disables the cache and passes every call through.
+
+    The index of what is on disk is read on first use in each process, not
+    when the cache is created: under gunicorn --preload that happens in the
+    master, and a recycled worker would otherwise start from the master's
+    snapshot and never count or evict what earlier workers wrote.
+
+    Keys only need to identify immutable content, so the cache also holds
+    generated content under a hash of its inputs, such as zip bundles.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._loaded_pid = None
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _path(self, cid):
+        return os.path.join(self.directory, cid)
+
+    def _ensure_loaded(self):
+        # Called with the lock held
+        if self._loaded_pid != os.getpid():
+            self._load()
+            self._loaded_pid = os.getpid()
+
+    def _load(self):
+        # Called with the lock held; fills in flight belong to the process that started them
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._total_bytes = 0
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name.startswith(TEMP_PREFIX):
+                # Another worker may still be filling it
+                if time.time() - stat.st_mtime > STALE_TEMP_SECONDS:
+                    os.unlink(path)
+                continue
+            found.append((stat.st_atime, name, stat.st_size))
+        for _, cid, size in sorted(found):
+            self._entries[cid] = size
+            self._total_bytes += size
+        self._evict()
+        logger.info(f"CID cache loaded {len(self._entries)} entries ({self._total_bytes} bytes) from {self.directory}")
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            cid, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.unlink(self._path(cid))
+            except FileNotFoundError:
+                pass
+            logger.info(f"Evicted {cid} ({size} bytes) from CID cache")
+
+    def _insert(self, cid, temp_path, size):
+        # Called with the lock held
+        os.replace(temp_path, self._path(cid))
+        if cid in self._entries:
+            self._total_bytes -= self._entries.pop(cid)
+        self._entries[cid] = size
+        self._total_bytes += size
+        self._evict()
+
+    def contains(self, cid):
+        if not self.enabled:
+            return False
+        with self._lock:
+            self._ensure_loaded()
+            return cid in self._entries
+
+    def open(self, cid, count=True):
+        """Return an open binary file for a cached CID, or None on a miss.
+
+        The file stays readable even if the entry is evicted while it is
+        being served, since eviction only unlinks it.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._ensure_loaded()
+            if cid not in self._entries:
+                return None
+            try:
+                file = open(self._path(cid), 'rb')
+            except FileNotFoundError:
+                self._total_bytes -= self._entries.pop(cid)
+                return None
+            self._entries.move_to_end(cid)
+            if count:
+                self.hits += 1
+        return file
+
+    def cached_path(self, cid):
+        """Return the path of a cached CID for another server to send, or None on a miss."""
+        file = self.open(cid)
+        if file is None:
+            return None
+        file.close()
+        return self._path(cid)
+
+    def stream(self, cid, fetch, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """Yield the content of `cid`, fetching it with `fetch` and caching it on a miss.
+
+        Nothing is claimed until iteration starts, so an iterator that is
+        never consumed cannot start a fetch.
+        """
+        if not self.enabled:
+            try:
+                yield from fetch(cid)
+            except NotCacheable:
+                pass
+            return
+
+        file = self.open(cid)
+        if file is not None:
+            with file:
+                while True:
+                    chunk = file.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+            return
+
+        with self._lock:
+            fill = self._inflight.get(cid)
+            if fill is None:
+                fill = self._inflight[cid] = _Fill(os.path.join(self.directory, f"{TEMP_PREFIX}{uuid.uuid4().hex}"))
+                writer = open(fill.path, 'wb')
+                self.misses += 1
+                threading.Thread(
+                    target=self._fill, args=(cid, fill, writer, fetch), name='cid-cache-fill', daemon=True
+                ).start()
+            else:
+                logger.info(f"Joining in-flight fetch of {cid}")
+                self.coalesced += 1
+            # Opened under the lock, before the fill can rename or unlink the file
+            file = open(fill.path, 'rb')
+
+        with file:
+            position = 0
+            while True:
+                with fill.cond:
+                    while position >= fill.size and not fill.done:
+                        fill.cond.wait()
+                    available = fill.size - position
+                    if available <= 0:
+                        if fill.error is not None:
+                            raise fill.error
+                        return
+                chunk = file.read(min(chunk_size, available))
+                position += len(chunk)
+                yield chunk
+
+    def _fill(self, cid, fill, writer, fetch):
+        """Fetch `cid` into the fill's temp file, independently of the clients reading it."""
+        cacheable = True
+        try:
+            for chunk in fetch(cid):
+                writer.write(chunk)
+                writer.flush()
+                with fill.cond:
+                    fill.size += len(chunk)
+                    fill.cond.notify_all()
+        except NotCacheable as e:
+            logger.info(f"Not caching {cid}: {str(e)}")
+            cacheable = False
+        except Exception as e:
+            logger.error(f"Error fetching {cid} into CID cache: {str(e)}")
+            fill.error = e
+        finally:
+            writer.close()
+            with self._lock:
+                del self._inflight[cid]
+                if fill.error is None and cacheable and fill.size <= self.max_bytes:
+                    self._insert(cid, fill.path, fill.size)
+                else:
+                    if fill.error is None and cacheable:
+                        logger.info(f"{cid} is larger than the CID cache, not caching it")
+                    os.unlink(fill.path)
+            with fill.cond:
+                fill.done = True
+                fill.cond.notify_all()
+
+    def stats(self):
+        with self._lock:
+            if self.enabled:
+                self._ensure_loaded()
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size": self._total_bytes,
+                "max_size": self.max_bytes,
+            }
@@ -0,0 +1,33 @@
+"""Running code once the WSGI server is done with a response body."""
+from flask import request
+from werkzeug.wsgi import ClosingIterator, FileWrapper
+
+def is_file_wrapper(body):
+    """Whether `body` came from `wsgi.file_wrapper`, which servers may send with sendfile."""
+    return isinstance(body, (FileWrapper, request.environ.get('wsgi.file_wrapper', FileWrapper)))
+
+def call_on_body_close(response, callback):
+    """Run `callback` when the server closes `response`'s body.
+
+    Werkzeug hands the body of a `direct_passthrough` response to the
+    server as is, so `call_on_close` callbacks never run for it. Such a
+    body is wrapped instead, except for a file wrapper, which has to stay
+    one for sendfile and gets the callback added to its own `close`.
+    """
+    if not response.direct_passthrough:
+        response.call_on_close(callback)
+        return
+
+    body = response.response
+    if is_file_wrapper(body):
+        close = body.close
+
+        def close_then_callback():
+            try:
+                close()
+            finally:
+                callback()
+
+        body.close = close_then_callback
+    else:
+        response.response = ClosingIterator(body, callback)
@@ -1,56 +1,404 @@
 import requests
+import urllib3
 import io
 import os
 import logging
 import time
 import json
+import re
+import uuid
+from api.ipfs_pool import IPFSNodePool, RetryPolicy
+from api import profiling
+from api.metrics import IPFS_LATENCY
+from config.model_config import (
+    UPLOAD_CHUNK_SIZE, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_MIN_CHUNK_SIZE, IPFS_NODES, IPFS_HEALTH_INTERVAL, IPFS_POOL_SIZE, IPFS_POOL_TIMEOUT, IPFS_CONNECT_TIMEOUT, IPFS_READ_TIMEOUT,
+    IPFS_ADD_TIMEOUT, IPFS_RETRIES, IPFS_RETRY_BACKOFF, IPFS_RETRY_MAX_BACKOFF,
+    IPFS_ADD_CHUNKER, IPFS_ADD_RAW_LEAVES, IPFS_ADD_CID_VERSION, IPFS_ADD_HASH, IPFS_ADD_TRICKLE,
+)
 
 logger = logging.getLogger(__name__)
 
+def iter_file_chunks(file_stream, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Yield a file-like object in bounded chunks, starting from the beginning if seekable.
+
+    Files that support `readinto` are read into one preallocated buffer and
+    each chunk is a memoryview of it, valid only until the next chunk is
+    requested. The HTTP client writes every chunk out before asking for the
+    next one, so uploads do not allocate a new buffer per chunk.
+    """
+    if hasattr(file_stream, 'seekable') and file_stream.seekable():
+        file_stream.seek(0)
+    if not hasattr(file_stream, 'readinto'):
+        while True:
+            chunk = file_stream.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+        return
+    buffer = memoryview(bytearray(chunk_size))
+    while True:
+        length = file_stream.readinto(buffer)
+        if not length:
+            break
+        yield buffer[:length]
+
+def iter_adaptive_chunks(read, chunk_size=DOWNLOAD_CHUNK_SIZE, min_chunk_size=DOWNLOAD_MIN_CHUNK_SIZE):
+    """Yield `read(size)` results, doubling the size from `min_chunk_size` up to `chunk_size`.
+
+    Small first reads get the first bytes to the client quickly; large
+    steady-state reads keep the per-chunk Python overhead of long streams low.
+    """
+    size = min(min_chunk_size, chunk_size)
+    while True:
+        chunk = read(size)
+        if not chunk:
+            return
+        yield chunk
+        size = min(size * 2, chunk_size)
+
+def multipart_body(chunks, boundary, filename='filename'):
+    """Wrap a chunk iterator in a single-file multipart/form-data body."""
+    yield (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        'Content-Type: application/octet-stream\r\n\r\n'
+    ).encode()
+    for chunk in chunks:
+        if chunk:
+            yield chunk
+    yield f'\r\n--{boundary}--\r\n'.encode()
+
+def cat_params(cid, offset=None, length=None):
+    params = {'arg': cid}
+    if offset:
+        params['offset'] = offset
+    if length is not None:
+        params['length'] = length
+    return params
+
+def ls_file_size(data):
+    """Return the file size from an `ls` response, summing the links of chunked files."""
+    if 'Objects' in data and len(data['Objects']) > 0:
+        object_data = data['Objects'][0]
+        if 'Links' in object_data and len(object_data['Links']) > 0:
+            # Sum up the sizes of all links
+            total_size = sum(link['Size'] for link in object_data['Links'])
+            return total_size
+        else:
+            return object_data.get('Size', 0)
+    else:
+        raise ValueError("Unexpected response format from IPFS API")
+
+def _parse_bool(name, value):
+    if value.lower() not in ('true', 'false'):
+        raise ValueError(f"{name} must be true or false")
+    return value.lower() == 'true'
+
+class AddOptions:
+    """How /add lays content out as a DAG, with the options of `ipfs add`.
+
+    The same bytes added with different options get a different CID, so
+    the options are part of what identifies an upload.
+    """
+
+    CHUNKER_PATTERN = re.compile(r'size-[1-9][0-9]*|rabin(-[1-9][0-9]*){0,3}|buzhash')
+    HASH_FUNCTIONS = ('sha2-256', 'sha2-512', 'sha3-256', 'sha3-512', 'blake2b-256', 'blake2s-256', 'blake3', 'keccak-256')
+    # Query parameter names, shared by the service's upload endpoints and Kubo
+    PARAMS = ('chunker', 'raw-leaves', 'cid-version', 'hash', 'trickle')
+
+    def __init__(self, chunker=IPFS_ADD_CHUNKER, raw_leaves=IPFS_ADD_RAW_LEAVES, cid_version=IPFS_ADD_CID_VERSION,
+                 hash_function=IPFS_ADD_HASH, trickle=IPFS_ADD_TRICKLE):
+        if not self.CHUNKER_PATTERN.fullmatch(chunker):
+            raise ValueError(f"Invalid chunker: {chunker}")
+        if cid_version not in (0, 1):
+            raise ValueError(f"Invalid CID version: {cid_version}")
+        if hash_function not in self.HASH_FUNCTIONS:
+            raise ValueError(f"Unsupported hash function: {hash_function}")
+        self.chunker = chunker
+        self.raw_leaves = raw_leaves
+        self.cid_version = cid_version
+        self.hash_function = hash_function
+        self.trickle = trickle
+
+    @classmethod
+    def from_params(cls, params, defaults=None):
+        """Build options from query parameters, taking the others from `defaults` (the configured options)."""
+        defaults = defaults or cls()
+        cid_version = params.get('cid-version')
+        if cid_version is not None and not cid_version.isdigit():
+            raise ValueError(f"Invalid CID version: {cid_version}")
+        return cls(
+            chunker=params.get('chunker', defaults.chunker),
+            raw_leaves=_parse_bool('raw-leaves', params['raw-leaves']) if 'raw-leaves' in params else defaults.raw_leaves,
+            cid_version=int(cid_version) if cid_version is not None else defaults.cid_version,
+            hash_function=params.get('hash', defaults.hash_function),
+            trickle=_parse_bool('trickle', params['trickle']) if 'trickle' in params else defaults.trickle,
+        )
+
+    def params(self):
+        return {
+            'chunker': self.chunker,
+            'raw-leaves': str(self.raw_leaves).lower(),
+            'cid-version': str(self.cid_version),
+            'hash': self.hash_function,
+            'trickle': str(self.trickle).lower(),
+        }
+
+    def to_dict(self):
+        return {
+            "chunker": self.chunker,
+            "raw_leaves": self.raw_leaves,
+            "cid_version": self.cid_version,
+            "hash": self.hash_function,
+            "trickle": self.trickle,
+        }
+
+    @property
+    def is_kubo_default(self):
+        return self.params() == KUBO_ADD_OPTIONS.params()
+
+    @property
+    def key(self):
+        """A compact string identifying the options, e.g. for digest index keys."""
+        return ','.join(f'{name}={value}' for name, value in self.params().items())
+
+# What `ipfs add` uses without options, which is what uploads were added with before options existed
+KUBO_ADD_OPTIONS = AddOptions('size-262144', False, 0, 'sha2-256', False)
+
+def default_api_url():
+    ipfs_host = os.environ.get('IPFS_HOST', 'localhost')
+    ipfs_port = os.environ.get('IPFS_PORT', '5001')
+    return f'http://{ipfs_host}:{ipfs_port}/api/v0'
+
+def node_api_url(node):
+    """Turn an IPFS_NODES entry (`host:port` or a URL) into an API base URL."""
+    if '://' not in node:
+        node = f'http://{node}'
+    node = node.rstrip('/')
+    return node if node.endswith('/api/v0') else f'{node}/api/v0'
+
+def default_api_urls():
+    if IPFS_NODES:
+        return [node_api_url(node.strip()) for node in IPFS_NODES.split(',') if node.strip()]
+    return [default_api_url()]
+
+# Errors after which a request is retried on another node: the node could
+# not be reached, or a stream it was serving broke off.
+FAILOVER_ERRORS = (requests.ConnectionError, requests.Timeout, urllib3.exceptions.HTTPError)
+
+def default_retry_policies():
+    read_policy = dict(
+        attempts=IPFS_RETRIES,
+        backoff=IPFS_RETRY_BACKOFF,
+        max_backoff=IPFS_RETRY_MAX_BACKOFF,
+        timeout=(IPFS_CONNECT_TIMEOUT, IPFS_READ_TIMEOUT),
+    )
+    return {
+        'cat': RetryPolicy(**read_policy),
+        'ls': RetryPolicy(**read_policy),
+        # Re-adding the same bytes yields the same CID, so buffered adds are safe to retry
+        'add_bytes': RetryPolicy(**dict(read_policy, timeout=(IPFS_CONNECT_TIMEOUT, IPFS_ADD_TIMEOUT))),
+        # Pinning fetches every block of the content, so it gets the add timeout
+        'pin': RetryPolicy(**dict(read_policy, timeout=(IPFS_CONNECT_TIMEOUT, IPFS_ADD_TIMEOUT))),
+        # A streamed add consumes its body, so it gets a single try
+        'add_stream': RetryPolicy(timeout=(IPFS_CONNECT_TIMEOUT, IPFS_ADD_TIMEOUT)),
+    }
+
+class CatStream:
+    """Iterator over a `cat` response that holds its node until exhausted or closed.
+
+    A caller that stops early, or never iterates at all as for a HEAD
+    request, must call `close()` to give the node and its pooled connection
+    back; WSGI servers do so for response bodies.
+    """
+
+    def __init__(self, client, cid, offset, length, chunk_size):
+        self._client = client
+        self._cid = cid
+        self._start = offset or 0
+        self._length = length
+        self._chunk_size = chunk_size
+        self._node = None
+        self._chunks = self._generate()
+        self._node, self._response = client._post('/cat', 'cat', params=cat_params(cid, offset, length), stream=True)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        self._chunks.close()
+        self._release()
+
+    def __del__(self):
+        self.close()
+
+    def _release(self):
+        node, self._node = self._node, None
+        if node is not None:
+            self._response.close()
+            self._client.pool.release(node)
+
+    def _generate(self):
+        received = 0
+        tried = 1
+        while True:
+            node = self._node
+            try:
+                read = lambda size: self._response.raw.read(size, decode_content=True)
+                for chunk in iter_adaptive_chunks(read, self._chunk_size):
+                    received += len(chunk)
+                    yield chunk
+                return
+            except FAILOVER_ERRORS as e:
+                self._client.pool.mark_failed(node, e)
+                if tried >= self._client.retry_policies['cat'].attempts:
+                    raise
+            finally:
+                self._release()
+            tried += 1
+            logger.warning(f"Stream of {self._cid} from {node.base_url} broke off after {received} bytes, resuming on another node")
+            remaining = None if self._length is None else self._length - received
+            self._node, self._response = self._client._post(
+                '/cat', 'cat', params=cat_params(self._cid, self._start + received, remaining), stream=True,
+            )
+
 class IPFSClient:
-    def __init__(self):
-        ipfs_host = os.environ.get('IPFS_HOST', 'localhost')
-        ipfs_port = os.environ.get('IPFS_PORT', '5001')
-        self.base_url = f'http://{ipfs_host}:{ipfs_port}/api/v0'
-        self.session = requests.Session()
-        logging.info(f"IPFS Client initialized with base URL: {self.base_url}")
-
-    def add_bytes(self, data):
-        response = self.session.post(f'{self.base_url}/add', files={'file': ('filename', data)})
-        response.raise_for_status()
+    """Thread-safe client for one or more IPFS daemons.
+
+    `base_url` may be a single API URL or a list of them; by default the
+    nodes come from IPFS_NODES, or IPFS_HOST and IPFS_PORT. Requests go to
+    the node with the fewest outstanding requests, over a per-node pool of
+    `pool_size` connections. Each operation follows its `RetryPolicy`:
+    `cat` and `ls` fail over when a node cannot be reached or answers with a
+    server error, and a `cat_stream` that breaks off resumes from the byte
+    where it stopped. `retry_policies` overrides the defaults by operation.
+    """
+
+    def __init__(
+        self, base_url=None, health_interval=IPFS_HEALTH_INTERVAL, pool_size=IPFS_POOL_SIZE, retry_policies=None,
+        pool_timeout=IPFS_POOL_TIMEOUT,
+    ):
+        if base_url is None:
+            base_urls = default_api_urls()
+        elif isinstance(base_url, str):
+            base_urls = [base_url]
+        else:
+            base_urls = list(base_url)
+        self.pool = IPFSNodePool(base_urls, health_interval, pool_size, pool_timeout)
+        self.retry_policies = default_retry_policies()
+        self.retry_policies.update(retry_policies or {})
+        self.base_url = base_urls[0]
+        logging.info(f"IPFS Client initialized with nodes: {', '.join(base_urls)}")
+
+    def _send(self, node, path, operation, timeout, **kwargs):
+        start_time = time.perf_counter()
+        outcome = 'error'
+        try:
+            response = node.session.post(f'{node.base_url}{path}', timeout=timeout, **kwargs)
+            if response.status_code < 400:
+                outcome = 'ok'
+            return response
+        finally:
+            duration = time.perf_counter() - start_time
+            IPFS_LATENCY.observe(duration, operation=operation, outcome=outcome)
+            profiling.record(f"ipfs:{operation}", start_time, duration)
+
+    def _post(self, path, operation, **kwargs):
+        """POST to the least loaded node, retrying according to `operation`'s policy.
+
+        Returns `(node, response)` with the node still reserved; the caller
+        releases it with `self.pool.release(node)` once done with the response.
+        """
+        policy = self.retry_policies[operation]
+        tried = []
+        attempt = 0
+        retry_round = 0
+        while True:
+            if len(tried) == len(self.pool.nodes):
+                retry_round += 1
+                tried = []
+                delay = policy.delay(retry_round)
+                if delay:
+                    logger.info(f"All IPFS nodes failed {path}, retrying in {delay:.2f} seconds")
+                    time.sleep(delay)
+            node = self.pool.acquire(exclude=tried)
+            tried.append(node)
+            attempt += 1
+            can_retry = attempt < policy.attempts
+            try:
+                response = self._send(node, path, operation, policy.timeout, **kwargs)
+                # Server errors are only retried on other nodes, as the same node would likely repeat them
+                if response.status_code >= 500 and can_retry and len(tried) < len(self.pool.nodes):
+                    logger.warning(f"IPFS node {node.base_url} answered {path} with {response.status_code}, trying another node")
+                    response.close()
+                    self.pool.release(node)
+                    continue
+                response.raise_for_status()
+                return node, response
+            except urllib3.exceptions.EmptyPoolError:
+                # This process is out of connections, which says nothing about the node
+                self.pool.release(node)
+                logger.warning(f"No free connection to IPFS node {node.base_url} for {path}")
+                raise
+            except FAILOVER_ERRORS as e:
+                self.pool.release(node)
+                self.pool.mark_failed(node, e)
+                if not can_retry:
+                    raise
+                logger.warning(f"IPFS request {path} failed on {node.base_url} (attempt {attempt}/{policy.attempts}): {str(e)}")
+            except BaseException:
+                self.pool.release(node)
+                raise
+
+    def _call(self, path, operation, **kwargs):
+        node, response = self._post(path, operation, **kwargs)
+        self.pool.release(node)
+        return response
+
+    def add_bytes(self, data, options=None):
+        params = (options or AddOptions()).params()
+        response = self._call('/add', 'add_bytes', files={'file': ('filename', data)}, params=params)
         return response.json()['Hash']
 
-    def add_stream(self, file_stream):
-        logger.info(f"Starting file upload to IPFS. Base URL: {self.base_url}")
+    def add_stream(self, file_stream, chunk_size=UPLOAD_CHUNK_SIZE, options=None):
+        """Add a file-like object or an iterable of byte chunks to IPFS.
+
+        The body is sent with chunked transfer encoding, so at most one chunk
+        of the file is held in memory regardless of its size. `options` sets
+        the DAG layout, defaulting to the configured `AddOptions`.
+        """
+        logger.info("Starting file upload to IPFS")
         start_time = time.time()
 
         try:
             params = {
                 'stream-channels': 'true',
                 'progress': 'false',
+                **(options or AddOptions()).params(),
             }
 
-            # Ensure we're at the beginning of the file
-            file_stream.seek(0)
-
-            # Read the entire file content
-            file_content = file_stream.read()
+            if hasattr(file_stream, 'read'):
+                chunks = iter_file_chunks(file_stream, chunk_size)
+            else:
+                chunks = file_stream
 
-            files = {
-                'file': ('filename', file_content, 'application/octet-stream')
-            }
+            boundary = uuid.uuid4().hex
+            headers = {'Content-Type': f'multipart/form-data; boundary={boundary}'}
 
-            logger.info(f"Sending POST request to {self.base_url}/add")
-            response = self.session.post(
-                f'{self.base_url}/add',
-                files=files,
+            logger.info("Sending POST request to /add")
+            response = self._call(
+                '/add',
+                'add_stream',
+                data=multipart_body(chunks, boundary),
+                headers=headers,
                 params=params,
             )
             logger.info(f"Response status code: {response.status_code}")
             logger.info(f"Response headers: {response.headers}")
 
-            response.raise_for_status()
-
             result = response.json()
             final_cid = result.get('Hash')
 
@@ -66,28 +414,28 @@ class IPFSClient:
             logger.error(f"Response content: {response.content if 'response' in locals() else 'No response'}")
             raise
 
-    def cat(self, cid):
-        response = self.session.post(f'{self.base_url}/cat', params={'arg': cid})
-        response.raise_for_status()
-        return response.content
+    def cat(self, cid, offset=None, length=None):
+        return self._call('/cat', 'cat', params=cat_params(cid, offset, length)).content
 
-    def cat_stream(self, cid):
-        response = self.session.post(f'{self.base_url}/cat', params={'arg': cid}, stream=True)
-        response.raise_for_status()
-        return response.iter_content(chunk_size=8192)
+    def cat_stream(self, cid, offset=None, length=None, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """Return a `CatStream` over the content of a CID, in chunks growing up to `chunk_size`.
+
+        The first request is made eagerly so errors surface before any data
+        is sent. If the stream breaks off, it resumes on another node from
+        the first byte not yet received.
+        """
+        return CatStream(self, cid, offset, length, chunk_size)
 
     def get_file_size(self, cid):
-        response = self.session.post(f'{self.base_url}/ls', params={'arg': f'/ipfs/{cid}'})
-        response.raise_for_status()
-        data = response.json()
-        
-        if 'Objects' in data and len(data['Objects']) > 0:
-            object_data = data['Objects'][0]
-            if 'Links' in object_data and len(object_data['Links']) > 0:
-                # Sum up the sizes of all links
-                total_size = sum(link['Size'] for link in object_data['Links'])
-                return total_size
-            else:
-                return object_data.get('Size', 0)
-        else:
-            raise ValueError("Unexpected response format from IPFS API")
+        response = self._call('/ls', 'ls', params={'arg': f'/ipfs/{cid}'})
+        return ls_file_size(response.json())
+
+    def pin(self, cid):
+        """Pin a CID on the node, which first fetches all of its blocks."""
+        self._call('/pin/add', 'pin', params={'arg': cid})
+
+    def node_stats(self):
+        return self.pool.stats()
+
+    def close(self):
+        self.pool.close()
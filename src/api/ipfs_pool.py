@@ -0,0 +1,220 @@
+import logging
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from api.metrics import IPFS_POOL_WAIT
+from config.model_config import IPFS_HEALTH_INTERVAL, IPFS_POOL_SIZE, IPFS_POOL_TIMEOUT, IPFS_CONNECT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+class RetryPolicy:
+    """How often and how patiently an IPFS operation is retried.
+
+    `attempts` counts every try, including the first. Untried nodes are
+    failed over to immediately; once every node has failed, the next round
+    waits an exponentially growing, jittered delay starting at `backoff`
+    seconds and capped at `max_backoff`. `timeout` is the requests
+    `(connect, read)` timeout for each try.
+    """
+
+    def __init__(self, attempts=1, backoff=0.0, max_backoff=0.0, timeout=None):
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+    def delay(self, retry_round):
+        """Seconds to wait before retry round `retry_round` (1 for the first)."""
+        if self.backoff <= 0:
+            return 0.0
+        delay = min(self.max_backoff, self.backoff * 2 ** (retry_round - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+class PoolWaitStats:
+    """Time threads spend waiting for a free connection in a node's pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def start(self):
+        with self._lock:
+            self.waiting += 1
+        return time.perf_counter()
+
+    def finish(self, started):
+        elapsed = time.perf_counter() - started
+        IPFS_POOL_WAIT.observe(elapsed)
+        with self._lock:
+            self.waiting -= 1
+            self.count += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "waiting": self.waiting,
+                "count": self.count,
+                "total_seconds": self.total_seconds,
+                "max_seconds": self.max_seconds,
+            }
+
+def _instrumented(pool_class, wait_stats, pool_timeout):
+    """Subclass a urllib3 connection pool so every connection checkout is timed.
+
+    Checkouts that wait longer than `pool_timeout` seconds raise urllib3's
+    `EmptyPoolError`; requests never passes a timeout of its own.
+    """
+    def _get_conn(self, timeout=None):
+        started = wait_stats.start()
+        try:
+            return pool_class._get_conn(self, pool_timeout if timeout is None else timeout)
+        finally:
+            wait_stats.finish(started)
+    return type(f'Instrumented{pool_class.__name__}', (pool_class,), {'_get_conn': _get_conn})
+
+class InstrumentedAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools block when full and record how long callers wait.
+
+    Blocking keeps the number of open connections to a node at `pool_maxsize`
+    instead of opening throwaway connections under load; a caller gives up
+    after `pool_timeout` seconds.
+    """
+
+    def __init__(self, wait_stats, pool_maxsize=IPFS_POOL_SIZE, pool_timeout=IPFS_POOL_TIMEOUT):
+        self.wait_stats = wait_stats
+        self.pool_timeout = pool_timeout
+        super().__init__(pool_connections=1, pool_maxsize=pool_maxsize, pool_block=True)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _instrumented(HTTPConnectionPool, self.wait_stats, self.pool_timeout),
+            'https': _instrumented(HTTPSConnectionPool, self.wait_stats, self.pool_timeout),
+        }
+
+class IPFSNode:
+    """One IPFS API endpoint with its own connection pool and load counters.
+
+    The session is shared by all request threads; urllib3's connection pool
+    is thread-safe and hands each request its own connection.
+    """
+
+    def __init__(self, base_url, pool_size=IPFS_POOL_SIZE, pool_timeout=IPFS_POOL_TIMEOUT):
+        self.base_url = base_url
+        self.pool_wait = PoolWaitStats()
+        self.session = requests.Session()
+        adapter = InstrumentedAdapter(self.pool_wait, pool_maxsize=pool_size, pool_timeout=pool_timeout)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.outstanding = 0
+        self.healthy = True
+        self.requests = 0
+        self.failures = 0
+        self.last_error = None
+
+    def stats(self):
+        return {
+            "base_url": self.base_url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "pool_wait": self.pool_wait.stats(),
+        }
+
+class IPFSNodePool:
+    """Balances requests over several IPFS daemons by least outstanding requests.
+
+    A node that fails with a connection error is marked unhealthy and
+    skipped until a background probe of its `/version` endpoint succeeds
+    again. If every node is unhealthy they are all tried anyway, so a
+    transient outage of the whole pool does not need a probe to recover.
+
+    The probe thread is started by the first request of each process:
+    threads do not survive fork(), so one started when a gunicorn
+    `--preload` master imports the app would never run in the workers.
+    """
+
+    def __init__(self, base_urls, health_interval=IPFS_HEALTH_INTERVAL, pool_size=IPFS_POOL_SIZE, pool_timeout=IPFS_POOL_TIMEOUT):
+        if not base_urls:
+            raise ValueError("At least one IPFS node is required")
+        self.nodes = [IPFSNode(base_url, pool_size, pool_timeout) for base_url in base_urls]
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._health_thread = None
+        self._probe_pid = None
+
+    def _ensure_probing(self):
+        # Called with the lock held
+        if self._probe_pid == os.getpid() or len(self.nodes) < 2 or self.health_interval <= 0 or self._stop.is_set():
+            return
+        self._probe_pid = os.getpid()
+        self._health_thread = threading.Thread(target=self._probe_loop, name='ipfs-health', daemon=True)
+        self._health_thread.start()
+
+    def acquire(self, exclude=()):
+        """Reserve the least loaded node not in `exclude`; release it with `release(node)`."""
+        with self._lock:
+            self._ensure_probing()
+            candidates = [node for node in self.nodes if node not in exclude]
+            healthy = [node for node in candidates if node.healthy]
+            # Ties go to the earliest node in the list, so the order sets a preference
+            node = min(healthy or candidates, key=lambda node: node.outstanding)
+            node.outstanding += 1
+            node.requests += 1
+        return node
+
+    def release(self, node):
+        with self._lock:
+            node.outstanding -= 1
+
+    def mark_failed(self, node, error):
+        with self._lock:
+            node.failures += 1
+            node.last_error = str(error)
+            if node.healthy:
+                logger.warning(f"Marking IPFS node {node.base_url} unhealthy: {str(error)}")
+            node.healthy = False
+
+    def check_health(self):
+        """Probe every node once and update its health."""
+        for node in self.nodes:
+            try:
+                response = node.session.post(f'{node.base_url}/version', timeout=(IPFS_CONNECT_TIMEOUT, 5))
+                response.raise_for_status()
+                healthy, error = True, None
+            except requests.RequestException as e:
+                healthy, error = False, str(e)
+            with self._lock:
+                if healthy and not node.healthy:
+                    logger.info(f"IPFS node {node.base_url} is healthy again")
+                node.healthy = healthy
+                if error is not None:
+                    node.last_error = error
+
+    def _probe_loop(self):
+        while not self._stop.wait(self.health_interval):
+            try:
+                self.check_health()
+            except Exception as e:
+                logger.error(f"IPFS health probe failed: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            return [node.stats() for node in self.nodes]
+
+    def close(self):
+        self._stop.set()
+        for node in self.nodes:
+            node.session.close()
@@ -0,0 +1,202 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from config.model_config import METADATA_DB, METADATA_LRU_SIZE
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('size', 'filename', 'input_types', 'output_types', 'dag_layout')
+JSON_FIELDS = ('input_types', 'output_types', 'dag_layout')
+# Download counts are buffered in memory and written at most this often
+ACCESS_FLUSH_INTERVAL = 60
+
+class MetadataStore:
+    """Persistent per-CID metadata (size, filename, ONNX signature, DAG layout) backed by SQLite.
+
+    Content behind a CID never changes, so records are only ever filled in,
+    never invalidated. Reads go through an in-process LRU so repeated
+    lookups of hot CIDs do not touch the database at all.
+
+    The store also indexes uploaded content by its SHA-256 digest, so a
+    re-upload of known content can be answered without adding it again,
+    and counts downloads per CID to rank the hot models for warmup.
+
+    The database is opened by the first use in each process: a SQLite
+    connection must not be used across fork(), and the store is created
+    when a gunicorn `--preload` master imports the app.
+    """
+
+    def __init__(self, path=METADATA_DB, lru_size=METADATA_LRU_SIZE):
+        self.path = path
+        self.lru_size = lru_size
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()
+        self._pending_accesses = Counter()
+        self._accesses_flushed_at = time.monotonic()
+        self._connection = None
+        self._connected_pid = None
+
+    @property
+    def _db(self):
+        # Called with the lock held
+        if self._connected_pid != os.getpid():
+            self._connection = self._connect()
+            self._connected_pid = os.getpid()
+        return self._connection
+
+    def _connect(self):
+        if self.path != ':memory:' and os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS metadata ('
+            'cid TEXT PRIMARY KEY, size INTEGER, filename TEXT, '
+            'input_types TEXT, output_types TEXT, dag_layout TEXT, updated_at REAL)'
+        )
+        # Databases created before DAG layouts were recorded
+        columns = {row[1] for row in db.execute('PRAGMA table_info(metadata)')}
+        if 'dag_layout' not in columns:
+            db.execute('ALTER TABLE metadata ADD COLUMN dag_layout TEXT')
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS digests (digest TEXT PRIMARY KEY, cid TEXT NOT NULL, updated_at REAL)'
+        )
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS accesses (cid TEXT PRIMARY KEY, count INTEGER NOT NULL, last_access REAL)'
+        )
+        db.execute('CREATE TABLE IF NOT EXISTS manifests (cid TEXT PRIMARY KEY, manifest TEXT NOT NULL)')
+        db.commit()
+        return db
+
+    def _remember(self, cid, record):
+        self._lru[cid] = record
+        self._lru.move_to_end(cid)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    @staticmethod
+    def _record(row):
+        return {
+            field: json.loads(value) if field in JSON_FIELDS and value is not None else value
+            for field, value in zip(FIELDS, row)
+        }
+
+    def get(self, cid):
+        """Return the known metadata for a CID as a dict, or None if nothing is recorded."""
+        with self._lock:
+            record = self._lru.get(cid)
+            if record is not None:
+                self._lru.move_to_end(cid)
+                return dict(record)
+            row = self._db.execute(
+                f'SELECT {", ".join(FIELDS)} FROM metadata WHERE cid = ?', (cid,)
+            ).fetchone()
+            if row is None:
+                return None
+            record = self._record(row)
+            self._remember(cid, record)
+            return dict(record)
+
+    def get_many(self, cids):
+        """Return `{cid: metadata}` for the CIDs that have records, querying the database in batches."""
+        records = {}
+        with self._lock:
+            missing = []
+            for cid in dict.fromkeys(cids):
+                record = self._lru.get(cid)
+                if record is not None:
+                    self._lru.move_to_end(cid)
+                    records[cid] = dict(record)
+                else:
+                    missing.append(cid)
+            # Stay under SQLite's limit on query parameters
+            for start in range(0, len(missing), 500):
+                batch = missing[start:start + 500]
+                rows = self._db.execute(
+                    f'SELECT cid, {", ".join(FIELDS)} FROM metadata WHERE cid IN ({", ".join("?" * len(batch))})',
+                    batch,
+                ).fetchall()
+                for cid, *row in rows:
+                    record = self._record(row)
+                    self._remember(cid, record)
+                    records[cid] = dict(record)
+        return records
+
+    def put(self, cid, **fields):
+        """Record metadata for a CID, keeping previously stored values for fields passed as None."""
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown metadata fields: {', '.join(sorted(unknown))}")
+        values = [
+            json.dumps(fields.get(field)) if field in JSON_FIELDS and fields.get(field) is not None else fields.get(field)
+            for field in FIELDS
+        ]
+        updates = ', '.join(f'{field} = COALESCE(excluded.{field}, {field})' for field in FIELDS)
+        with self._lock:
+            self._db.execute(
+                f'INSERT INTO metadata (cid, {", ".join(FIELDS)}, updated_at) VALUES ({", ".join("?" * (len(FIELDS) + 2))}) '
+                f'ON CONFLICT(cid) DO UPDATE SET {updates}, updated_at = excluded.updated_at',
+                [cid, *values, time.time()],
+            )
+            self._db.commit()
+            self._lru.pop(cid, None)
+
+    def find_digest(self, digest):
+        """Return the CID recorded for a content digest, or None."""
+        with self._lock:
+            row = self._db.execute('SELECT cid FROM digests WHERE digest = ?', (digest,)).fetchone()
+        return row[0] if row is not None else None
+
+    def put_digest(self, digest, cid):
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO digests (digest, cid, updated_at) VALUES (?, ?, ?)',
+                (digest, cid, time.time()),
+            )
+            self._db.commit()
+
+    def get_manifest(self, cid):
+        """Return the split-model manifest stored under `cid`, or None if `cid` is not one."""
+        with self._lock:
+            row = self._db.execute('SELECT manifest FROM manifests WHERE cid = ?', (cid,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put_manifest(self, cid, manifest):
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO manifests (cid, manifest) VALUES (?, ?)', (cid, json.dumps(manifest))
+            )
+            self._db.commit()
+
+    def _flush_accesses(self):
+        # Called with the lock held
+        now = time.time()
+        self._db.executemany(
+            'INSERT INTO accesses (cid, count, last_access) VALUES (?, ?, ?) '
+            'ON CONFLICT(cid) DO UPDATE SET count = count + excluded.count, last_access = excluded.last_access',
+            [(cid, count, now) for cid, count in self._pending_accesses.items()],
+        )
+        self._db.commit()
+        self._pending_accesses.clear()
+        self._accesses_flushed_at = time.monotonic()
+
+    def record_access(self, cid):
+        """Count a download of `cid`; counts reach the database in batches."""
+        with self._lock:
+            self._pending_accesses[cid] += 1
+            if time.monotonic() - self._accesses_flushed_at >= ACCESS_FLUSH_INTERVAL:
+                self._flush_accesses()
+
+    def hot_cids(self, limit):
+        """Return up to `limit` CIDs, most downloaded first."""
+        with self._lock:
+            if self._pending_accesses:
+                self._flush_accesses()
+            rows = self._db.execute(
+                'SELECT cid FROM accesses ORDER BY count DESC, last_access DESC LIMIT ?', (limit,)
+            ).fetchall()
+        return [row[0] for row in rows]
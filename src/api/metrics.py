@@ -0,0 +1,221 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Metrics live in this process only, which matches the single gunicorn
+worker the service runs with. Each metric takes its label values as
+keyword arguments, e.g. `REQUEST_LATENCY.observe(0.2, endpoint='/upload')`.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from api import profiling
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+BYTES_BUCKETS = tuple(1024 * 4 ** power for power in range(13))  # 1 KiB to 16 GiB
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for suffix, pairs, value in self._samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(pairs)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [('_total', list(zip(self.labelnames, key)), value) for key, value in items]
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [('', list(zip(self.labelnames, key)), value) for key, value in items]
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (plus +Inf), then sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def count(self, **labels):
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return sum(state[0]) if state else 0
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the `with` block, also recording it in a request profile."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start_time
+            self.observe(duration, **labels)
+            short_name = self.name.removeprefix('vanna_').removesuffix('_seconds')
+            profiling.record(f"{short_name}:{','.join(str(value) for value in labels.values())}", start_time, duration)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        samples = []
+        for key, (counts, total) in items:
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append(('_bucket', pairs + [('le', _format_value(float(bound)))], cumulative))
+            samples.append(('_sum', pairs, total))
+            samples.append(('_count', pairs, cumulative))
+        return samples
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = Histogram(
+    'vanna_request_duration_seconds',
+    'Time from receiving a request until its response body has been fully sent.',
+    ['endpoint', 'method', 'status'],
+)
+RESPONSE_FIRST_BYTE = Histogram(
+    'vanna_response_first_byte_seconds',
+    'Time from receiving a request until the first chunk of its response body is produced.',
+    ['endpoint'],
+)
+REQUEST_BYTES = Histogram(
+    'vanna_request_bytes',
+    'Size of request bodies read by the service.',
+    ['endpoint'],
+    buckets=BYTES_BUCKETS,
+)
+RESPONSE_BYTES = Histogram(
+    'vanna_response_bytes',
+    'Size of response bodies sent by the service.',
+    ['endpoint'],
+    buckets=BYTES_BUCKETS,
+)
+INFLIGHT_STREAMS = Gauge(
+    'vanna_inflight_streams',
+    'Responses whose body is currently being sent.',
+    ['endpoint'],
+)
+UPLOAD_PHASE = Histogram(
+    'vanna_upload_phase_seconds',
+    'Time spent in each phase of an upload: receive, inspect, ipfs_add, stream for piped uploads, or hash for multipart uploads.',
+    ['phase'],
+)
+UPLOAD_DEDUPLICATED = Counter(
+    'vanna_upload_deduplicated',
+    'Uploads answered from the content digest index without adding to IPFS.',
+)
+IPFS_LATENCY = Histogram(
+    'vanna_ipfs_request_duration_seconds',
+    'Time until an IPFS API call returns its response headers; for adds this includes sending the body.',
+    ['operation', 'outcome'],
+)
+IPFS_POOL_WAIT = Histogram(
+    'vanna_ipfs_pool_wait_seconds',
+    'Time spent waiting for a pooled connection to an IPFS node.',
+    buckets=(0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+ONNX_INSPECTION = Histogram(
+    'vanna_onnx_inspection_seconds',
+    'Time spent reading ONNX model signatures.',
+    ['method'],
+)
+ADMISSION_REJECTED = Counter(
+    'vanna_admission_rejected',
+    'Requests answered with 429: over the client\'s request rate, or no transfer slot free in time.',
+    ['reason'],
+)
+TRANSFER_QUEUE_WAIT = Histogram(
+    'vanna_transfer_queue_wait_seconds',
+    'Time uploads and downloads spent waiting for a transfer slot.',
+)
+DOWNLOADS_OFFLOADED = Counter(
+    'vanna_downloads_offloaded',
+    'Downloads whose bytes were handed to a front proxy or the IPFS gateway instead of being sent by the service.',
+    ['mode'],
+)
@@ -0,0 +1,212 @@
+import bisect
+import hashlib
+import io
+import itertools
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from werkzeug.exceptions import RequestEntityTooLarge
+from config.model_config import MODEL_FOLDER, MULTIPART_UPLOAD_TTL, MULTIPART_MAX_PARTS
+
+logger = logging.getLogger(__name__)
+
+class PartsReader(io.RawIOBase):
+    """Reads a list of part files back to back as one seekable file.
+
+    Only one part file is open at a time. Reads continue across part
+    boundaries, so they are only short at the end of the file.
+    """
+
+    def __init__(self, paths):
+        super().__init__()
+        self._paths = list(paths)
+        self._starts = list(itertools.accumulate((os.path.getsize(path) for path in self._paths), initial=0))
+        self.size = self._starts[-1]
+        self._position = 0
+        self._index = None
+        self._file = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self._position = offset
+        return offset
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        filled = 0
+        while filled < len(view) and self._position < self.size:
+            # Empty parts share their start with the next part, which bisect_right skips over
+            index = bisect.bisect_right(self._starts, self._position) - 1
+            if index != self._index:
+                if self._file is not None:
+                    self._file.close()
+                self._file = open(self._paths[index], 'rb')
+                self._index = index
+            self._file.seek(self._position - self._starts[index])
+            length = self._file.readinto(view[filled:])
+            if not length:
+                raise ValueError(f"Part file {self._paths[index]} is shorter than when the upload was completed")
+            filled += length
+            self._position += length
+        return filled
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        super().close()
+
+class MultipartUpload:
+    def __init__(self, filename, path):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.path = path
+        self.state = 'open'
+        self.parts = {}
+        self.result = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    def part_path(self, part_number):
+        return os.path.join(self.path, f'{part_number:05d}')
+
+    def missing_parts(self):
+        """Part numbers below the highest received part that have not arrived yet."""
+        return [number for number in range(1, max(self.parts, default=0) + 1) if number not in self.parts]
+
+    def to_dict(self):
+        status = {
+            "upload_id": self.id,
+            "filename": self.filename,
+            "state": self.state,
+            "parts": [{"part": number, **self.parts[number]} for number in sorted(self.parts)],
+            "size": sum(part["size"] for part in self.parts.values()),
+        }
+        if self.result is not None:
+            status.update(self.result)
+        return status
+
+class MultipartUploadManager:
+    """Tracks resumable uploads whose numbered parts are spooled to disk.
+
+    Parts may arrive in any order and in parallel; sending a part again
+    replaces it, so a failed part can be retried on its own. Each part is
+    written to a temporary file and renamed into place, so a part is
+    either complete or absent. Once completed, the parts are read back
+    in order through `PartsReader` and deleted. Uploads that see no
+    activity for `ttl` seconds are discarded.
+    """
+
+    def __init__(self, spool_dir=os.path.join(MODEL_FOLDER, 'multipart'), ttl=MULTIPART_UPLOAD_TTL, max_parts=MULTIPART_MAX_PARTS):
+        self.spool_dir = spool_dir
+        self.ttl = ttl
+        self.max_parts = max_parts
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for upload_id, upload in list(self._uploads.items()):
+            if upload.state != 'completing' and upload.updated_at < cutoff:
+                logger.info(f"Discarding inactive multipart upload {upload_id}")
+                del self._uploads[upload_id]
+                # A part still being written sees this and does not move into the removed directory
+                upload.state = 'expired'
+                shutil.rmtree(upload.path, ignore_errors=True)
+
+    def create(self, filename):
+        upload = MultipartUpload(filename, os.path.join(self.spool_dir, uuid.uuid4().hex))
+        os.makedirs(upload.path)
+        with self._lock:
+            self._expire()
+            self._uploads[upload.id] = upload
+        return upload
+
+    def get(self, upload_id):
+        with self._lock:
+            self._expire()
+            return self._uploads.get(upload_id)
+
+    def write_part(self, upload, part_number, chunks, max_size=None):
+        """Spool one part from an iterable of chunks; returns its `{"size", "sha256"}` record.
+
+        Raises ValueError if the upload no longer accepts parts, and
+        RequestEntityTooLarge if the part exceeds `max_size` bytes.
+        """
+        if not 1 <= part_number <= self.max_parts:
+            raise ValueError(f"Part numbers must be between 1 and {self.max_parts}")
+        temp_path = f'{upload.part_path(part_number)}.{uuid.uuid4().hex}.tmp'
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            try:
+                spool = open(temp_path, 'wb')
+            except FileNotFoundError:
+                # The upload was discarded, and its directory removed, since the caller found it
+                raise ValueError(f"Upload {upload.id} is {upload.state}")
+            with spool:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise RequestEntityTooLarge()
+                    digest.update(chunk)
+                    spool.write(chunk)
+            with self._lock:
+                if upload.state != 'open':
+                    raise ValueError(f"Upload {upload.id} is {upload.state}")
+                os.replace(temp_path, upload.part_path(part_number))
+                part = upload.parts[part_number] = {"size": size, "sha256": digest.hexdigest()}
+                upload.updated_at = time.time()
+            return part
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def start_completing(self, upload):
+        """Stop accepting parts and return a reader over them, or None if the upload is not open."""
+        with self._lock:
+            if upload.state != 'open':
+                return None
+            upload.state = 'completing'
+            numbers = sorted(upload.parts)
+        return PartsReader([upload.part_path(number) for number in numbers])
+
+    def reopen(self, upload):
+        """Accept parts again after a failed completion."""
+        with self._lock:
+            upload.state = 'open'
+            upload.updated_at = time.time()
+
+    def finish(self, upload, result):
+        """Record the outcome of a completed upload and delete its parts."""
+        with self._lock:
+            upload.state = 'done'
+            upload.result = result
+            upload.updated_at = time.time()
+        shutil.rmtree(upload.path, ignore_errors=True)
+
+    def abort(self, upload):
+        with self._lock:
+            if upload.state == 'completing':
+                return False
+            self._uploads.pop(upload.id, None)
+            upload.state = 'aborted'
+        shutil.rmtree(upload.path, ignore_errors=True)
+        return True
@@ -0,0 +1,228 @@
+"""Reads ONNX model signatures by decoding only the interface fields of the
+ModelProto and skipping everything else, weights included, by length prefix.
+"""
+from config.model_config import ONNX_READ_WINDOW
+
+# TensorProto.DataType values, named the way onnxruntime reports them
+ELEM_TYPES = {
+    1: 'float', 2: 'uint8', 3: 'int8', 4: 'uint16', 5: 'int16', 6: 'int32',
+    7: 'int64', 8: 'string', 9: 'bool', 10: 'float16', 11: 'double',
+    12: 'uint32', 13: 'uint64', 14: 'complex64', 15: 'complex128',
+    16: 'bfloat16', 17: 'float8e4m3fn', 18: 'float8e4m3fnuz', 19: 'float8e5m2',
+    20: 'float8e5m2fnuz', 21: 'uint4', 22: 'int4', 23: 'float4e2m1',
+}
+
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_LENGTH_DELIMITED = 2
+WIRE_FIXED32 = 5
+
+class _WindowedReader:
+    """Serves small reads from a window of `window` bytes, refetching only when a read falls outside it."""
+
+    def __init__(self, read_at, window=ONNX_READ_WINDOW):
+        self._read_at = read_at
+        self._window = window
+        self._start = 0
+        self._data = b''
+        self.bytes_read = 0
+
+    def read(self, offset, length):
+        end = offset + length
+        if offset < self._start or end > self._start + len(self._data):
+            self._start = offset
+            self._data = self._read_at(offset, max(length, self._window))
+            self.bytes_read += len(self._data)
+        data = self._data[offset - self._start:end - self._start]
+        if len(data) < length:
+            raise ValueError("Truncated ONNX model")
+        return data
+
+def _read_varint(reader, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = reader.read(pos, 1)[0]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+        if shift >= 64:
+            raise ValueError("Malformed varint in ONNX model")
+
+def _signed(value):
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def _iter_fields(reader, start, end):
+    """Yield `(field_number, wire_type, value)` for each field in `[start, end)`.
+
+    Varints are decoded; length-delimited fields yield their `(start, end)`
+    span without reading it, so callers only pay for the fields they use.
+    """
+    for field, wire_type, value, _, _ in _iter_field_spans(reader, start, end):
+        yield field, wire_type, value
+
+def _iter_field_spans(reader, start, end):
+    """Like `_iter_fields`, but also yield where each field starts and ends, key included."""
+    pos = start
+    while pos < end:
+        field_start = pos
+        key, pos = _read_varint(reader, pos)
+        field, wire_type = key >> 3, key & 0x7
+        if field == 0:
+            raise ValueError("Invalid field number in ONNX model")
+        if wire_type == WIRE_VARINT:
+            value, pos = _read_varint(reader, pos)
+        elif wire_type == WIRE_LENGTH_DELIMITED:
+            length, pos = _read_varint(reader, pos)
+            value = (pos, pos + length)
+            pos += length
+        elif wire_type == WIRE_FIXED64:
+            value = None
+            pos += 8
+        elif wire_type == WIRE_FIXED32:
+            value = None
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported wire type {wire_type} in ONNX model")
+        if pos > end:
+            raise ValueError("Truncated ONNX model")
+        yield field, wire_type, value, field_start, pos
+
+def _read_string(reader, span):
+    start, end = span
+    return reader.read(start, end - start).decode('utf-8', 'replace') if end > start else ''
+
+def _parse_shape(reader, span):
+    shape = []
+    for field, wire_type, value in _iter_fields(reader, *span):
+        if field != 1 or wire_type != WIRE_LENGTH_DELIMITED:
+            continue
+        dim = None
+        for dim_field, dim_wire, dim_value in _iter_fields(reader, *value):
+            if dim_field == 1 and dim_wire == WIRE_VARINT:
+                dim = _signed(dim_value)
+            elif dim_field == 2 and dim_wire == WIRE_LENGTH_DELIMITED:
+                dim = _read_string(reader, dim_value)
+        shape.append(dim)
+    return shape
+
+def _parse_type(reader, span):
+    """Return `(type_string, shape)` for a TypeProto, formatted like onnxruntime's NodeArg."""
+    for field, wire_type, value in _iter_fields(reader, *span):
+        if wire_type != WIRE_LENGTH_DELIMITED:
+            continue
+        if field in (1, 8):  # tensor_type, sparse_tensor_type
+            elem_type, shape = 0, []
+            for inner_field, inner_wire, inner_value in _iter_fields(reader, *value):
+                if inner_field == 1 and inner_wire == WIRE_VARINT:
+                    elem_type = inner_value
+                elif inner_field == 2 and inner_wire == WIRE_LENGTH_DELIMITED:
+                    shape = _parse_shape(reader, inner_value)
+            kind = 'tensor' if field == 1 else 'sparse_tensor'
+            return f"{kind}({ELEM_TYPES.get(elem_type, 'undefined')})", shape
+        if field in (4, 9):  # sequence_type, optional_type
+            elem = 'undefined'
+            for inner_field, inner_wire, inner_value in _iter_fields(reader, *value):
+                if inner_field == 1 and inner_wire == WIRE_LENGTH_DELIMITED:
+                    elem = _parse_type(reader, inner_value)[0]
+            return f"{'seq' if field == 4 else 'optional'}({elem})", []
+        if field == 5:  # map_type
+            key, elem = 'undefined', 'undefined'
+            for inner_field, inner_wire, inner_value in _iter_fields(reader, *value):
+                if inner_field == 1 and inner_wire == WIRE_VARINT:
+                    key = ELEM_TYPES.get(inner_value, 'undefined')
+                elif inner_field == 2 and inner_wire == WIRE_LENGTH_DELIMITED:
+                    elem = _parse_type(reader, inner_value)[0]
+            return f"map({key},{elem})", []
+    return 'undefined', []
+
+def _parse_value_info(reader, span):
+    name, type_string, shape = '', 'undefined', []
+    for field, wire_type, value in _iter_fields(reader, *span):
+        if field == 1 and wire_type == WIRE_LENGTH_DELIMITED:
+            name = _read_string(reader, value)
+        elif field == 2 and wire_type == WIRE_LENGTH_DELIMITED:
+            type_string, shape = _parse_type(reader, value)
+    return {"name": name, "type": type_string, "shape": shape}
+
+def _parse_initializer_name(reader, span):
+    for field, wire_type, value in _iter_fields(reader, *span):
+        if field == 8 and wire_type == WIRE_LENGTH_DELIMITED:
+            return _read_string(reader, value)
+    return None
+
+def _parse_graph(reader, span):
+    inputs, outputs, initializers = [], [], set()
+    for field, wire_type, value in _iter_fields(reader, *span):
+        if wire_type != WIRE_LENGTH_DELIMITED:
+            continue
+        if field == 11:
+            inputs.append(_parse_value_info(reader, value))
+        elif field == 12:
+            outputs.append(_parse_value_info(reader, value))
+        elif field == 5:
+            initializers.add(_parse_initializer_name(reader, value))
+    # Models with IR version < 4 may list initializers as graph inputs;
+    # onnxruntime does not report those as inputs, so neither do we.
+    inputs = [value_info for value_info in inputs if value_info['name'] not in initializers]
+    return inputs, outputs
+
+def read_onnx_signature(read_at, size, window=ONNX_READ_WINDOW):
+    """Parse the interface of an ONNX model of `size` bytes accessed through `read_at(offset, length)`.
+
+    Returns a dict with `input_types` and `output_types` (in the same format
+    as the onnxruntime-based inspection) plus `ir_version`, `producer_name`,
+    `producer_version` and `opset_import`, and `bytes_read` for the amount
+    of data actually fetched. Raises ValueError if the data is not an ONNX
+    model.
+    """
+    reader = _WindowedReader(read_at, window)
+    info = {
+        "ir_version": None,
+        "producer_name": '',
+        "producer_version": '',
+        "opset_import": [],
+    }
+    graph = None
+    # The graph is parsed where it is found, so the whole model is read in a
+    # single forward pass with no seeks back into data already skipped.
+    for field, wire_type, value in _iter_fields(reader, 0, size):
+        if field == 1 and wire_type == WIRE_VARINT:
+            info["ir_version"] = value
+        elif field == 2 and wire_type == WIRE_LENGTH_DELIMITED:
+            info["producer_name"] = _read_string(reader, value)
+        elif field == 3 and wire_type == WIRE_LENGTH_DELIMITED:
+            info["producer_version"] = _read_string(reader, value)
+        elif field == 7 and wire_type == WIRE_LENGTH_DELIMITED:
+            graph = _parse_graph(reader, value)
+        elif field == 8 and wire_type == WIRE_LENGTH_DELIMITED:
+            opset = {"domain": '', "version": None}
+            for opset_field, opset_wire, opset_value in _iter_fields(reader, *value):
+                if opset_field == 1 and opset_wire == WIRE_LENGTH_DELIMITED:
+                    opset["domain"] = _read_string(reader, opset_value)
+                elif opset_field == 2 and opset_wire == WIRE_VARINT:
+                    opset["version"] = opset_value
+            info["opset_import"].append(opset)
+
+    if info["ir_version"] is None or graph is None:
+        raise ValueError("Not an ONNX model")
+
+    info["input_types"], info["output_types"] = graph
+    info["bytes_read"] = reader.bytes_read
+    return info
+
+def read_onnx_signature_from_file(file):
+    """Parse the signature of an ONNX model from a seekable binary file object."""
+    file.seek(0, 2)
+    size = file.tell()
+
+    def read_at(offset, length):
+        file.seek(offset)
+        return file.read(length)
+
+    try:
+        return read_onnx_signature(read_at, size)
+    finally:
+        file.seek(0)
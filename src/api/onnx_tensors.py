@@ -0,0 +1,197 @@
+"""Splits ONNX models into a graph and per-initializer tensor objects, and
+puts them back together.
+
+A split model uses the ONNX external-data layout. The graph is a regular
+ModelProto whose large initializers have `data_location` set to EXTERNAL
+and an `external_data` entry naming a file. Each of those files holds the
+raw bytes of one tensor. Both directions work on the protobuf wire format,
+copying every field except the tensor payloads, so weights are never
+decoded or held in memory.
+"""
+import json
+from api.onnx_metadata import (
+    _WindowedReader, _iter_fields, _iter_field_spans, _read_string, WIRE_LENGTH_DELIMITED, WIRE_VARINT,
+)
+from config.model_config import DOWNLOAD_CHUNK_SIZE
+
+MANIFEST_FORMAT = 'onnx-external-data'
+# A manifest holds one CID per tensor, so even large models stay well under this
+MANIFEST_MAX_BYTES = 4 * 1024 * 1024
+
+MODEL_GRAPH = 7
+GRAPH_INITIALIZER = 5
+TENSOR_NAME = 8
+TENSOR_RAW_DATA = 9
+TENSOR_EXTERNAL_DATA = 13
+TENSOR_DATA_LOCATION = 14
+ENTRY_KEY = 1
+ENTRY_VALUE = 2
+DATA_LOCATION_EXTERNAL = 1
+
+class NotAManifest(ValueError):
+    """Raised when content read as a manifest is not one."""
+
+class TensorData:
+    """Stands for the raw bytes of the tensor stored at `location` in a list of pieces."""
+
+    def __init__(self, location, size):
+        self.location = location
+        self.size = size
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if not value:
+            out.append(byte)
+            return bytes(out)
+        out.append(byte | 0x80)
+
+def _key(field, wire_type):
+    return _varint(field << 3 | wire_type)
+
+def pieces_length(pieces):
+    return sum(piece.size if isinstance(piece, TensorData) else len(piece) for piece in pieces)
+
+def _length_delimited(field, pieces):
+    return [_key(field, WIRE_LENGTH_DELIMITED) + _varint(pieces_length(pieces)), *pieces]
+
+def _rewrite_message(reader, span, rewrite_field):
+    """Re-encode the message in `span` as a list of pieces.
+
+    `rewrite_field(field, wire_type, value)` returns the pieces replacing a
+    field, or None to copy it unchanged.
+    """
+    pieces = []
+    for field, wire_type, value, field_start, field_end in _iter_field_spans(reader, *span):
+        replacement = rewrite_field(field, wire_type, value)
+        if replacement is None:
+            pieces.append(reader.read(field_start, field_end - field_start))
+        else:
+            pieces.extend(replacement)
+    return pieces
+
+def _rewrite_initializers(reader, size, rewrite_initializer):
+    """Re-encode a ModelProto, passing the span of each graph initializer to `rewrite_initializer`."""
+    found_graph = False
+
+    def rewrite_graph_field(field, wire_type, value):
+        if field == GRAPH_INITIALIZER and wire_type == WIRE_LENGTH_DELIMITED:
+            return rewrite_initializer(value)
+        return None
+
+    def rewrite_model_field(field, wire_type, value):
+        nonlocal found_graph
+        if field == MODEL_GRAPH and wire_type == WIRE_LENGTH_DELIMITED:
+            found_graph = True
+            return _length_delimited(MODEL_GRAPH, _rewrite_message(reader, value, rewrite_graph_field))
+        return None
+
+    pieces = _rewrite_message(reader, (0, size), rewrite_model_field)
+    if not found_graph:
+        raise ValueError("Not an ONNX model")
+    return pieces
+
+def _external_data_entry(key, value):
+    entry = _length_delimited(ENTRY_KEY, [key.encode()]) + _length_delimited(ENTRY_VALUE, [value.encode()])
+    return _length_delimited(TENSOR_EXTERNAL_DATA, entry)
+
+def split_model(read_at, size, min_tensor_bytes):
+    """Move the raw data of initializers of at least `min_tensor_bytes` out of a model.
+
+    Returns `(graph, tensors)`: the external-data graph as bytes, and for
+    each moved tensor a dict with its `name`, the `location` the graph
+    refers to it by, and the `offset` and `length` of its raw bytes in the
+    original model. Raises ValueError if the data is not an ONNX model.
+    """
+    reader = _WindowedReader(read_at)
+    tensors = []
+
+    def externalize(span):
+        name, raw_data = None, None
+        for field, wire_type, value in _iter_fields(reader, *span):
+            if field == TENSOR_NAME and wire_type == WIRE_LENGTH_DELIMITED:
+                name = _read_string(reader, value)
+            elif field == TENSOR_RAW_DATA and wire_type == WIRE_LENGTH_DELIMITED:
+                raw_data = value
+        if raw_data is None or raw_data[1] - raw_data[0] < min_tensor_bytes:
+            return None
+
+        location = f'tensor_{len(tensors):05d}.bin'
+        length = raw_data[1] - raw_data[0]
+        tensors.append({"name": name, "location": location, "offset": raw_data[0], "length": length})
+        pieces = _rewrite_message(reader, span, lambda field, wire_type, value: [] if field == TENSOR_RAW_DATA else None)
+        pieces += _external_data_entry('location', location) + _external_data_entry('length', str(length))
+        pieces.append(_key(TENSOR_DATA_LOCATION, WIRE_VARINT) + _varint(DATA_LOCATION_EXTERNAL))
+        return _length_delimited(GRAPH_INITIALIZER, pieces)
+
+    graph = b''.join(_rewrite_initializers(reader, size, externalize))
+    return graph, tensors
+
+def reassembly_pieces(graph, tensor_sizes):
+    """Plan a single-file model from an external-data `graph`.
+
+    `tensor_sizes` maps each external location to the size of its data.
+    Returns a list of bytes and `TensorData` pieces that, concatenated,
+    form a standard `.onnx` file with every tensor's data inline.
+    """
+    reader = _WindowedReader(lambda offset, length: graph[offset:offset + length], window=max(len(graph), 1))
+
+    def inline(span):
+        location, external = None, False
+        for field, wire_type, value in _iter_fields(reader, *span):
+            if field == TENSOR_DATA_LOCATION and wire_type == WIRE_VARINT:
+                external = value == DATA_LOCATION_EXTERNAL
+            elif field == TENSOR_EXTERNAL_DATA and wire_type == WIRE_LENGTH_DELIMITED:
+                entry = {}
+                for entry_field, entry_wire, entry_value in _iter_fields(reader, *value):
+                    if entry_wire == WIRE_LENGTH_DELIMITED:
+                        entry[entry_field] = _read_string(reader, entry_value)
+                if entry.get(ENTRY_KEY) == 'location':
+                    location = entry.get(ENTRY_VALUE)
+        if not external or location not in tensor_sizes:
+            return None
+
+        size = tensor_sizes[location]
+        pieces = _rewrite_message(
+            reader, span,
+            lambda field, wire_type, value: [] if field in (TENSOR_EXTERNAL_DATA, TENSOR_DATA_LOCATION) else None,
+        )
+        pieces += [_key(TENSOR_RAW_DATA, WIRE_LENGTH_DELIMITED) + _varint(size), TensorData(location, size)]
+        return _length_delimited(GRAPH_INITIALIZER, pieces)
+
+    return _rewrite_initializers(reader, len(graph), inline)
+
+def piece_ranges(pieces, start, stop):
+    """Yield `(piece, low, high)` for the bytes `low:high` of each piece inside `start:stop` of the file."""
+    offset = 0
+    for piece in pieces:
+        piece_size = piece.size if isinstance(piece, TensorData) else len(piece)
+        piece_start, offset = offset, offset + piece_size
+        if offset <= start or piece_start >= stop:
+            continue
+        yield piece, max(start - piece_start, 0), min(stop, offset) - piece_start
+
+def parse_manifest(cid, data):
+    """Return the manifest stored under `cid`, from at most its first MANIFEST_MAX_BYTES + 1 bytes."""
+    if len(data) > MANIFEST_MAX_BYTES:
+        raise NotAManifest(f"{cid} is too large to be an ONNX tensor manifest")
+    try:
+        manifest = json.loads(data)
+    except ValueError:
+        manifest = None
+    if not isinstance(manifest, dict) or manifest.get('format') != MANIFEST_FORMAT:
+        raise NotAManifest(f"{cid} is not an ONNX tensor manifest")
+    return manifest
+
+def iter_tensor_data(file, tensor, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Yield the raw bytes of a tensor found by `split_model` from the open original model."""
+    file.seek(tensor["offset"])
+    remaining = tensor["length"]
+    while remaining > 0:
+        chunk = file.read(min(chunk_size, remaining))
+        if not chunk:
+            raise ValueError("Truncated ONNX model")
+        remaining -= len(chunk)
+        yield chunk
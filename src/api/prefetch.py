@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from config.model_config import ZIP_PREFETCH_WORKERS, ZIP_PREFETCH_BYTES
+
+logger = logging.getLogger(__name__)
+
+class _PrefetchedFile:
+    def __init__(self, name, cid):
+        self.name = name
+        self.cid = cid
+        self.chunks = deque()
+        self.done = False
+        self.error = None
+
+class CIDPrefetcher:
+    """Fetches several CIDs concurrently ahead of a sequential consumer.
+
+    `entries()` yields `(name, chunks)` pairs in the original order. Files
+    after the one currently being consumed are fetched by a bounded thread
+    pool and buffered until `max_inflight_bytes` is reached; the file being
+    consumed is never blocked by the budget once its buffer is drained, so
+    the consumer always makes progress.
+    """
+
+    def __init__(self, fetch, files, max_workers=ZIP_PREFETCH_WORKERS, max_inflight_bytes=ZIP_PREFETCH_BYTES):
+        self._fetch = fetch
+        self._files = [_PrefetchedFile(name, cid) for name, cid in files]
+        self._max_inflight_bytes = max_inflight_bytes
+        self._inflight_bytes = 0
+        self._head = 0
+        self._closed = False
+        # Names of the files `entries()` left out
+        self.skipped = []
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='cid-prefetch')
+        for index in range(len(self._files)):
+            self._executor.submit(self._worker, index)
+
+    def _worker(self, index):
+        entry = self._files[index]
+        try:
+            for chunk in self._fetch(entry.cid):
+                if not chunk:
+                    continue
+                with self._cond:
+                    while not self._closed and self._inflight_bytes + len(chunk) > self._max_inflight_bytes \
+                            and (index != self._head or entry.chunks):
+                        self._cond.wait()
+                    if self._closed:
+                        return
+                    entry.chunks.append(chunk)
+                    self._inflight_bytes += len(chunk)
+                    self._cond.notify_all()
+        except Exception as e:
+            entry.error = e
+        finally:
+            with self._cond:
+                entry.done = True
+                self._cond.notify_all()
+
+    def _iter_chunks(self, entry):
+        while True:
+            with self._cond:
+                while not entry.chunks and not entry.done:
+                    self._cond.wait()
+                if entry.chunks:
+                    chunk = entry.chunks.popleft()
+                    self._inflight_bytes -= len(chunk)
+                    self._cond.notify_all()
+                elif entry.error is not None:
+                    raise entry.error
+                else:
+                    return
+            yield chunk
+
+    def entries(self):
+        """Yield `(name, chunks)` in order, skipping files that fail before producing any data."""
+        for index, entry in enumerate(self._files):
+            with self._cond:
+                self._head = index
+                self._cond.notify_all()
+                while not entry.chunks and not entry.done:
+                    self._cond.wait()
+                failed = entry.done and not entry.chunks and entry.error is not None
+            if failed:
+                logger.error(f"Error processing file {entry.name} with CID {entry.cid}: {str(entry.error)}")
+                self.skipped.append(entry.name)
+                continue
+            logger.info(f"Adding file to zip: {entry.name} (CID: {entry.cid})")
+            yield entry.name, self._iter_chunks(entry)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            for entry in self._files:
+                entry.chunks.clear()
+            self._inflight_bytes = 0
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+class AsyncCIDPrefetcher:
+    """asyncio counterpart of `CIDPrefetcher` for an async `fetch(cid)` chunk iterator.
+
+    Up to `max_workers` files are fetched by tasks on the event loop, under
+    the same byte budget and head-of-line rule as the threaded version.
+    """
+
+    def __init__(self, fetch, files, max_workers=ZIP_PREFETCH_WORKERS, max_inflight_bytes=ZIP_PREFETCH_BYTES):
+        self._fetch = fetch
+        self._files = [_PrefetchedFile(name, cid) for name, cid in files]
+        self._max_inflight_bytes = max_inflight_bytes
+        self._inflight_bytes = 0
+        self._head = 0
+        self._closed = False
+        self._cond = asyncio.Condition()
+        self._slots = asyncio.Semaphore(max_workers)
+        self._tasks = [asyncio.create_task(self._worker(index)) for index in range(len(self._files))]
+
+    async def _worker(self, index):
+        entry = self._files[index]
+        try:
+            async with self._slots:
+                async for chunk in self._fetch(entry.cid):
+                    if not chunk:
+                        continue
+                    async with self._cond:
+                        while not self._closed and self._inflight_bytes + len(chunk) > self._max_inflight_bytes \
+                                and (index != self._head or entry.chunks):
+                            await self._cond.wait()
+                        if self._closed:
+                            return
+                        entry.chunks.append(chunk)
+                        self._inflight_bytes += len(chunk)
+                        self._cond.notify_all()
+        except Exception as e:
+            entry.error = e
+        finally:
+            async with self._cond:
+                entry.done = True
+                self._cond.notify_all()
+
+    async def _iter_chunks(self, entry):
+        while True:
+            async with self._cond:
+                while not entry.chunks and not entry.done:
+                    await self._cond.wait()
+                if entry.chunks:
+                    chunk = entry.chunks.popleft()
+                    self._inflight_bytes -= len(chunk)
+                    self._cond.notify_all()
+                elif entry.error is not None:
+                    raise entry.error
+                else:
+                    return
+            yield chunk
+
+    async def entries(self):
+        """Yield `(name, chunks)` in order, skipping files that fail before producing any data."""
+        for index, entry in enumerate(self._files):
+            async with self._cond:
+                self._head = index
+                self._cond.notify_all()
+                while not entry.chunks and not entry.done:
+                    await self._cond.wait()
+                failed = entry.done and not entry.chunks and entry.error is not None
+            if failed:
+                logger.error(f"Error processing file {entry.name} with CID {entry.cid}: {str(entry.error)}")
+                continue
+            logger.info(f"Adding file to zip: {entry.name} (CID: {entry.cid})")
+            yield entry.name, self._iter_chunks(entry)
+
+    async def close(self):
+        async with self._cond:
+            self._closed = True
+            for entry in self._files:
+                entry.chunks.clear()
+            self._inflight_bytes = 0
+            self._cond.notify_all()
+        for task in self._tasks:
+            task.cancel()
@@ -0,0 +1,124 @@
+"""Request-scoped profiling: a phase-level trace of each profiled request,
+plus a sampling profile of its thread when one is explicitly requested.
+
+Traces are only started when profiling is enabled, so with it off the
+cost per request is a config check. Finished profiles are kept in a
+bounded in-memory store and served by `/profiles`.
+"""
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from config.model_config import PROFILE_MAX_ENTRIES, PROFILE_SAMPLE_INTERVAL
+
+_local = threading.local()
+
+class Sampler:
+    """Samples the stack of one thread every `interval` seconds from a background thread.
+
+    Stacks are counted in collapsed form (`outer;inner;leaf`), which
+    flamegraph tools read directly.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+class RequestTrace:
+    def __init__(self, endpoint, method, sample=False):
+        self.id = uuid.uuid4().hex
+        self.endpoint = endpoint
+        self.method = method
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.phases = []
+        self.sampler = Sampler(threading.get_ident()).start() if sample else None
+
+    def record(self, name, start, duration):
+        self.phases.append({"name": name, "start": start - self._start, "duration": duration})
+
+    def finish(self, status):
+        if self.sampler is not None:
+            self.sampler.stop()
+        profile = {
+            "id": self.id,
+            "endpoint": self.endpoint,
+            "method": self.method,
+            "status": status,
+            "started_at": self.started_at,
+            "duration": time.perf_counter() - self._start,
+            "phases": self.phases,
+        }
+        if self.sampler is not None:
+            profile["samples"] = self.sampler.samples
+            profile["sample_interval"] = self.sampler.interval
+            profile["stacks"] = dict(self.sampler.stacks.most_common())
+        return profile
+
+def start_trace(endpoint, method, sample=False):
+    """Start tracing the current thread's request; phases timed on this thread are recorded."""
+    trace = _local.trace = RequestTrace(endpoint, method, sample)
+    return trace
+
+def end_trace(trace, status):
+    if getattr(_local, 'trace', None) is trace:
+        _local.trace = None
+    return trace.finish(status)
+
+def record(name, start, duration):
+    """Add a timed phase to the current thread's trace, if there is one."""
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.record(name, start, duration)
+
+class ProfileStore:
+    """Keeps the most recent `max_entries` finished profiles."""
+
+    def __init__(self, max_entries=PROFILE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._profiles = OrderedDict()
+
+    def add(self, profile):
+        with self._lock:
+            self._profiles[profile["id"]] = profile
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def summaries(self):
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [
+            {key: profile[key] for key in ('id', 'endpoint', 'method', 'status', 'started_at', 'duration')}
+            for profile in reversed(profiles)
+        ]
@@ -0,0 +1,105 @@
+"""Per-request metrics for the Flask blueprint: latency, time to first byte,
+bytes in and out, and in-flight streams, labelled by endpoint.
+"""
+import time
+from flask import g, request
+from api import metrics
+from api.closing import call_on_body_close, is_file_wrapper
+
+class CountingStream:
+    """Wraps `wsgi.input` to count the request body bytes the app actually reads."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.bytes_read = 0
+
+    def read(self, *args):
+        data = self._stream.read(*args)
+        self.bytes_read += len(data)
+        return data
+
+    def readline(self, *args):
+        data = self._stream.readline(*args)
+        self.bytes_read += len(data)
+        return data
+
+    def readinto(self, buffer):
+        length = self._stream.readinto(buffer)
+        self.bytes_read += length or 0
+        return length
+
+    def __iter__(self):
+        for line in self._stream:
+            self.bytes_read += len(line)
+            yield line
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+class MeteredBody:
+    """Response iterable that records time to first chunk and bytes sent."""
+
+    def __init__(self, body, endpoint, start_time):
+        self._body = body
+        self._endpoint = endpoint
+        self._start_time = start_time
+        self.bytes_sent = 0
+
+    def __iter__(self):
+        first = True
+        for chunk in self._body:
+            if first:
+                metrics.RESPONSE_FIRST_BYTE.observe(time.perf_counter() - self._start_time, endpoint=self._endpoint)
+                first = False
+            self.bytes_sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        if hasattr(self._body, 'close'):
+            self._body.close()
+
+def request_endpoint():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+def start_request():
+    g.metrics_start_time = time.perf_counter()
+    g.metrics_input = request.environ['wsgi.input'] = CountingStream(request.environ['wsgi.input'])
+
+def finish_request(response):
+    start_time = g.get('metrics_start_time')
+    if start_time is None:
+        return response
+    endpoint = request_endpoint()
+    method = request.method
+    input_stream = g.metrics_input
+
+    body = None
+    if is_file_wrapper(response.response):
+        # Left unwrapped so the server can still use sendfile
+        metrics.RESPONSE_FIRST_BYTE.observe(time.perf_counter() - start_time, endpoint=endpoint)
+    elif response.is_streamed:
+        body = response.response = MeteredBody(response.response, endpoint, start_time)
+    else:
+        metrics.RESPONSE_FIRST_BYTE.observe(time.perf_counter() - start_time, endpoint=endpoint)
+
+    streaming = response.is_streamed
+    if streaming:
+        metrics.INFLIGHT_STREAMS.inc(endpoint=endpoint)
+
+    def on_close():
+        if streaming:
+            metrics.INFLIGHT_STREAMS.dec(endpoint=endpoint)
+        sent = body.bytes_sent if body is not None else (response.content_length or 0)
+        metrics.RESPONSE_BYTES.observe(sent, endpoint=endpoint)
+        metrics.REQUEST_BYTES.observe(input_stream.bytes_read, endpoint=endpoint)
+        metrics.REQUEST_LATENCY.observe(
+            time.perf_counter() - start_time, endpoint=endpoint, method=method, status=response.status_code,
+        )
+
+    call_on_body_close(response, on_close)
+    return response
+
+def install(blueprint):
+    """Record request metrics for every route of `blueprint`."""
+    blueprint.before_request(start_request)
+    blueprint.after_request(finish_request)
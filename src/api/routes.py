@@ -1,26 +1,600 @@
-from flask import Blueprint, request, Response, current_app, jsonify, stream_with_context
-from api.ipfs_client import IPFSClient
+from flask import Blueprint, request, Response, current_app, jsonify, stream_with_context, g, redirect
+from api.ipfs_client import AddOptions, IPFSClient, iter_file_chunks
+from api.upload_jobs import UploadJobManager
+from api.multipart_uploads import MultipartUploadManager
+from api.warmup import Warmup
+from api.admission import AdmissionController, ShapedBody, ShapedStream, retry_after
+from api.closing import call_on_body_close
+from api.cache import CIDCache, NotCacheable, iter_file_range
+from api.metadata import MetadataStore
+from api.onnx_metadata import read_onnx_signature, read_onnx_signature_from_file
+from api.onnx_tensors import (
+    MANIFEST_FORMAT, MANIFEST_MAX_BYTES, NotAManifest, TensorData, iter_tensor_data, parse_manifest, piece_ranges,
+    pieces_length, reassembly_pieces, split_model,
+)
+from api.streaming import StreamingUpload
+from api.prefetch import CIDPrefetcher
+from api.zip_stream import parse_zip_request, stream_zip, ZIP_COMPRESSION_MODES
+from api import metrics, profiling, request_metrics
+from config.model_config import ZIP_COMPRESSION, ONNX_INSPECTION, PROFILING_ENABLED, PROFILE_SLOW_THRESHOLD, UPLOAD_DEDUP
+from config.model_config import BATCH_INFO_MAX_CIDS, BATCH_INFO_WORKERS, MULTIPART_MAX_PART_SIZE
+from config.model_config import WARMUP_CIDS, WARMUP_TOP, WARMUP_PIN
+from config.model_config import ONNX_STORAGE_LAYOUT, ONNX_TENSOR_MIN_BYTES, RATE_LIMIT_CLIENT_HEADER
+from config.model_config import DOWNLOAD_OFFLOAD, DOWNLOAD_OFFLOAD_PREFIX, IPFS_GATEWAY_URL
+from config.model_config import ZIP_CACHE_DIR, ZIP_CACHE_MAX_BYTES
+import hashlib
 import logging
 from http import HTTPStatus
-from io import BytesIO
-import zipfile
 from werkzeug.datastructures import Headers
 import json
 from werkzeug.datastructures import FileStorage
-import time
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import time
 import os
 import onnxruntime as ort
+from werkzeug.datastructures import ContentRange
+from werkzeug.exceptions import RequestEntityTooLarge, RequestedRangeNotSatisfiable
+from werkzeug.http import parse_options_header
+from werkzeug.wsgi import wrap_file
+from urllib.parse import quote, urlencode
 
 MAX_FILE_SIZE = 10 * 1024 * 1024 * 1024  # 10GB
+STORAGE_LAYOUTS = ('blob', 'tensors')
+# Endpoints that move model-sized bodies and need a transfer slot
+TRANSFER_ENDPOINTS = ('api.upload', 'api.upload_part', 'api.download', 'api.download_raw', 'api.download_zip')
 
 bp = Blueprint('api', __name__)
+request_metrics.install(bp)
 
 ipfs_client = IPFSClient()
+cid_cache = CIDCache()
+zip_cache = CIDCache(ZIP_CACHE_DIR, ZIP_CACHE_MAX_BYTES)
+metadata_store = MetadataStore()
+upload_jobs = UploadJobManager()
+multipart_uploads = MultipartUploadManager()
+warmup = Warmup()
+profile_store = profiling.ProfileStore()
+admission = AdmissionController()
+# Shared by all /batch_info requests, so IPFS sees at most BATCH_INFO_WORKERS lookups at once
+batch_info_executor = ThreadPoolExecutor(max_workers=BATCH_INFO_WORKERS, thread_name_prefix='batch-info')
+
+def is_profile_requested():
+    if not PROFILING_ENABLED:
+        return False
+    return request.args.get('profile', '').lower() == 'true' or request.headers.get('X-Profile', '').lower() in ('1', 'true')
+
+@bp.before_request
+def start_profiling():
+    sample = is_profile_requested()
+    if sample or PROFILE_SLOW_THRESHOLD > 0:
+        g.profile_trace = profiling.start_trace(request_metrics.request_endpoint(), request.method, sample=sample)
+
+@bp.after_request
+def finish_profiling(response):
+    trace = g.get('profile_trace')
+    if trace is None:
+        return response
+    sampled = trace.sampler is not None
+    if sampled:
+        response.headers['X-Profile-Id'] = trace.id
+
+    # Streamed bodies are produced after this hook, so the trace ends when the response is closed
+    def on_close():
+        profile = profiling.end_trace(trace, response.status_code)
+        if sampled or 0 < PROFILE_SLOW_THRESHOLD <= profile['duration']:
+            profile_store.add(profile)
+
+    call_on_body_close(response, on_close)
+    return response
+
+def client_id():
+    """Identify the client for admission control by its API key header if the key is known, or else its address."""
+    return admission.identify(request.headers.get(RATE_LIMIT_CLIENT_HEADER), request.remote_addr)
+
+def too_many_requests(message, seconds, reason):
+    metrics.ADMISSION_REJECTED.inc(reason=reason)
+    return Response(message, status=HTTPStatus.TOO_MANY_REQUESTS, headers={'Retry-After': retry_after(seconds)})
+
+@bp.before_request
+def admit_request():
+    if not admission.enabled:
+        return None
+    client = admission.client(client_id())
+    if client is None:
+        return None
+    wait = admission.admit(client)
+    if wait:
+        return too_many_requests("Request rate limit exceeded", wait, 'requests')
+
+    if admission.transfers is not None and request.endpoint in TRANSFER_ENDPOINTS:
+        with metrics.TRANSFER_QUEUE_WAIT.time():
+            acquired = admission.transfers.acquire()
+        if not acquired:
+            return too_many_requests("Too many transfers in progress", 1, 'transfers')
+        g.transfer_slot = True
+
+    if client.byte_bucket is not None:
+        g.byte_bucket = client.byte_bucket
+        request.environ['wsgi.input'] = ShapedStream(request.environ['wsgi.input'], client.byte_bucket)
+    return None
+
+@bp.after_request
+def shape_response(response):
+    bucket = g.get('byte_bucket')
+    if bucket is not None:
+        # Pacing needs the body in chunks, so shaped clients do not get sendfile
+        response.response = ShapedBody(response.response, bucket)
+        response.direct_passthrough = False
+    if g.pop('transfer_slot', False):
+        # Held until the body has been sent, which for streams is after this hook
+        call_on_body_close(response, admission.transfers.release)
+    return response
+
+@bp.teardown_request
+def release_transfer_slot(exc):
+    # Only still set if the view failed before a response was built
+    if g.pop('transfer_slot', False):
+        admission.transfers.release()
 
 def is_stream_requested():
     return request.args.get('stream', '').lower() == 'true'
 
+def fetch_cid(cid):
+    """Iterate over the content of a CID, going through the local cache."""
+    return cid_cache.stream(cid, ipfs_client.cat_stream)
+
+def hash_chunks(chunks, digest):
+    """Pass chunks through, feeding them to a hashlib `digest` on the way."""
+    for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+
+def find_known_upload(content_digest):
+    """Return `(cid, metadata)` for content that was uploaded before, or None.
+
+    The content is assumed to still be pinned by the IPFS node it was added to.
+    """
+    if not UPLOAD_DEDUP:
+        return None
+    cid = metadata_store.find_digest(content_digest)
+    if cid is None:
+        return None
+    metrics.UPLOAD_DEDUPLICATED.inc()
+    return cid, metadata_store.get(cid) or {}
+
+def record_upload(file_cid, content_digest, **fields):
+    """Store an upload's metadata and index its content digest."""
+    metadata_store.put(file_cid, **fields)
+    if UPLOAD_DEDUP:
+        metadata_store.put_digest(content_digest, file_cid)
+
+def requested_add_options():
+    """The DAG layout for an upload's IPFS add, from its query parameters; raises ValueError if invalid."""
+    return AddOptions.from_params(request.args)
+
+def digest_key(content_digest, add_options, layout='blob'):
+    """Key an upload in the digest index: the same content added differently has a different CID."""
+    key = content_digest if add_options.is_kubo_default else f'{content_digest}:{add_options.key}'
+    return key if layout == 'blob' else f'{key}:{layout}'
+
+def signature_fields(metadata):
+    """The ONNX signature fields of a metadata record that are set, for upload responses."""
+    return {field: metadata[field] for field in ('input_types', 'output_types') if metadata.get(field)}
+
+def requested_layout():
+    """The storage layout asked for with `?layout=`, defaulting to ONNX_STORAGE_LAYOUT; None if unknown."""
+    layout = request.args.get('layout', ONNX_STORAGE_LAYOUT).lower()
+    return layout if layout in STORAGE_LAYOUTS else None
+
+def split_onnx_file(file):
+    """Plan storing an ONNX file in the external-data layout; raises ValueError if it cannot be split."""
+    file.seek(0, 2)
+    size = file.tell()
+
+    def read_at(offset, length):
+        file.seek(offset)
+        return file.read(length)
+
+    try:
+        return split_model(read_at, size, ONNX_TENSOR_MIN_BYTES)
+    finally:
+        file.seek(0)
+
+def add_onnx_tensors(file, graph, tensors, add_options):
+    """Add a split model's tensors, graph and manifest to IPFS; returns `(manifest_cid, manifest, reused)`.
+
+    Tensors whose bytes were stored before, by this or another model, are
+    found in the digest index and not added again; `reused` counts them.
+    """
+    manifest_tensors = []
+    reused = 0
+    for tensor in tensors:
+        digest = hashlib.sha256()
+        for chunk in iter_tensor_data(file, tensor):
+            digest.update(chunk)
+        tensor_key = digest_key(digest.hexdigest(), add_options)
+        tensor_cid = metadata_store.find_digest(tensor_key) if UPLOAD_DEDUP else None
+        if tensor_cid is None:
+            tensor_cid = ipfs_client.add_stream(iter_tensor_data(file, tensor), options=add_options)
+            if UPLOAD_DEDUP:
+                metadata_store.put_digest(tensor_key, tensor_cid)
+        else:
+            reused += 1
+        manifest_tensors.append({
+            "name": tensor["name"], "location": tensor["location"], "cid": tensor_cid, "size": tensor["length"],
+        })
+    file.seek(0)
+
+    tensor_sizes = {tensor["location"]: tensor["size"] for tensor in manifest_tensors}
+    manifest = {
+        "format": MANIFEST_FORMAT,
+        "graph": ipfs_client.add_bytes(graph, options=add_options),
+        "graph_size": len(graph),
+        "size": pieces_length(reassembly_pieces(graph, tensor_sizes)),
+        "tensors": manifest_tensors,
+    }
+    manifest_cid = ipfs_client.add_bytes(json.dumps(manifest, sort_keys=True).encode(), options=add_options)
+    metadata_store.put_manifest(manifest_cid, manifest)
+    return manifest_cid, manifest, reused
+
+def find_manifest(cid):
+    """Return the manifest if `cid` is a model stored in the tensors layout, else None.
+
+    Manifests are known from local uploads; with `?layout=tensors` an
+    unknown CID is read as a manifest, raising NotAManifest if it is not
+    one. No more than a manifest can hold is read, so asking this of a
+    model does not load the model into memory.
+    """
+    manifest = metadata_store.get_manifest(cid)
+    if manifest is None and request.args.get('layout', '').lower() == 'tensors':
+        manifest = parse_manifest(cid, b''.join(ipfs_client.cat_stream(cid, length=MANIFEST_MAX_BYTES + 1)))
+        metadata_store.put_manifest(cid, manifest)
+    return manifest
+
+def send_onnx_tensors(file_cid, manifest, headers=None):
+    """Serve a model stored in the tensors layout as a single standard `.onnx` file.
+
+    The file is streamed piece by piece from the graph and tensor CIDs,
+    so its size is known up front and single byte ranges are supported.
+    """
+    graph = b''.join(fetch_cid(manifest['graph']))
+    tensor_cids = {tensor['location']: tensor['cid'] for tensor in manifest['tensors']}
+    pieces = reassembly_pieces(graph, {tensor['location']: tensor['size'] for tensor in manifest['tensors']})
+    file_size = pieces_length(pieces)
+    bounds = requested_range(file_cid, file_size)
+    start, stop = bounds if bounds is not None else (0, file_size)
+    current_app.logger.info(f"Reassembling {file_cid} from {len(tensor_cids)} tensors")
+
+    def generate():
+        for piece, low, high in piece_ranges(pieces, start, stop):
+            if not isinstance(piece, TensorData):
+                yield piece[low:high]
+            elif (low, high) == (0, piece.size):
+                yield from fetch_cid(tensor_cids[piece.location])
+            else:
+                yield from ipfs_client.cat_stream(tensor_cids[piece.location], offset=low, length=high - low)
+
+    return download_response(stream_with_context(generate()), file_cid, file_size, bounds, headers=headers)
+
+def warmup_cids():
+    """The CIDs to warm up: WARMUP_CIDS, then the WARMUP_TOP most downloaded ones."""
+    cids = [cid.strip() for cid in WARMUP_CIDS.split(',') if cid.strip()]
+    if WARMUP_TOP > 0:
+        cids += metadata_store.hot_cids(WARMUP_TOP)
+    return list(dict.fromkeys(cids))
+
+def start_warmup(cids):
+    """Pin `cids` and fill the download cache with them in the background.
+
+    Without a cache, pinning alone brings the blocks onto the IPFS node.
+    """
+    return warmup.start(
+        cids,
+        pin=ipfs_client.pin if WARMUP_PIN else None,
+        fetch=fetch_cid if cid_cache.enabled else None,
+        is_cached=cid_cache.contains,
+    )
+
+def start_configured_warmup():
+    """Warm the configured CIDs, if there are any, in the background.
+
+    Called by the process that serves requests, after any fork: see
+    gunicorn.conf.py.
+    """
+    cids = warmup_cids()
+    if cids:
+        start_warmup(cids)
+
+def cid_file_size(cid):
+    """Return the size of a CID, asking IPFS only the first time it is looked up."""
+    metadata = metadata_store.get(cid)
+    if metadata is not None and metadata['size'] is not None:
+        return metadata['size']
+    file_size = ipfs_client.get_file_size(cid)
+    metadata_store.put(cid, size=file_size)
+    return file_size
+
+def requested_range(file_cid, file_size):
+    """Return the (start, stop) bounds of a single-range request for this CID.
+
+    Returns None when the whole object should be sent: no or malformed
+    Range header, an If-Range that does not match the CID, or several
+    ranges, which are not supported.
+    """
+    byte_range = request.range
+    if byte_range is None or file_size == 0:
+        return None
+    if 'If-Range' in request.headers:
+        if_range = request.if_range
+        if if_range.date is not None or if_range.etag != file_cid:
+            return None
+    if byte_range.units != 'bytes' or len(byte_range.ranges) != 1:
+        return None
+    bounds = byte_range.range_for_length(file_size)
+    if bounds is None:
+        raise RequestedRangeNotSatisfiable(length=file_size)
+    return bounds
+
+def download_response(body, file_cid, file_size=None, bounds=None, headers=None, direct_passthrough=False):
+    """Build a download response with the CID as ETag, as a 206 if `bounds` is set."""
+    response = Response(
+        body,
+        mimetype='application/octet-stream',
+        headers=headers,
+        direct_passthrough=direct_passthrough,
+    )
+    response.set_etag(file_cid)
+    response.accept_ranges = 'bytes'
+    if bounds is not None:
+        start, stop = bounds
+        response.status_code = HTTPStatus.PARTIAL_CONTENT
+        response.content_range = ContentRange('bytes', start, stop, file_size)
+        response.content_length = stop - start
+    elif file_size is not None:
+        response.content_length = file_size
+    return response
+
+def send_cached_file(file_cid, file, headers=None):
+    """Serve an open cache file, letting the WSGI server use sendfile for whole-file responses."""
+    file_size = os.fstat(file.fileno()).st_size
+    try:
+        bounds = requested_range(file_cid, file_size)
+    except RequestedRangeNotSatisfiable:
+        file.close()
+        raise
+
+    if bounds is None:
+        body = wrap_file(request.environ, file)
+    else:
+        body = iter_file_range(file, *bounds)
+    return download_response(body, file_cid, file_size, bounds, headers=headers, direct_passthrough=True)
+
+def offload_download(file_cid, headers=None, attachment=False):
+    """Hand the transfer of a CID to the front proxy or the IPFS gateway, per DOWNLOAD_OFFLOAD.
+
+    Returns None when the bytes have to be sent by this process: offloading
+    is off, or a proxy offload misses the cache.
+    """
+    if DOWNLOAD_OFFLOAD == 'gateway':
+        query = f"?{urlencode({'filename': file_cid, 'download': 'true'})}" if attachment else ''
+        metrics.DOWNLOADS_OFFLOADED.inc(mode='gateway')
+        return redirect(f"{IPFS_GATEWAY_URL.rstrip('/')}/ipfs/{quote(file_cid)}{query}", code=HTTPStatus.FOUND)
+    if DOWNLOAD_OFFLOAD not in ('accel', 'sendfile'):
+        return None
+
+    path = cid_cache.cached_path(file_cid)
+    if path is None:
+        return None
+    response = Response(mimetype='application/octet-stream', headers=headers)
+    response.set_etag(file_cid)
+    if DOWNLOAD_OFFLOAD == 'accel':
+        response.headers['X-Accel-Redirect'] = f"{DOWNLOAD_OFFLOAD_PREFIX.rstrip('/')}/{quote(file_cid)}"
+    else:
+        response.headers['X-Sendfile'] = os.path.abspath(path)
+    metrics.DOWNLOADS_OFFLOADED.inc(mode=DOWNLOAD_OFFLOAD)
+    return response
+
+def send_ipfs_range(file_cid, file_size, bounds, headers=None):
+    """Serve a byte range straight from IPFS using cat's offset and length."""
+    start, stop = bounds
+    current_app.logger.info(f"Serving bytes {start}-{stop - 1}/{file_size} of CID {file_cid}")
+    chunks = ipfs_client.cat_stream(file_cid, offset=start, length=stop - start)
+    return download_response(chunks, file_cid, file_size, bounds, headers=headers)
+
+def session_signature(file):
+    """Inspect an ONNX model by building an onnxruntime session from the whole file.
+
+    This materialises every weight and runs graph optimizations, so it is
+    only used when the lightweight parser cannot read the model.
+    """
+    session = ort.InferenceSession(file.read())
+    input_types = [
+        {
+            "name": input.name,
+            "type": input.type,
+            "shape": input.shape
+        } for input in session.get_inputs()
+    ]
+    output_types = [
+        {
+            "name": output.name,
+            "type": output.type,
+            "shape": output.shape
+        } for output in session.get_outputs()
+    ]
+    return {"input_types": input_types, "output_types": output_types}
+
+def inspect_onnx(file, logger):
+    """Read an uploaded ONNX model's signature, or return None if it cannot be read."""
+    start_time = time.time()
+    try:
+        if ONNX_INSPECTION == 'lazy':
+            try:
+                with metrics.ONNX_INSPECTION.time(method='lazy'):
+                    info = read_onnx_signature_from_file(file)
+                info.pop('bytes_read')
+                logger.info(f"Parsed ONNX signature of {file.filename} in {time.time() - start_time:.3f} seconds")
+                return info
+            except Exception as e:
+                logger.warning(f"Lightweight ONNX parsing failed for {file.filename}, falling back to onnxruntime: {str(e)}")
+        with metrics.ONNX_INSPECTION.time(method='session'):
+            info = session_signature(file)
+        logger.info(f"Inspected {file.filename} with onnxruntime in {time.time() - start_time:.3f} seconds")
+        return info
+    except Exception as e:
+        logger.error(f"Error reading ONNX file: {str(e)}")
+        return None
+    finally:
+        file.seek(0)  # Reset file pointer after ONNX processing
+
+def open_streaming_upload(logger):
+    """Start decoding the multipart request body, returning `(upload, None)` or `(None, error_response)`."""
+    mimetype, options = parse_options_header(request.headers.get('Content-Type', ''))
+    boundary = options.get('boundary')
+    if mimetype != 'multipart/form-data' or not boundary:
+        logger.error("Streaming upload requires a multipart/form-data body")
+        return None, Response('No file part', status=400)
+
+    if request.content_length is not None and request.content_length > MAX_FILE_SIZE + 64 * 1024:
+        logger.error(f"Request size {request.content_length} exceeds maximum allowed size {MAX_FILE_SIZE}")
+        return None, Response(f"Maximum file size limit ({MAX_FILE_SIZE} bytes) exceeded.", status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+    upload = StreamingUpload(request.stream, boundary, max_size=MAX_FILE_SIZE)
+    if not upload.open():
+        logger.error("No file part in the request")
+        return None, Response('No file part', status=400)
+    if upload.filename == '':
+        logger.error("No selected file")
+        return None, Response('No selected file', status=400)
+    return upload, None
+
+def upload_streaming(logger, start_time, add_options, layout='blob'):
+    """Pipe the multipart file part straight from the request body into IPFS.
+
+    The bytes reach IPFS as they arrive, so an ONNX model cannot be split
+    first: the 'tensors' layout is refused for them.
+    """
+    upload, error_response = open_streaming_upload(logger)
+    if error_response is not None:
+        return error_response
+    if layout == 'tensors' and upload.filename.lower().endswith('.onnx'):
+        logger.error(f"Streaming upload of {upload.filename} cannot use the tensors layout")
+        return Response("Streaming uploads cannot use the tensors layout; use layout=blob or upload without stream=true", status=400)
+
+    digest = hashlib.sha256()
+    try:
+        logger.info(f"Starting streaming IPFS upload for file: {upload.filename}")
+        with metrics.UPLOAD_PHASE.time(phase='stream'):
+            file_cid = ipfs_client.add_stream(hash_chunks(upload, digest), options=add_options)
+        logger.info(f"IPFS upload completed. CID: {file_cid}, size: {upload.size} bytes")
+    except RequestEntityTooLarge:
+        logger.error(f"File size exceeds maximum allowed size {MAX_FILE_SIZE}")
+        return Response(f"Maximum file size limit ({MAX_FILE_SIZE} bytes) exceeded.", status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    except Exception as e:
+        logger.error(f"IPFS upload failed: {str(e)}")
+        return Response(f"IPFS upload failed: {str(e)}", status=500)
+
+    record_upload(
+        file_cid,
+        digest_key(digest.hexdigest(), add_options),
+        size=upload.size,
+        filename=upload.filename,
+        dag_layout=add_options.to_dict(),
+    )
+
+    return jsonify({
+        "filename": upload.filename,
+        "cid": file_cid,
+        "size": upload.size,
+        "total_time": time.time() - start_time,
+        "dag_layout": add_options.to_dict(),
+    })
+
+def process_upload_job(job, file):
+    """Inspect and add a spooled upload to IPFS; runs on an upload job worker."""
+    logger = logging.getLogger(__name__)
+    input_types = None
+    output_types = None
+
+    job.result["dag_layout"] = job.add_options.to_dict()
+    split = None
+    if job.layout == 'tensors' and job.filename.lower().endswith('.onnx'):
+        try:
+            split = split_onnx_file(file)
+        except ValueError as e:
+            logger.warning(f"Cannot split {job.filename} into tensors, storing it as one object: {str(e)}")
+    upload_key = digest_key(job.digest, job.add_options, 'blob' if split is None else 'tensors')
+
+    known = find_known_upload(upload_key)
+    if known is not None:
+        job.cid, metadata = known
+        job.result.update(signature_fields(metadata), deduplicated=True)
+        logger.info(f"Upload job {job.id} matches already uploaded content {job.cid}")
+        return
+
+    if job.filename.lower().endswith('.onnx'):
+        job.phase = 'inspecting'
+        with metrics.UPLOAD_PHASE.time(phase='inspect'):
+            onnx_info = inspect_onnx(FileStorage(file, filename=job.filename), logger)
+        if onnx_info is not None:
+            input_types = onnx_info.pop('input_types')
+            output_types = onnx_info.pop('output_types')
+            if input_types:
+                job.result["input_types"] = input_types
+            if output_types:
+                job.result["output_types"] = output_types
+            if onnx_info:
+                job.result["onnx_info"] = onnx_info
+
+    job.phase = 'uploading'
+    logger.info(f"Starting IPFS upload for job {job.id}: {job.filename}")
+    manifest = None
+    with metrics.UPLOAD_PHASE.time(phase='ipfs_add'):
+        if split is not None:
+            job.cid, manifest, reused = add_onnx_tensors(file, *split, job.add_options)
+            job.bytes_processed = job.bytes_total
+            job.result.update(layout='tensors', tensors=len(manifest["tensors"]), tensors_reused=reused)
+        else:
+            job.cid = ipfs_client.add_stream(job.track(iter_file_chunks(file)), options=job.add_options)
+    record_upload(
+        job.cid,
+        upload_key,
+        size=job.bytes_total if manifest is None else manifest["size"],
+        filename=job.filename,
+        input_types=input_types,
+        output_types=output_types,
+        dag_layout=job.add_options.to_dict(),
+    )
+
+def upload_async(logger, add_options, layout='blob'):
+    """Spool the upload to disk and queue it for a background worker, returning a job id."""
+    upload, error_response = open_streaming_upload(logger)
+    if error_response is not None:
+        return error_response
+
+    job = upload_jobs.create(upload.filename)
+    digest = hashlib.sha256()
+    try:
+        with metrics.UPLOAD_PHASE.time(phase='receive'), open(job.path, 'wb') as spool:
+            for chunk in hash_chunks(upload, digest):
+                spool.write(chunk)
+                job.bytes_total += len(chunk)
+    except RequestEntityTooLarge:
+        logger.error(f"File size exceeds maximum allowed size {MAX_FILE_SIZE}")
+        upload_jobs.fail(job, "Maximum file size exceeded")
+        return Response(f"Maximum file size limit ({MAX_FILE_SIZE} bytes) exceeded.", status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    except Exception as e:
+        upload_jobs.fail(job, str(e))
+        raise
+
+    job.digest = digest.hexdigest()
+    job.add_options = add_options
+    job.layout = layout
+    upload_jobs.submit(job, process_upload_job)
+    logger.info(f"Queued upload job {job.id} for {job.filename} ({job.bytes_total} bytes)")
+    return jsonify({"job": job.id, "filename": job.filename, "size": job.bytes_total}), HTTPStatus.ACCEPTED
+
 @bp.route('/upload', methods=['POST'])
 def upload():
     logger = logging.getLogger(__name__)
@@ -28,80 +602,128 @@ def upload():
     start_time = time.time()
 
     try:
-        if 'file' not in request.files:
-            logger.error("No file part in the request")
-            return Response('No file part', status=400)
-        
-        file: FileStorage = request.files['file']
-        if file.filename == '':
-            logger.error("No selected file")
-            return Response('No selected file', status=400)
-
-        # Get the file size
-        file.seek(0, 2)  # Go to the end of the file
-        file_size = file.tell()  # Get the position (size)
-        file.seek(0)  # Go back to the start of the file
+        try:
+            add_options = requested_add_options()
+        except ValueError as e:
+            return Response(str(e), status=400)
+        layout = requested_layout()
+        if layout is None:
+            return Response(f"Unknown storage layout: {request.args.get('layout')}", status=400)
+        if is_stream_requested():
+            return upload_streaming(logger, start_time, add_options, layout)
+        if request.args.get('async', '').lower() == 'true':
+            return upload_async(logger, add_options, layout)
 
-        logger.info(f"Uploading file: {file.filename}, size: {file_size} bytes")
+        upload, error_response = open_streaming_upload(logger)
+        if error_response is not None:
+            return error_response
 
-        if file_size > MAX_FILE_SIZE:
-            logger.error(f"File size {file_size} exceeds maximum allowed size {MAX_FILE_SIZE}")
-            return Response(f"Maximum file size limit ({MAX_FILE_SIZE} bytes) exceeded.", status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        # Hash while spooling, so known content is recognised without another pass over the file
+        digest = hashlib.sha256()
+        with tempfile.TemporaryFile() as spool:
+            try:
+                with metrics.UPLOAD_PHASE.time(phase='receive'):
+                    for chunk in hash_chunks(upload, digest):
+                        spool.write(chunk)
+            except RequestEntityTooLarge:
+                logger.error(f"File size exceeds maximum allowed size {MAX_FILE_SIZE}")
+                return Response(f"Maximum file size limit ({MAX_FILE_SIZE} bytes) exceeded.", status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+            spool.seek(0)
+            return upload_spooled(
+                logger, FileStorage(spool, filename=upload.filename), upload.size, digest.hexdigest(), start_time,
+                layout, add_options,
+            )
+    except Exception as e:
+        logger.error(f"Error in upload: {str(e)}", exc_info=True)
+        return Response(f"Internal Server Error: {str(e)}", status=500)
 
-        input_types = None
-        output_types = None
+def upload_spooled(logger, file, file_size, content_digest, start_time, layout='blob', add_options=None):
+    """Inspect and add a received upload, or answer from the digest index if it is known.
 
-        if file.filename.lower().endswith('.onnx'):
-            try:
-                file_content = file.read()
-                file_object = BytesIO(file_content)
-                session = ort.InferenceSession(file_object.getvalue())
-                
-                input_types = [
-                    {
-                        "name": input.name,
-                        "type": input.type,
-                        "shape": input.shape
-                    } for input in session.get_inputs()
-                ]
-                output_types = [
-                    {
-                        "name": output.name,
-                        "type": output.type,
-                        "shape": output.shape
-                    } for output in session.get_outputs()
-                ]
-            except Exception as e:
-                logger.error(f"Error reading ONNX file: {str(e)}")
-            finally:
-                file.seek(0)  # Reset file pointer after ONNX processing
+    With the 'tensors' layout, ONNX models are split into a graph and
+    per-tensor objects under a manifest, whose CID is returned. Every IPFS
+    add uses the DAG layout `add_options`, defaulting to the configured one.
+    """
+    add_options = add_options or AddOptions()
+    logger.info(f"Uploading file: {file.filename}, size: {file_size} bytes")
 
+    split = None
+    if layout == 'tensors' and file.filename.lower().endswith('.onnx'):
         try:
-            logger.info(f"Starting IPFS upload for file: {file.filename}")
-            file_cid = ipfs_client.add_stream(file)
-            logger.info(f"IPFS upload completed. CID: {file_cid}")
-        except Exception as e:
-            logger.error(f"IPFS upload failed: {str(e)}")
-            return Response(f"IPFS upload failed: {str(e)}", status=500)
+            split = split_onnx_file(file)
+        except ValueError as e:
+            logger.warning(f"Cannot split {file.filename} into tensors, storing it as one object: {str(e)}")
+    upload_key = digest_key(content_digest, add_options, 'blob' if split is None else 'tensors')
 
-        total_time = time.time() - start_time
-        
-        response_data = {
+    known = find_known_upload(upload_key)
+    if known is not None:
+        file_cid, metadata = known
+        logger.info(f"{file.filename} matches already uploaded content. CID: {file_cid}")
+        return jsonify({
             "filename": file.filename,
             "cid": file_cid,
             "size": file_size,
-            "total_time": total_time,
-        }
+            "total_time": time.time() - start_time,
+            "deduplicated": True,
+            "dag_layout": add_options.to_dict(),
+            **signature_fields(metadata),
+        })
 
-        if input_types:
-            response_data["input_types"] = input_types
-        if output_types:
-            response_data["output_types"] = output_types
+    input_types = None
+    output_types = None
+    onnx_info = None
 
-        return jsonify(response_data)
+    if file.filename.lower().endswith('.onnx'):
+        with metrics.UPLOAD_PHASE.time(phase='inspect'):
+            onnx_info = inspect_onnx(file, logger)
+        if onnx_info is not None:
+            input_types = onnx_info.pop('input_types')
+            output_types = onnx_info.pop('output_types')
+
+    manifest = None
+    try:
+        logger.info(f"Starting IPFS upload for file: {file.filename}")
+        with metrics.UPLOAD_PHASE.time(phase='ipfs_add'):
+            if split is not None:
+                file_cid, manifest, reused = add_onnx_tensors(file, *split, add_options)
+            else:
+                file_cid = ipfs_client.add_stream(file, options=add_options)
+        logger.info(f"IPFS upload completed. CID: {file_cid}")
     except Exception as e:
-        logger.error(f"Error in upload: {str(e)}", exc_info=True)
-        return Response(f"Internal Server Error: {str(e)}", status=500)
+        logger.error(f"IPFS upload failed: {str(e)}")
+        return Response(f"IPFS upload failed: {str(e)}", status=500)
+
+    record_upload(
+        file_cid,
+        upload_key,
+        # Downloads of a split model return the reassembled file, not the manifest
+        size=file_size if manifest is None else manifest["size"],
+        filename=file.filename,
+        input_types=input_types,
+        output_types=output_types,
+        dag_layout=add_options.to_dict(),
+    )
+
+    total_time = time.time() - start_time
+
+    response_data = {
+        "filename": file.filename,
+        "cid": file_cid,
+        "size": file_size,
+        "total_time": total_time,
+        "dag_layout": add_options.to_dict(),
+    }
+
+    if input_types:
+        response_data["input_types"] = input_types
+    if output_types:
+        response_data["output_types"] = output_types
+    if onnx_info:
+        response_data["onnx_info"] = onnx_info
+    if manifest is not None:
+        response_data.update(layout='tensors', tensors=len(manifest["tensors"]), tensors_reused=reused)
+
+    return jsonify(response_data)
 
 @bp.route('/download', methods=['GET'])
 def download():
@@ -110,30 +732,46 @@ def download():
     if not file_cid:
         return Response('Empty CID', 400)
 
+    metadata_store.record_access(file_cid)
     try:
         stream = is_stream_requested()
+        headers = {'Content-Disposition': f'attachment;filename={file_cid}'}
+
+        manifest = find_manifest(file_cid)
+        if manifest is not None:
+            return send_onnx_tensors(file_cid, manifest, headers=headers)
+
+        offloaded = offload_download(file_cid, headers=headers, attachment=True)
+        if offloaded is not None:
+            return offloaded
+
+        cached_file = cid_cache.open(file_cid)
+        if cached_file is not None:
+            return send_cached_file(file_cid, cached_file, headers=headers)
+
+        if request.range is not None:
+            file_size = cid_file_size(file_cid)
+            bounds = requested_range(file_cid, file_size)
+            if bounds is not None:
+                return send_ipfs_range(file_cid, file_size, bounds, headers=headers)
 
         if stream:
             def generate():
                 try:
-                    for chunk in ipfs_client.cat_stream(file_cid):
+                    for chunk in fetch_cid(file_cid):
                         yield chunk
                 except Exception as e:
                     current_app.logger.error(f"Error in streaming: {str(e)}")
                     yield str(e).encode()
 
-            return Response(
-                stream_with_context(generate()),
-                mimetype='application/octet-stream',
-                headers={'Content-Disposition': f'attachment;filename={file_cid}'}
-            )
+            return download_response(stream_with_context(generate()), file_cid, headers=headers)
         else:
-            file_content = ipfs_client.cat(file_cid)
-            return Response(
-                file_content,
-                mimetype='application/octet-stream',
-                headers={'Content-Disposition': f'attachment;filename={file_cid}'}
-            )
+            file_content = b''.join(fetch_cid(file_cid))
+            return download_response(file_content, file_cid, headers=headers)
+    except RequestedRangeNotSatisfiable as e:
+        return e.get_response()
+    except NotAManifest as e:
+        return Response(str(e), status=400)
     except Exception as e:
         current_app.logger.error(f"Error in download: {str(e)}")
         return Response(f"Internal Server Error: {str(e)}", status=500)
@@ -145,20 +783,41 @@ def download_raw():
     if not file_cid:
         return Response('Empty CID', 400)
 
+    metadata_store.record_access(file_cid)
     try:
-        file_size = ipfs_client.get_file_size(file_cid)
+        # Checked first: the manifest's own bytes, cached or on a gateway, are not the model
+        manifest = find_manifest(file_cid)
+        if manifest is not None:
+            return send_onnx_tensors(file_cid, manifest)
+
+        offloaded = offload_download(file_cid)
+        if offloaded is not None:
+            return offloaded
+
+        cached_file = cid_cache.open(file_cid)
+        if cached_file is not None:
+            current_app.logger.info(f"Serving CID {file_cid} from cache")
+            return send_cached_file(file_cid, cached_file)
+
+        file_size = cid_file_size(file_cid)
         current_app.logger.info(f"File size for CID {file_cid}: {file_size}")
+
+        bounds = requested_range(file_cid, file_size)
+        if bounds is not None:
+            return send_ipfs_range(file_cid, file_size, bounds)
         
         def generate():
             bytes_sent = 0
-            for chunk in ipfs_client.cat_stream(file_cid):
+            for chunk in fetch_cid(file_cid):
                 bytes_sent += len(chunk)
                 yield chunk
             current_app.logger.info(f"Total bytes sent: {bytes_sent}")
 
-        response = Response(stream_with_context(generate()), mimetype='application/octet-stream')
-        response.headers['Content-Length'] = str(file_size)
-        return response
+        return download_response(stream_with_context(generate()), file_cid, file_size)
+    except RequestedRangeNotSatisfiable as e:
+        return e.get_response()
+    except NotAManifest as e:
+        return Response(str(e), status=400)
     except Exception as e:
         current_app.logger.error(f"Error in download_raw: {str(e)}")
         return Response(f"Internal Server Error: {str(e)}", status=500)
@@ -172,63 +831,321 @@ def get_file_size():
         return jsonify({"error": "No CID provided"}), 400
 
     try:
-        file_size = ipfs_client.get_file_size(file_cid)
+        manifest = find_manifest(file_cid)
+        file_size = manifest['size'] if manifest is not None else cid_file_size(file_cid)
         current_app.logger.info(f"Size of file with CID {file_cid}: {file_size} bytes")
         return jsonify({"cid": file_cid, "size": file_size})
+    except NotAManifest as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         current_app.logger.error(f"Error getting file size for CID {file_cid}: {str(e)}")
         return jsonify({"error": f"Error getting file size: {str(e)}"}), 500
 
-@bp.route('/download_zip', methods=['POST'])
-def download_zip():
-    data = request.json
-    if not data or 'files' not in data:
-        current_app.logger.error("Invalid request data")
-        return jsonify({"error": "Invalid request data"}), 400
+@bp.route('/batch_info', methods=['POST'])
+def batch_info():
+    data = request.get_json(silent=True)
+    cids = data.get('cids') if isinstance(data, dict) else None
+    if not isinstance(cids, list) or not all(isinstance(cid, str) and cid for cid in cids):
+        current_app.logger.error("Invalid batch_info request data")
+        return jsonify({"error": "Expected a JSON body with a list of CIDs in 'cids'"}), 400
+    if len(cids) > BATCH_INFO_MAX_CIDS:
+        current_app.logger.error(f"Too many CIDs in batch_info request: {len(cids)}")
+        return jsonify({"error": f"At most {BATCH_INFO_MAX_CIDS} CIDs can be requested at once"}), 400
+
+    records = metadata_store.get_many(cids)
+    misses = [cid for cid in dict.fromkeys(cids) if records.get(cid, {}).get('size') is None]
+    lookups = {cid: batch_info_executor.submit(ipfs_client.get_file_size, cid) for cid in misses}
+    errors = {}
+    for cid, lookup in lookups.items():
+        try:
+            file_size = lookup.result()
+        except Exception as e:
+            current_app.logger.error(f"Error getting file size for CID {cid}: {str(e)}")
+            errors[cid] = f"Error getting file size: {str(e)}"
+            continue
+        metadata_store.put(cid, size=file_size)
+        records.setdefault(cid, {})['size'] = file_size
 
-    files = data['files']
-    zip_name = data.get('zip_name', 'response')
-    
-    if not zip_name.lower().endswith('.zip'):
-        zip_name = f"{zip_name}.zip"
+    current_app.logger.info(f"Resolved {len(cids)} CIDs, {len(misses)} from IPFS, {len(errors)} failed")
+    results = []
+    for cid in cids:
+        if cid in errors:
+            results.append({"cid": cid, "error": errors[cid]})
+        else:
+            results.append({"cid": cid, **{field: value for field, value in records[cid].items() if value is not None}})
+    return jsonify({"results": results})
 
-    current_app.logger.info(f"Creating zip file: {zip_name} with {len(files)} files")
+def zip_bundle_key(files, compression_mode):
+    """Name a zip bundle by its inputs: CIDs are immutable, so the same files give the same archive."""
+    manifest = json.dumps({"files": sorted(files.items()), "compression": compression_mode}, separators=(',', ':'))
+    return f'zip-{hashlib.sha256(manifest.encode()).hexdigest()}'
 
-    def generate():
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.zip') as temp_zip:
-            try:
-                with zipfile.ZipFile(temp_zip, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                    for file_name, file_cid in files.items():
-                        try:
-                            current_app.logger.info(f"Adding file to zip: {file_name} (CID: {file_cid})")
-                            content = b''.join(ipfs_client.cat_stream(file_cid))
-                            zip_file.writestr(file_name, content)
-                            current_app.logger.info(f"Successfully added {file_name} to zip")
-                        except Exception as e:
-                            current_app.logger.error(f"Error processing file {file_name} with CID {file_cid}: {str(e)}")
-                            continue
-
-                temp_zip.flush()
-                temp_zip.seek(0)
-                
-                while True:
-                    chunk = temp_zip.read(8192)
-                    if not chunk:
-                        break
-                    yield chunk
-            except Exception as e:
-                current_app.logger.error(f"Error generating zip file: {str(e)}")
-                yield str(e).encode()
-            finally:
-                temp_zip.close()
-                os.unlink(temp_zip.name)
+def zip_bundle_builder(files, compression_mode):
+    """Return a `zip_cache` fetch that builds the archive of `files`, in name order.
+
+    An archive that had to leave out a file is still served, but not
+    cached, so a missing CID is looked up again next time.
+    """
+    def build(key):
+        prefetcher = CIDPrefetcher(fetch_cid, sorted(files.items()))
+        try:
+            yield from stream_zip(prefetcher.entries(), ZIP_COMPRESSION_MODES[compression_mode])
+        finally:
+            prefetcher.close()
+        if prefetcher.skipped:
+            raise NotCacheable(f"left out {', '.join(prefetcher.skipped)}")
+    return build
+
+@bp.route('/download_zip', methods=['POST'])
+def download_zip():
+    try:
+        files, zip_name, compression_mode = parse_zip_request(request.json, ZIP_COMPRESSION)
+    except ValueError as e:
+        current_app.logger.error(str(e))
+        return jsonify({"error": str(e)}), 400
 
     headers = Headers()
     headers.add('Content-Disposition', 'attachment', filename=zip_name)
     headers.add('Content-Type', 'application/zip')
-    
+
+    key = zip_bundle_key(files, compression_mode)
+    cached_bundle = zip_cache.open(key)
+    if cached_bundle is not None:
+        current_app.logger.info(f"Serving zip file: {zip_name} from cached bundle {key}")
+        try:
+            response = send_cached_file(key, cached_bundle, headers=headers)
+        except RequestedRangeNotSatisfiable as e:
+            return e.get_response()
+        response.mimetype = 'application/zip'
+        return response
+
+    current_app.logger.info(f"Creating zip file: {zip_name} with {len(files)} files ({compression_mode})")
+
+    def generate():
+        try:
+            yield from zip_cache.stream(key, zip_bundle_builder(files, compression_mode))
+            current_app.logger.info(f"Finished streaming zip file: {zip_name}")
+        except Exception as e:
+            # Stop without writing the central directory so the client sees a broken archive
+            current_app.logger.error(f"Error generating zip file: {str(e)}")
+
     return Response(
         stream_with_context(generate()),
         mimetype='application/zip',
         headers=headers
     )
+
+
+@bp.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify({**cid_cache.stats(), "zip_bundles": zip_cache.stats()})
+
+@bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+@bp.route('/profiles', methods=['GET'])
+def list_profiles():
+    if not PROFILING_ENABLED and PROFILE_SLOW_THRESHOLD <= 0:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    return jsonify(profile_store.summaries())
+
+@bp.route('/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        return jsonify({"error": f"Unknown profile: {profile_id}"}), 404
+
+    if request.args.get('format') == 'collapsed':
+        stacks = profile.get('stacks', {})
+        return Response(''.join(f"{stack} {count}\n" for stack, count in stacks.items()), mimetype='text/plain')
+    return jsonify(profile)
+
+@bp.route('/ipfs_nodes', methods=['GET'])
+def ipfs_nodes():
+    return jsonify(ipfs_client.node_stats())
+
+@bp.route('/model_info', methods=['GET'])
+def model_info():
+    file_cid = request.args.get('cid')
+
+    if not file_cid:
+        current_app.logger.error("No CID provided")
+        return jsonify({"error": "No CID provided"}), 400
+
+    try:
+        metadata = metadata_store.get(file_cid)
+        if metadata is None or metadata['input_types'] is None or metadata['output_types'] is None:
+            cached_file = cid_cache.open(file_cid)
+            if cached_file is not None:
+                with cached_file, metrics.ONNX_INSPECTION.time(method='lazy'):
+                    signature = read_onnx_signature_from_file(cached_file)
+            else:
+                file_size = cid_file_size(file_cid)
+
+                def read_at(offset, length):
+                    return ipfs_client.cat(file_cid, offset=offset, length=length)
+                with metrics.ONNX_INSPECTION.time(method='lazy'):
+                    signature = read_onnx_signature(read_at, file_size)
+            current_app.logger.info(f"Read ONNX signature of CID {file_cid} using {signature['bytes_read']} bytes")
+            metadata_store.put(
+                file_cid,
+                input_types=signature['input_types'],
+                output_types=signature['output_types'],
+            )
+            metadata = metadata_store.get(file_cid)
+
+        return jsonify({
+            "cid": file_cid,
+            "filename": metadata['filename'],
+            "size": metadata['size'],
+            "input_types": metadata['input_types'],
+            "output_types": metadata['output_types'],
+        })
+    except ValueError as e:
+        current_app.logger.error(f"Error reading ONNX signature for CID {file_cid}: {str(e)}")
+        return jsonify({"error": f"Not a readable ONNX model: {str(e)}"}), HTTPStatus.UNPROCESSABLE_ENTITY
+    except Exception as e:
+        current_app.logger.error(f"Error getting model info for CID {file_cid}: {str(e)}")
+        return jsonify({"error": f"Error getting model info: {str(e)}"}), 500
+
+@bp.route('/upload_status', methods=['GET'])
+def upload_status():
+    job_id = request.args.get('job')
+
+    if not job_id:
+        return jsonify({"error": "No job provided"}), 400
+
+    job = upload_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown upload job: {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+@bp.route('/multipart_upload', methods=['POST'])
+def create_multipart_upload():
+    data = request.get_json(silent=True)
+    filename = data.get('filename') if isinstance(data, dict) else None
+    if not isinstance(filename, str) or filename == '':
+        current_app.logger.error("No filename for multipart upload")
+        return jsonify({"error": "No filename provided"}), 400
+
+    upload = multipart_uploads.create(filename)
+    current_app.logger.info(f"Started multipart upload {upload.id} for {filename}")
+    return jsonify({"upload_id": upload.id, "filename": filename}), HTTPStatus.CREATED
+
+def find_multipart_upload(upload_id):
+    upload = multipart_uploads.get(upload_id)
+    if upload is None:
+        return None, (jsonify({"error": f"Unknown multipart upload: {upload_id}"}), 404)
+    return upload, None
+
+@bp.route('/multipart_upload/<upload_id>/<int:part_number>', methods=['PUT'])
+def upload_part(upload_id, part_number):
+    upload, error_response = find_multipart_upload(upload_id)
+    if error_response is not None:
+        return error_response
+    if upload.state != 'open':
+        return jsonify({"error": f"Multipart upload {upload_id} is {upload.state}"}), HTTPStatus.CONFLICT
+    if request.content_length is not None and request.content_length > MULTIPART_MAX_PART_SIZE:
+        return Response(f"Maximum part size ({MULTIPART_MAX_PART_SIZE} bytes) exceeded.", status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+    try:
+        part = multipart_uploads.write_part(upload, part_number, iter_file_chunks(request.stream), max_size=MULTIPART_MAX_PART_SIZE)
+    except RequestEntityTooLarge:
+        return Response(f"Maximum part size ({MULTIPART_MAX_PART_SIZE} bytes) exceeded.", status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    except ValueError as e:
+        status = HTTPStatus.CONFLICT if upload.state != 'open' else 400
+        return jsonify({"error": str(e)}), status
+    return jsonify({"upload_id": upload_id, "part": part_number, **part})
+
+@bp.route('/multipart_upload/<upload_id>', methods=['GET'])
+def multipart_upload_status(upload_id):
+    upload, error_response = find_multipart_upload(upload_id)
+    if error_response is not None:
+        return error_response
+    return jsonify(upload.to_dict())
+
+@bp.route('/multipart_upload/<upload_id>', methods=['DELETE'])
+def abort_multipart_upload(upload_id):
+    upload, error_response = find_multipart_upload(upload_id)
+    if error_response is not None:
+        return error_response
+    if not multipart_uploads.abort(upload):
+        return jsonify({"error": f"Multipart upload {upload_id} is completing"}), HTTPStatus.CONFLICT
+    return jsonify({"upload_id": upload_id, "state": "aborted"})
+
+@bp.route('/multipart_upload/<upload_id>/complete', methods=['POST'])
+def complete_multipart_upload(upload_id):
+    logger = logging.getLogger(__name__)
+    start_time = time.time()
+    upload, error_response = find_multipart_upload(upload_id)
+    if error_response is not None:
+        return error_response
+    if upload.state == 'done':
+        # A retried completion gets the original result
+        return jsonify(upload.result)
+
+    data = request.get_json(silent=True)
+    expected_parts = data.get('parts') if isinstance(data, dict) else None
+    if not upload.parts:
+        return jsonify({"error": "No parts have been uploaded"}), 400
+    missing = upload.missing_parts()
+    if expected_parts is not None:
+        if not isinstance(expected_parts, list) or not all(isinstance(number, int) for number in expected_parts):
+            return jsonify({"error": "'parts' must be a list of part numbers"}), 400
+        unexpected = sorted(set(upload.parts) - set(expected_parts))
+        if unexpected:
+            return jsonify({"error": "Unexpected parts", "unexpected_parts": unexpected}), 400
+        missing = sorted(set(missing) | (set(expected_parts) - set(upload.parts)))
+    if missing:
+        return jsonify({"error": "Missing parts", "missing_parts": missing}), 400
+    if sum(part["size"] for part in upload.parts.values()) > MAX_FILE_SIZE:
+        return Response(f"Maximum file size limit ({MAX_FILE_SIZE} bytes) exceeded.", status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+    layout = requested_layout()
+    if layout is None:
+        return jsonify({"error": f"Unknown storage layout: {request.args.get('layout')}"}), 400
+    try:
+        add_options = requested_add_options()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    reader = multipart_uploads.start_completing(upload)
+    if reader is None:
+        return jsonify({"error": f"Multipart upload {upload_id} is {upload.state}"}), HTTPStatus.CONFLICT
+
+    response = None
+    try:
+        with reader:
+            digest = hashlib.sha256()
+            with metrics.UPLOAD_PHASE.time(phase='hash'):
+                for chunk in iter_file_chunks(reader):
+                    digest.update(chunk)
+            logger.info(f"Completing multipart upload {upload_id}: {len(upload.parts)} parts, {reader.size} bytes")
+            response = upload_spooled(
+                logger, FileStorage(reader, filename=upload.filename), reader.size, digest.hexdigest(), start_time,
+                layout, add_options,
+            )
+    finally:
+        if response is not None and response.status_code == 200:
+            multipart_uploads.finish(upload, {"upload_id": upload_id, **response.get_json()})
+        else:
+            multipart_uploads.reopen(upload)
+    return response
+
+@bp.route('/warmup', methods=['GET'])
+def warmup_status():
+    return jsonify(warmup.status())
+
+@bp.route('/warmup', methods=['POST'])
+def start_warmup_endpoint():
+    data = request.get_json(silent=True)
+    cids = data.get('cids') if isinstance(data, dict) else None
+    if cids is None:
+        cids = warmup_cids()
+    elif not isinstance(cids, list) or not all(isinstance(cid, str) and cid for cid in cids):
+        return jsonify({"error": "Expected a list of CIDs in 'cids'"}), 400
+
+    if not start_warmup(cids):
+        return jsonify({"error": "A warmup is already running"}), HTTPStatus.CONFLICT
+    return jsonify(warmup.status()), HTTPStatus.ACCEPTED
@@ -0,0 +1,126 @@
+import logging
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.sansio.multipart import MultipartDecoder, Data, Field, File, Epilogue, NeedData
+from config.model_config import UPLOAD_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+class StreamingUpload:
+    """Reads the `file` part of a multipart/form-data body straight off the wire.
+
+    Nothing is spooled to memory or disk: iterating the upload pulls the
+    request stream in `chunk_size` reads and yields the file data as it is
+    decoded, so callers can pipe it into IPFS with a bounded footprint.
+    """
+
+    def __init__(self, stream, boundary, max_size=None, chunk_size=UPLOAD_CHUNK_SIZE):
+        self._stream = stream
+        self._decoder = MultipartDecoder(boundary.encode() if isinstance(boundary, str) else boundary)
+        self._max_size = max_size
+        self._chunk_size = chunk_size
+        self._exhausted = False
+        self.form = {}
+        self._current_field = None
+        self._field_data = []
+        self.filename = None
+        self.size = 0
+
+    def _next_event(self):
+        while True:
+            event = self._decoder.next_event()
+            if not isinstance(event, NeedData):
+                return event
+            if self._exhausted:
+                raise ValueError("Unexpected end of multipart body")
+            data = self._stream.read(self._chunk_size)
+            if not data:
+                self._exhausted = True
+                self._decoder.receive_data(None)
+            else:
+                self._decoder.receive_data(data)
+
+    def _find_file(self, event, field_name):
+        """Handle one event while looking for the file part.
+
+        Returns True once the file part is reached, False at the end of the
+        body, and None while more events are needed.
+        """
+        if isinstance(event, Epilogue):
+            return False
+        if isinstance(event, File) and event.name == field_name:
+            self.filename = event.filename
+            return True
+        if isinstance(event, (Field, File)):
+            self._current_field = event.name if isinstance(event, Field) else None
+            self._field_data = []
+        elif isinstance(event, Data) and self._current_field is not None:
+            self._field_data.append(event.data)
+            if not event.more_data:
+                self.form[self._current_field] = b''.join(self._field_data).decode('utf-8', 'replace')
+                self._current_field = None
+        return None
+
+    def _file_data(self, event):
+        """Return `(data, more_data)` for an event inside the file part, enforcing `max_size`."""
+        if not isinstance(event, Data):
+            raise ValueError(f"Unexpected multipart event {type(event).__name__} in file data")
+        self.size += len(event.data)
+        if self._max_size is not None and self.size > self._max_size:
+            raise RequestEntityTooLarge()
+        if not event.more_data:
+            logger.info(f"Finished reading {self.filename}: {self.size} bytes")
+        return event.data, event.more_data
+
+    def open(self, field_name='file'):
+        """Advance to the file part, collecting plain form fields on the way.
+
+        Returns False if the body has no file part called `field_name`.
+        """
+        while True:
+            found = self._find_file(self._next_event(), field_name)
+            if found is not None:
+                return found
+
+    def __iter__(self):
+        while True:
+            data, more_data = self._file_data(self._next_event())
+            if data:
+                yield data
+            if not more_data:
+                return
+
+class AsyncStreamingUpload(StreamingUpload):
+    """`StreamingUpload` over an async iterator of body chunks, such as an ASGI request stream."""
+
+    async def _next_event(self):
+        while True:
+            event = self._decoder.next_event()
+            if not isinstance(event, NeedData):
+                return event
+            if self._exhausted:
+                raise ValueError("Unexpected end of multipart body")
+            try:
+                data = await self._stream.__anext__()
+            except StopAsyncIteration:
+                data = None
+            if not data:
+                # ASGI servers may deliver empty chunks; only the iterator ending marks the end
+                if data is None:
+                    self._exhausted = True
+                    self._decoder.receive_data(None)
+            else:
+                self._decoder.receive_data(data)
+
+    async def open(self, field_name='file'):
+        while True:
+            found = self._find_file(await self._next_event(), field_name)
+            if found is not None:
+                return found
+
+    async def __aiter__(self):
+        while True:
+            data, more_data = self._file_data(await self._next_event())
+            if data:
+                yield data
+            if not more_data:
+                return
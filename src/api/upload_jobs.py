@@ -0,0 +1,112 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from config.model_config import MODEL_FOLDER, UPLOAD_JOB_WORKERS, UPLOAD_JOB_TTL
+
+logger = logging.getLogger(__name__)
+
+class UploadJob:
+    def __init__(self, filename, path):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.path = path
+        self.phase = 'receiving'
+        self.bytes_total = 0
+        self.bytes_processed = 0
+        self.digest = None
+        self.add_options = None
+        self.layout = 'blob'
+        self.cid = None
+        self.error = None
+        self.result = {}
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.phase in ('done', 'failed')
+
+    def track(self, chunks):
+        """Pass chunks through, counting them towards `bytes_processed`."""
+        for chunk in chunks:
+            self.bytes_processed += len(chunk)
+            yield chunk
+
+    def to_dict(self):
+        status = {
+            "job": self.id,
+            "filename": self.filename,
+            "phase": self.phase,
+            "bytes_total": self.bytes_total,
+            "bytes_processed": self.bytes_processed,
+            "elapsed": (self.finished_at or time.time()) - self.created_at,
+        }
+        if self.cid is not None:
+            status["cid"] = self.cid
+        if self.error is not None:
+            status["error"] = self.error
+        status.update(self.result)
+        return status
+
+class UploadJobManager:
+    """Runs spooled uploads on a background worker pool so request threads are freed.
+
+    A job's file is spooled under `spool_dir` by the request thread, then
+    handed to `process(job, file)` on a worker, which moves the job through
+    its phases and sets its CID. Finished jobs are kept for `ttl` seconds so
+    their status can still be polled.
+    """
+
+    def __init__(self, spool_dir=MODEL_FOLDER, max_workers=UPLOAD_JOB_WORKERS, ttl=UPLOAD_JOB_TTL):
+        self.spool_dir = spool_dir
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload-job')
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+    def create(self, filename):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        job = UploadJob(filename, os.path.join(self.spool_dir, str(uuid.uuid4())))
+        with self._lock:
+            self._expire()
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def fail(self, job, error):
+        job.error = error
+        job.phase = 'failed'
+        job.finished_at = time.time()
+        if os.path.exists(job.path):
+            os.unlink(job.path)
+
+    def submit(self, job, process):
+        job.phase = 'queued'
+        return self._executor.submit(self._run, job, process)
+
+    def _run(self, job, process):
+        try:
+            with open(job.path, 'rb') as file:
+                process(job, file)
+            job.phase = 'done'
+            job.finished_at = time.time()
+            logger.info(f"Upload job {job.id} finished. CID: {job.cid}")
+        except Exception as e:
+            logger.error(f"Upload job {job.id} failed: {str(e)}", exc_info=True)
+            self.fail(job, str(e))
+        finally:
+            if os.path.exists(job.path):
+                os.unlink(job.path)
@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config.model_config import WARMUP_WORKERS
+
+logger = logging.getLogger(__name__)
+
+class WarmupEntry:
+    def __init__(self, cid):
+        self.cid = cid
+        self.state = 'pending'
+        self.bytes_cached = 0
+        self.error = None
+        self.seconds = None
+
+    def to_dict(self):
+        status = {"cid": self.cid, "state": self.state, "bytes_cached": self.bytes_cached}
+        if self.seconds is not None:
+            status["seconds"] = self.seconds
+        if self.error is not None:
+            status["error"] = self.error
+        return status
+
+class Warmup:
+    """Pins a list of CIDs and pre-populates the download cache in the background.
+
+    Each CID is pinned with `pin(cid)`, which makes the IPFS node fetch and
+    keep all of its blocks, then read through `fetch(cid)` unless
+    `is_cached(cid)` says it is already on local disk. Either step can be
+    skipped by passing None. `workers` CIDs are warmed at a time, and a
+    failure only marks that CID as failed.
+    """
+
+    def __init__(self, workers=WARMUP_WORKERS):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._entries = []
+        self._started_at = None
+        self._finished_at = None
+        self._done = threading.Event()
+        self._done.set()
+
+    @property
+    def running(self):
+        return not self._done.is_set()
+
+    def start(self, cids, pin=None, fetch=None, is_cached=None):
+        """Start warming `cids`; returns False if a warmup is already running."""
+        with self._lock:
+            if self.running:
+                return False
+            self._entries = [WarmupEntry(cid) for cid in dict.fromkeys(cids)]
+            self._started_at = time.time()
+            self._finished_at = None
+            self._done.clear()
+        logger.info(f"Warming up {len(self._entries)} CIDs")
+        threading.Thread(
+            target=self._run, args=(list(self._entries), pin, fetch, is_cached), name='warmup', daemon=True
+        ).start()
+        return True
+
+    def _run(self, entries, pin, fetch, is_cached):
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='warmup') as executor:
+                for entry in entries:
+                    executor.submit(self._warm, entry, pin, fetch, is_cached)
+        finally:
+            with self._lock:
+                self._finished_at = time.time()
+            failed = sum(entry.state == 'failed' for entry in entries)
+            logger.info(f"Warmup finished: {len(entries) - failed} of {len(entries)} CIDs ready")
+            self._done.set()
+
+    def _warm(self, entry, pin, fetch, is_cached):
+        start_time = time.time()
+        try:
+            if pin is not None:
+                entry.state = 'pinning'
+                pin(entry.cid)
+            if fetch is not None and not (is_cached is not None and is_cached(entry.cid)):
+                entry.state = 'caching'
+                for chunk in fetch(entry.cid):
+                    entry.bytes_cached += len(chunk)
+            entry.state = 'done'
+        except Exception as e:
+            logger.error(f"Warmup of {entry.cid} failed: {str(e)}")
+            entry.error = str(e)
+            entry.state = 'failed'
+        finally:
+            entry.seconds = time.time() - start_time
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def status(self):
+        with self._lock:
+            entries = list(self._entries)
+            started_at, finished_at = self._started_at, self._finished_at
+        if started_at is None:
+            return {"state": "idle", "total": 0}
+        states = [entry.state for entry in entries]
+        return {
+            "state": "running" if finished_at is None else "finished",
+            "total": len(entries),
+            "done": states.count('done'),
+            "failed": states.count('failed'),
+            "pending": states.count('pending'),
+            "bytes_cached": sum(entry.bytes_cached for entry in entries),
+            "elapsed": (finished_at or time.time()) - started_at,
+            "cids": [entry.to_dict() for entry in entries],
+        }
@@ -0,0 +1,101 @@
+import io
+import time
+import zipfile
+
+ZIP_COMPRESSION_MODES = {
+    'stored': zipfile.ZIP_STORED,
+    'deflated': zipfile.ZIP_DEFLATED,
+}
+
+def parse_zip_request(data, default_compression):
+    """Return `(files, zip_name, compression_mode)` from a /download_zip body; raises ValueError if invalid."""
+    if not isinstance(data, dict) or 'files' not in data:
+        raise ValueError("Invalid request data")
+    files = data['files']
+    if not isinstance(files, dict) or not all(isinstance(v, str) for v in files.values()):
+        raise ValueError("files must map file names to CIDs")
+    zip_name = data.get('zip_name', 'response')
+    if not isinstance(zip_name, str):
+        raise ValueError("zip_name must be a string")
+    if not zip_name.lower().endswith('.zip'):
+        zip_name = f"{zip_name}.zip"
+    compression_mode = data.get('compression', default_compression)
+    if not isinstance(compression_mode, str) or compression_mode.lower() not in ZIP_COMPRESSION_MODES:
+        raise ValueError(f"Invalid compression mode: {compression_mode}")
+    return files, zip_name, compression_mode.lower()
+
+class _ChunkSink(io.RawIOBase):
+    """Unseekable write target that hands bytes back to the caller as they are written.
+
+    Because it cannot seek, zipfile writes each entry with a data descriptor
+    after its contents instead of patching the local header afterwards.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if data:
+            self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+def stream_zip(entries, compression=zipfile.ZIP_STORED):
+    """Yield a zip archive built from `(name, chunks)` pairs without buffering it.
+
+    Each entry's local header is emitted before its first chunk is consumed,
+    and at most one chunk per entry is held in memory at a time. Entries are
+    always written as zip64 since their sizes are not known up front.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=compression) as zip_file:
+        for name, chunks in entries:
+            info = zipfile.ZipInfo(name, date_time=time.localtime(time.time())[:6])
+            info.compress_type = compression
+            info.external_attr = 0o600 << 16
+            with zip_file.open(info, 'w', force_zip64=True) as entry:
+                yield from sink.drain()
+                for chunk in chunks:
+                    entry.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
+
+async def astream_zip(entries, compression=zipfile.ZIP_STORED, write=None):
+    """Async counterpart of `stream_zip` for an async iterable of `(name, async chunks)` pairs.
+
+    `write(entry, chunk)` may be given as a coroutine function to move the
+    per-chunk work, such as deflating, off the event loop.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=compression) as zip_file:
+        async for name, chunks in entries:
+            info = zipfile.ZipInfo(name, date_time=time.localtime(time.time())[:6])
+            info.compress_type = compression
+            info.external_attr = 0o600 << 16
+            with zip_file.open(info, 'w', force_zip64=True) as entry:
+                for chunk in sink.drain():
+                    yield chunk
+                async for chunk in chunks:
+                    if write is None:
+                        entry.write(chunk)
+                    else:
+                        await write(entry, chunk)
+                    for chunk in sink.drain():
+                        yield chunk
+            for chunk in sink.drain():
+                yield chunk
+    for chunk in sink.drain():
+        yield chunk
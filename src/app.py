@@ -1,6 +1,8 @@
 from flask import Flask
+from api import routes
 from api.routes import bp
 import logging
+import os
 
 def create_app():
     app = Flask(__name__)
@@ -14,9 +16,14 @@ def create_app():
     )
     
     app.register_blueprint(bp)
+    # Warmup is started by the serving process, not here: gunicorn --preload
+    # imports this module in its master and forks the workers from it
     return app
 
 app = create_app()
 
 if __name__ == '__main__':
+    # The debug reloader runs this module in a watcher process too; only its child serves
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        routes.start_configured_warmup()
     app.run(debug=True, host='0.0.0.0')
\ No newline at end of file
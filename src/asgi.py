@@ -0,0 +1,26 @@
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from api import async_routes
+import logging
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await async_routes.ipfs_client.aclose()
+
+def create_app():
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        filename='app.log',
+        filemode='w'
+    )
+
+    return Starlette(routes=async_routes.routes, lifespan=lifespan)
+
+app = create_app()
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -1,2 +1,140 @@
+import os
+
 MODEL_FOLDER = './models'
-ONE_GB_IN_BYTES = 1024 ** 3
\ No newline at end of file
+ONE_GB_IN_BYTES = 1024 ** 3
+
+# Size of the chunks piped from the request body into IPFS on upload
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+
+# Default /download_zip compression mode: 'stored' or 'deflated'
+ZIP_COMPRESSION = os.environ.get('ZIP_COMPRESSION', 'stored')
+
+# Concurrent IPFS fetches and buffered bytes allowed ahead of the /download_zip writer
+ZIP_PREFETCH_WORKERS = int(os.environ.get('ZIP_PREFETCH_WORKERS', 4))
+ZIP_PREFETCH_BYTES = int(os.environ.get('ZIP_PREFETCH_BYTES', 64 * 1024 * 1024))
+
+# Chunk size used when reading downloads back from IPFS or the local cache. IPFS
+# streams start at DOWNLOAD_MIN_CHUNK_SIZE and double up to it, for a fast first byte
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get('DOWNLOAD_CHUNK_SIZE', 1024 * 1024))
+DOWNLOAD_MIN_CHUNK_SIZE = int(os.environ.get('DOWNLOAD_MIN_CHUNK_SIZE', 64 * 1024))
+
+# On-disk LRU cache of downloaded CIDs; set CACHE_MAX_BYTES to 0 to disable it
+CACHE_DIR = os.environ.get('CACHE_DIR', './cache')
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 20 * 1024 ** 3))
+
+# Hands download byte transfer to another server: 'accel' answers cache hits with an
+# X-Accel-Redirect to DOWNLOAD_OFFLOAD_PREFIX/<cid> for nginx, 'sendfile' with an
+# X-Sendfile path for Apache or lighttpd, and 'gateway' redirects every download to
+# IPFS_GATEWAY_URL/ipfs/<cid>. 'none' serves all bytes from this process
+DOWNLOAD_OFFLOAD = os.environ.get('DOWNLOAD_OFFLOAD', 'none')
+DOWNLOAD_OFFLOAD_PREFIX = os.environ.get('DOWNLOAD_OFFLOAD_PREFIX', '/cached')
+IPFS_GATEWAY_URL = os.environ.get('IPFS_GATEWAY_URL', 'http://localhost:8080')
+
+# On-disk LRU cache of /download_zip bundles, keyed by a hash of their files and
+# compression mode; set ZIP_CACHE_MAX_BYTES to 0 to disable it
+ZIP_CACHE_DIR = os.environ.get('ZIP_CACHE_DIR', './zip-cache')
+ZIP_CACHE_MAX_BYTES = int(os.environ.get('ZIP_CACHE_MAX_BYTES', 5 * 1024 ** 3))
+
+# SQLite database recording per-CID size, filename and ONNX signature
+METADATA_DB = os.environ.get('METADATA_DB', './metadata.db')
+METADATA_LRU_SIZE = int(os.environ.get('METADATA_LRU_SIZE', 10000))
+
+# Bytes fetched per read when parsing ONNX signatures without downloading the model
+ONNX_READ_WINDOW = int(os.environ.get('ONNX_READ_WINDOW', 64 * 1024))
+
+# How /upload reads ONNX signatures: 'lazy' parses only the graph interface and
+# falls back to onnxruntime if that fails, 'session' always uses onnxruntime
+ONNX_INSPECTION = os.environ.get('ONNX_INSPECTION', 'lazy')
+
+# How /upload stores ONNX models: 'blob' adds the file as is, 'tensors' stores the
+# graph and each initializer of at least ONNX_TENSOR_MIN_BYTES as separate objects
+ONNX_STORAGE_LAYOUT = os.environ.get('ONNX_STORAGE_LAYOUT', 'blob')
+ONNX_TENSOR_MIN_BYTES = int(os.environ.get('ONNX_TENSOR_MIN_BYTES', 64 * 1024))
+
+# Background workers for /upload?async=true jobs, and how long finished jobs stay queryable
+UPLOAD_JOB_WORKERS = int(os.environ.get('UPLOAD_JOB_WORKERS', 2))
+UPLOAD_JOB_TTL = int(os.environ.get('UPLOAD_JOB_TTL', 3600))
+
+# Multipart uploads: how long an upload may sit idle before its parts are discarded,
+# how many parts it may have, and the largest part accepted
+MULTIPART_UPLOAD_TTL = int(os.environ.get('MULTIPART_UPLOAD_TTL', 24 * 3600))
+MULTIPART_MAX_PARTS = int(os.environ.get('MULTIPART_MAX_PARTS', 10000))
+MULTIPART_MAX_PART_SIZE = int(os.environ.get('MULTIPART_MAX_PART_SIZE', 1024 * 1024 * 1024))
+
+# Index uploads by SHA-256 so re-uploading known content skips inspection and the IPFS add
+UPLOAD_DEDUP = os.environ.get('UPLOAD_DEDUP', 'true').lower() == 'true'
+
+# Most CIDs accepted by one /batch_info request, and how many unknown sizes are looked up in IPFS at once
+BATCH_INFO_MAX_CIDS = int(os.environ.get('BATCH_INFO_MAX_CIDS', 1000))
+BATCH_INFO_WORKERS = int(os.environ.get('BATCH_INFO_WORKERS', 16))
+
+# Warmup at startup: pin and cache the comma-separated WARMUP_CIDS plus the
+# WARMUP_TOP most downloaded CIDs, WARMUP_WORKERS at a time
+WARMUP_CIDS = os.environ.get('WARMUP_CIDS', '')
+WARMUP_TOP = int(os.environ.get('WARMUP_TOP', 0))
+WARMUP_PIN = os.environ.get('WARMUP_PIN', 'true').lower() == 'true'
+WARMUP_WORKERS = int(os.environ.get('WARMUP_WORKERS', 2))
+
+# Connections the ASGI app's async IPFS client may keep open to the IPFS API
+ASYNC_IPFS_MAX_CONNECTIONS = int(os.environ.get('ASYNC_IPFS_MAX_CONNECTIONS', 256))
+
+# Comma-separated IPFS API endpoints (host:port or URL) to balance over; defaults
+# to IPFS_HOST:IPFS_PORT. Unhealthy nodes are re-probed every IPFS_HEALTH_INTERVAL seconds
+IPFS_NODES = os.environ.get('IPFS_NODES', '')
+IPFS_HEALTH_INTERVAL = float(os.environ.get('IPFS_HEALTH_INTERVAL', 10))
+
+# Connections kept per IPFS node; callers beyond this wait for a free one, for at
+# most IPFS_POOL_TIMEOUT seconds
+IPFS_POOL_SIZE = int(os.environ.get('IPFS_POOL_SIZE', 32))
+IPFS_POOL_TIMEOUT = float(os.environ.get('IPFS_POOL_TIMEOUT', 30))
+
+# IPFS request timeouts in seconds. The read timeout is the longest silence
+# allowed between bytes; adds wait longer since the daemon answers only after
+# it has processed the whole file
+IPFS_CONNECT_TIMEOUT = float(os.environ.get('IPFS_CONNECT_TIMEOUT', 5))
+IPFS_READ_TIMEOUT = float(os.environ.get('IPFS_READ_TIMEOUT', 60))
+IPFS_ADD_TIMEOUT = float(os.environ.get('IPFS_ADD_TIMEOUT', 600))
+
+# DAG layout of content added to IPFS, as the `ipfs add` options of the same names:
+# chunker, raw leaves, CID version, hash function and trickle instead of balanced
+# layout. The defaults are Kubo's; uploads can override each with a query parameter
+IPFS_ADD_CHUNKER = os.environ.get('IPFS_ADD_CHUNKER', 'size-262144')
+IPFS_ADD_RAW_LEAVES = os.environ.get('IPFS_ADD_RAW_LEAVES', 'false').lower() == 'true'
+IPFS_ADD_CID_VERSION = int(os.environ.get('IPFS_ADD_CID_VERSION', 0))
+IPFS_ADD_HASH = os.environ.get('IPFS_ADD_HASH', 'sha2-256')
+IPFS_ADD_TRICKLE = os.environ.get('IPFS_ADD_TRICKLE', 'false').lower() == 'true'
+
+# Tries (including the first) for idempotent IPFS reads (cat, ls), with
+# exponential backoff between rounds once every node has failed
+IPFS_RETRIES = int(os.environ.get('IPFS_RETRIES', 3))
+IPFS_RETRY_BACKOFF = float(os.environ.get('IPFS_RETRY_BACKOFF', 0.2))
+IPFS_RETRY_MAX_BACKOFF = float(os.environ.get('IPFS_RETRY_MAX_BACKOFF', 5))
+
+# Request profiling. With PROFILING_ENABLED, ?profile=true or an X-Profile: 1
+# header captures a sampling profile of that request; requests slower than
+# PROFILE_SLOW_THRESHOLD seconds (0 disables) get a phase trace kept automatically
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILE_SLOW_THRESHOLD = float(os.environ.get('PROFILE_SLOW_THRESHOLD', 0))
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))
+PROFILE_MAX_ENTRIES = int(os.environ.get('PROFILE_MAX_ENTRIES', 50))
+
+# Per-client admission control, keyed by the RATE_LIMIT_CLIENT_HEADER value if it is
+# one of RATE_LIMIT_API_KEYS (or a key in RATE_LIMIT_EXEMPT), else by the remote
+# address. Each client gets RATE_LIMIT_REQUESTS_PER_SECOND requests (bursts of
+# RATE_LIMIT_REQUEST_BURST) and RATE_LIMIT_BYTES_PER_SECOND of request and response
+# bodies (bursts of RATE_LIMIT_BYTES_BURST); 0 disables a limit. Clients listed in
+# RATE_LIMIT_EXEMPT are never limited
+RATE_LIMIT_CLIENT_HEADER = os.environ.get('RATE_LIMIT_CLIENT_HEADER', 'X-API-Key')
+RATE_LIMIT_REQUESTS_PER_SECOND = float(os.environ.get('RATE_LIMIT_REQUESTS_PER_SECOND', 0))
+RATE_LIMIT_REQUEST_BURST = int(os.environ.get('RATE_LIMIT_REQUEST_BURST', 20))
+RATE_LIMIT_BYTES_PER_SECOND = int(os.environ.get('RATE_LIMIT_BYTES_PER_SECOND', 0))
+RATE_LIMIT_BYTES_BURST = int(os.environ.get('RATE_LIMIT_BYTES_BURST', 16 * 1024 * 1024))
+RATE_LIMIT_EXEMPT = os.environ.get('RATE_LIMIT_EXEMPT', '')
+RATE_LIMIT_API_KEYS = os.environ.get('RATE_LIMIT_API_KEYS', '')
+
+# Uploads and downloads running at once across all clients (0 for no limit); up
+# to TRANSFER_QUEUE_SIZE more wait at most TRANSFER_QUEUE_TIMEOUT seconds for a slot,
+# each holding a request thread while it waits
+TRANSFER_SLOTS = int(os.environ.get('TRANSFER_SLOTS', 0))
+TRANSFER_QUEUE_SIZE = int(os.environ.get('TRANSFER_QUEUE_SIZE', 0))
+TRANSFER_QUEUE_TIMEOUT = float(os.environ.get('TRANSFER_QUEUE_TIMEOUT', 30))
@@ -0,0 +1,11 @@
+# Gunicorn reads this file from its working directory, next to app.py.
+#
+# With --preload, app.py is imported once in the master and the workers are
+# forked from it. Threads do not survive fork(), and locks or connections a
+# thread holds at that moment are left in an unusable state, so background
+# work is started in each worker once it has loaded the app.
+
+def post_worker_init(worker):
+    from api import routes
+    routes.admission.reserve_threads(worker.cfg.threads)
+    routes.start_configured_warmup()
@@ -1,18 +1,18 @@
 # Rate limiting decorator
-import time
 from functools import wraps
+from api.admission import TokenBucket
 
 def rate_limit(limit_seconds):
-    def decorator(func):  
-        last_called = 0
+    """Allow one call per `limit_seconds` across all threads, raising ValueError for calls in between."""
+    def decorator(func):
+        if limit_seconds <= 0:
+            return func
+        bucket = TokenBucket(1 / limit_seconds, 1)
         @wraps(func)
         def wrapper(*args, **kwargs):
-            nonlocal last_called
-            elapsed = time.time() - last_called
-            if elapsed < limit_seconds:
-                raise ValueError(f"Rate limit exceeded. Please wait {limit_seconds - elapsed:.2f} seconds.")
-            result = func(*args, **kwargs)
-            last_called = time.time()
-            return result
+            wait = bucket.try_take()
+            if wait:
+                raise ValueError(f"Rate limit exceeded. Please wait {wait:.2f} seconds.")
+            return func(*args, **kwargs)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
@@ -0,0 +1,43 @@
+import os
+import sys
+import pytest
+from flask import Flask
+
+# Keep the module-level download and zip bundle caches in api.routes off unless a test installs its own
+os.environ.setdefault('CACHE_MAX_BYTES', '0')
+os.environ.setdefault('ZIP_CACHE_MAX_BYTES', '0')
+os.environ.setdefault('METADATA_DB', ':memory:')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_ipfs import FakeIPFSServer
+
+@pytest.fixture
+def fake_ipfs():
+    server = FakeIPFSServer().start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def app(fake_ipfs, monkeypatch):
+    """A Flask app serving the API blueprint, backed by the fake IPFS node."""
+    from api import routes
+    from api.ipfs_client import IPFSClient
+    monkeypatch.setattr(routes, 'ipfs_client', IPFSClient(base_url=fake_ipfs.base_url))
+    app = Flask(__name__)
+    app.register_blueprint(routes.bp)
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture(autouse=True)
+def metadata_store(monkeypatch):
+    """Give every test an empty metadata store so recorded sizes do not leak between tests."""
+    from api import routes
+    from api.metadata import MetadataStore
+    store = MetadataStore(':memory:')
+    monkeypatch.setattr(routes, 'metadata_store', store)
+    return store
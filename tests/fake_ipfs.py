@@ -0,0 +1,201 @@
+"""A minimal in-process stand-in for the Kubo HTTP API, used by the tests.
+
+Only the endpoints the storage service talks to are implemented. CIDs are
+derived from the SHA-256 of the content, so identical uploads map to the
+same CID just like they do on a real daemon.
+"""
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import MultipartDecoder, Data, File, Epilogue, NeedData
+
+# What a real daemon uses when no DAG layout options are given
+DEFAULT_ADD_PARAMS = {'chunker': 'size-262144', 'raw-leaves': 'false', 'cid-version': '0', 'hash': 'sha2-256', 'trickle': 'false'}
+
+def fake_cid(digest):
+    return f"Qm{digest[:44]}"
+
+def fake_add_cid(digest, params):
+    """The CID of added content: like a real daemon, other DAG layout options give another CID."""
+    layout = {name: params.get(name, default) for name, default in DEFAULT_ADD_PARAMS.items()}
+    if layout == DEFAULT_ADD_PARAMS:
+        return fake_cid(digest)
+    digest = hashlib.sha256(f"{digest}:{sorted(layout.items())}".encode()).hexdigest()
+    return f"bafy{digest[:55]}" if layout['cid-version'] == '1' else fake_cid(digest)
+
+class FakeIPFSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _iter_body(self, chunk_size=1024 * 1024):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                size = int(line.split(b';')[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return
+                remaining = size
+                while remaining:
+                    data = self.rfile.read(min(chunk_size, remaining))
+                    if not data:
+                        return
+                    remaining -= len(data)
+                    yield data
+                self.rfile.readline()
+        else:
+            remaining = int(self.headers.get('Content-Length', 0))
+            while remaining:
+                data = self.rfile.read(min(chunk_size, remaining))
+                if not data:
+                    return
+                remaining -= len(data)
+                yield data
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, message, status=500):
+        self._send_json({"Message": message, "Code": 0, "Type": "error"}, status=status)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.server.requests.append((url.path, params))
+        with self.server.lock:
+            stall = self.server.stall_requests > 0
+            self.server.stall_requests -= stall
+        if stall:
+            # Simulate a daemon that stops answering
+            time.sleep(self.server.stall_seconds)
+        command = url.path.split('/api/v0/', 1)[-1].replace('/', '_')
+        handler = getattr(self, f"handle_{command}", None)
+        if handler is None:
+            for _ in self._iter_body():
+                pass
+            return self._send_error(f"unknown command {url.path}", status=404)
+        handler(params)
+
+    def handle_add(self, params):
+        _, options = parse_options_header(self.headers.get('Content-Type', ''))
+        decoder = MultipartDecoder(options['boundary'].encode())
+        digest = hashlib.sha256()
+        content = bytearray() if self.server.store_content else None
+        filename = None
+        size = 0
+        in_file = False
+        body = self._iter_body()
+        while True:
+            try:
+                event = decoder.next_event()
+            except ValueError:
+                # The client went away before finishing the body
+                return
+            if isinstance(event, NeedData):
+                decoder.receive_data(next(body, None))
+            elif isinstance(event, File):
+                filename = event.filename
+                in_file = True
+            elif isinstance(event, Data) and in_file:
+                digest.update(event.data)
+                size += len(event.data)
+                if content is not None:
+                    content += event.data
+                in_file = event.more_data
+            elif isinstance(event, Epilogue):
+                break
+        for _ in body:
+            pass
+
+        cid = fake_add_cid(digest.hexdigest(), params)
+        self.server.sizes[cid] = size
+        if content is not None:
+            self.server.blobs[cid] = bytes(content)
+        self._send_json({"Name": filename, "Hash": cid, "Size": str(size)})
+
+    def handle_cat(self, params):
+        data = self.server.blobs.get(params.get('arg'))
+        if data is None:
+            return self._send_error("block was not found locally")
+        offset = int(params.get('offset', 0))
+        length = params.get('length')
+        data = data[offset:offset + int(length)] if length is not None else data[offset:]
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if self.server.cat_fail_after is not None:
+            # Simulate a daemon dying mid-stream
+            self.wfile.write(data[:self.server.cat_fail_after])
+            self.close_connection = True
+            return
+        self.wfile.write(data)
+
+    def handle_pin_add(self, params):
+        cid = params.get('arg')
+        if cid not in self.server.sizes:
+            return self._send_error("block was not found locally")
+        self.server.pins.add(cid)
+        self._send_json({"Pins": [cid]})
+
+    def handle_version(self, params):
+        self._send_json({"Version": "0.0.0-fake"})
+
+    def handle_ls(self, params):
+        cid = params.get('arg', '').rsplit('/', 1)[-1]
+        if cid not in self.server.sizes:
+            return self._send_error("block was not found locally")
+        self._send_json({"Objects": [{"Hash": cid, "Links": [], "Size": self.server.sizes[cid]}]})
+
+class FakeIPFSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, store_content=True):
+        super().__init__(('127.0.0.1', 0), FakeIPFSHandler)
+        self.store_content = store_content
+        self.blobs = {}
+        self.sizes = {}
+        self.requests = []
+        self.pins = set()
+        self.cat_fail_after = None
+        self.stall_requests = 0
+        self.stall_seconds = 1.0
+        self.lock = threading.Lock()
+        self._thread = None
+
+    def handle_error(self, request, client_address):
+        # Clients aborting uploads or downloads mid-body are expected in tests
+        pass
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api/v0"
+
+    def put(self, data):
+        """Store content directly, bypassing the HTTP API. Returns its CID."""
+        cid = fake_cid(hashlib.sha256(data).hexdigest())
+        self.blobs[cid] = data
+        self.sizes[cid] = len(data)
+        return cid
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,27 @@
+"""Small ONNX models built on the fly for the tests."""
+import numpy as np
+from onnx import helper, numpy_helper, TensorProto
+
+def make_model(weight_shape=(3, 4), initializer_as_input=False, initializers=1):
+    """A MatMul chain whose weights dominate the file size."""
+    inputs = [helper.make_tensor_value_info('X', TensorProto.FLOAT, ['batch', weight_shape[0]])]
+    weights, nodes = [], []
+    previous = 'X'
+    for i in range(initializers):
+        shape = weight_shape if i == 0 else (weight_shape[1], weight_shape[1])
+        weights.append(numpy_helper.from_array(np.random.rand(*shape).astype(np.float32), f'W{i}'))
+        if initializer_as_input:
+            inputs.append(helper.make_tensor_value_info(f'W{i}', TensorProto.FLOAT, list(shape)))
+        nodes.append(helper.make_node('MatMul', [previous, f'W{i}'], [f'H{i}']))
+        previous = f'H{i}'
+    nodes.append(helper.make_node('Identity', [previous], ['Y']))
+    nodes.append(helper.make_node('Identity', ['N'], ['N_out']))
+    inputs.append(helper.make_tensor_value_info('N', TensorProto.INT64, [None]))
+    outputs = [
+        helper.make_tensor_value_info('Y', TensorProto.FLOAT, ['batch', weight_shape[1]]),
+        helper.make_tensor_value_info('N_out', TensorProto.INT64, [None]),
+    ]
+    graph = helper.make_graph(nodes, 'test_graph', inputs, outputs, weights)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 17)], producer_name='vanna-tests')
+    model.ir_version = 8
+    return model.SerializeToString()
@@ -0,0 +1,114 @@
+import io
+import os
+import runpy
+import time
+from types import SimpleNamespace
+import pytest
+
+from api import routes
+from api.admission import AdmissionController, TokenBucket
+from api.cache import CIDCache
+
+def use_admission(monkeypatch, **kwargs):
+    controller = AdmissionController(**{
+        'request_rate': 0, 'byte_rate': 0, 'transfer_slots': 0, 'exempt': (), 'api_keys': (), **kwargs,
+    })
+    monkeypatch.setattr(routes, 'admission', controller)
+    return controller
+
+def test_token_bucket_refills_and_allows_debt():
+    now = 0.0
+    bucket = TokenBucket(rate=10, burst=5, clock=lambda: now)
+
+    assert [bucket.try_take() for _ in range(5)] == [0] * 5
+    assert bucket.try_take() == pytest.approx(0.1)
+    now = 0.3
+    assert bucket.try_take(3) == 0
+    # Bandwidth is paced, not refused: taking more than is there returns the wait
+    assert bucket.consume(20) == pytest.approx(2.0)
+    assert not bucket.full
+
+def test_request_rate_is_limited_per_client(client, monkeypatch):
+    use_admission(monkeypatch, request_rate=0.5, request_burst=2, exempt=('key:inference',), api_keys=('bulk',))
+
+    statuses = [client.get('/cache_stats').status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    rejected = client.get('/cache_stats')
+    assert rejected.headers['Retry-After'] == '2'
+
+    # Other clients have their own buckets, and exempt clients are never limited
+    assert client.get('/cache_stats', headers={'X-API-Key': 'bulk'}).status_code == 200
+    assert all(client.get('/cache_stats', headers={'X-API-Key': 'inference'}).status_code == 200 for _ in range(5))
+    # Unknown keys are not identities: they share the limits of the address they come from
+    assert client.get('/cache_stats', headers={'X-API-Key': 'made-up'}).status_code == 429
+    assert client.get('/cache_stats', headers={'X-API-Key': 'key:inference'}).status_code == 429
+
+def test_transfers_wait_for_a_slot(client, fake_ipfs, monkeypatch):
+    controller = use_admission(monkeypatch, transfer_slots=1, queue_size=0, queue_timeout=0)
+    cid = fake_ipfs.put(b'x' * 1024)
+
+    first = client.get(f'/download?cid={cid}&stream=true', buffered=False)
+    assert controller.transfers.status()['active'] == 1
+    second = client.get(f'/download?cid={cid}')
+    assert second.status_code == 429
+    assert 'Retry-After' in second.headers
+    # Only transfers need a slot
+    assert client.get('/cache_stats').status_code == 200
+
+    assert first.get_data() == b'x' * 1024
+    first.close()
+    assert controller.transfers.status()['active'] == 0
+    third = client.get(f'/download?cid={cid}')
+    assert third.status_code == 200
+    third.close()
+    assert controller.transfers.status()['active'] == 0
+
+def test_gunicorn_workers_keep_a_thread_free_of_transfers(monkeypatch):
+    controller = use_admission(monkeypatch, transfer_slots=3, queue_size=16, queue_timeout=30)
+    monkeypatch.setattr(routes, 'start_configured_warmup', lambda: None)
+    config = runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'gunicorn.conf.py'))
+
+    config['post_worker_init'](SimpleNamespace(cfg=SimpleNamespace(threads=5)))
+
+    assert controller.transfers.queue_size == 1
+    controller.reserve_threads(2)
+    assert controller.transfers.queue_size == 0
+
+@pytest.mark.parametrize('headers', [{}, {'Range': 'bytes=0-99'}])
+def test_cache_hits_release_their_slot(client, fake_ipfs, monkeypatch, tmp_path, headers):
+    controller = use_admission(monkeypatch, transfer_slots=1, queue_size=0, queue_timeout=0)
+    monkeypatch.setattr(routes, 'cid_cache', CIDCache(str(tmp_path / 'cache'), max_bytes=1024 * 1024))
+    cid = fake_ipfs.put(b'x' * 1024)
+    client.get(f'/download_raw?cid={cid}').close()
+
+    for _ in range(2):
+        # Cache hits are passed through to the server, which closes the body itself
+        with client.get(f'/download_raw?cid={cid}', headers=headers) as hit:
+            assert hit.status_code in (200, 206)
+            assert hit.get_data()
+        assert controller.transfers.status()['active'] == 0
+
+def test_bandwidth_is_shaped_per_client(client, fake_ipfs, monkeypatch):
+    use_admission(monkeypatch, byte_rate=1024 * 1024, byte_burst=64 * 1024)
+    cid = fake_ipfs.put(b'x' * 320 * 1024)
+
+    start_time = time.perf_counter()
+    response = client.get(f'/download?cid={cid}&stream=true')
+    data = response.get_data()
+    elapsed = time.perf_counter() - start_time
+
+    assert response.status_code == 200
+    assert len(data) == 320 * 1024
+    # 256 KiB beyond the burst at 1 MiB/s
+    assert elapsed >= 0.2
+
+def test_upload_bandwidth_is_shaped_per_client(client, monkeypatch):
+    use_admission(monkeypatch, byte_rate=1024 * 1024, byte_burst=64 * 1024)
+
+    start_time = time.perf_counter()
+    response = client.post('/upload', data={'file': (io.BytesIO(b'x' * 320 * 1024), 'model.bin')})
+    elapsed = time.perf_counter() - start_time
+
+    assert response.status_code == 200
+    # The request body alone is 256 KiB beyond the burst
+    assert elapsed >= 0.2
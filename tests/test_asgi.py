@@ -0,0 +1,164 @@
+import asyncio
+import io
+import json
+import os
+import zipfile
+import httpx
+import onnx
+import pytest
+from starlette.applications import Starlette
+from starlette.testclient import TestClient
+from onnx_models import make_model
+
+from api import async_routes
+from api.async_ipfs_client import AsyncIPFSClient
+from api.metadata import MetadataStore
+from api.onnx_tensors import MANIFEST_FORMAT, iter_tensor_data, split_model
+
+CONTENT = os.urandom(256 * 1024)
+
+@pytest.fixture
+def app(fake_ipfs, monkeypatch):
+    monkeypatch.setattr(async_routes, 'ipfs_client', AsyncIPFSClient(base_url=fake_ipfs.base_url))
+    monkeypatch.setattr(async_routes, 'metadata_store', MetadataStore(':memory:'))
+    return Starlette(routes=async_routes.routes)
+
+@pytest.fixture
+def client(app):
+    with TestClient(app) as client:
+        yield client
+
+def test_upload_returns_cid_and_signature(client, fake_ipfs):
+    model = make_model()
+
+    response = client.post('/upload', files={'file': ('model.onnx', io.BytesIO(model))})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert fake_ipfs.blobs[data['cid']] == model
+    assert data['size'] == len(model)
+    assert [i['name'] for i in data['input_types']] == ['X', 'N']
+    assert data['onnx_info']['producer_name'] == 'vanna-tests'
+    assert async_routes.metadata_store.get(data['cid'])['filename'] == 'model.onnx'
+
+def test_upload_uses_requested_dag_layout(client, fake_ipfs):
+    response = client.post('/upload?raw-leaves=true&cid-version=1', files={'file': ('model.bin', io.BytesIO(b'data'))})
+
+    data = response.json()
+    assert data['cid'].startswith('bafy')
+    assert async_routes.metadata_store.get(data['cid'])['dag_layout'] == data['dag_layout']
+    assert client.post('/upload?hash=md5', files={'file': ('model.bin', io.BytesIO(b'data'))}).status_code == 400
+
+def test_upload_rejects_oversized_file(client, monkeypatch):
+    monkeypatch.setattr(async_routes, 'MAX_FILE_SIZE', 1024)
+
+    response = client.post('/upload', files={'file': ('big.bin', io.BytesIO(b'x' * 4096))})
+
+    assert response.status_code == 413
+
+def test_upload_requires_file_part(client):
+    assert client.post('/upload', data={'other': 'value'}).status_code == 400
+
+def test_upload_rejects_malformed_content_length(client):
+    headers = {'Content-Type': 'multipart/form-data; boundary=x', 'Content-Length': 'lots'}
+
+    assert client.post('/upload', content=b'--x--', headers=headers).status_code == 400
+
+@pytest.mark.parametrize("endpoint", ['/download?stream=true', '/download', '/download_raw'])
+def test_download(client, fake_ipfs, endpoint):
+    cid = fake_ipfs.put(CONTENT)
+
+    response = client.get(f'{endpoint}{"&" if "?" in endpoint else "?"}cid={cid}')
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers['ETag'] == f'"{cid}"'
+
+def test_download_range(client, fake_ipfs):
+    cid = fake_ipfs.put(CONTENT)
+
+    response = client.get(f'/download_raw?cid={cid}', headers={'Range': 'bytes=1000-1999'})
+    unsatisfiable = client.get(f'/download_raw?cid={cid}', headers={'Range': f'bytes={len(CONTENT)}-'})
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[1000:2000]
+    assert response.headers['Content-Range'] == f'bytes 1000-1999/{len(CONTENT)}'
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers['Content-Range'] == f'bytes */{len(CONTENT)}'
+
+def test_get_file_size(client, fake_ipfs):
+    cid = fake_ipfs.put(CONTENT)
+
+    assert client.get(f'/get_file_size?cid={cid}').json() == {"cid": cid, "size": len(CONTENT)}
+    assert client.get('/get_file_size').status_code == 400
+
+@pytest.mark.parametrize("compression", ['stored', 'deflated'])
+def test_download_zip_skips_missing_files(client, fake_ipfs, compression):
+    contents = {'model.onnx': CONTENT, 'config.json': b'{"layers": 12}'}
+    files = {name: fake_ipfs.put(data) for name, data in contents.items()}
+    files['missing.bin'] = 'QmMissing'
+
+    response = client.post('/download_zip', json={"files": files, "zip_name": "bundle", "compression": compression})
+
+    assert response.status_code == 200
+    assert 'bundle.zip' in response.headers['Content-Disposition']
+    with zipfile.ZipFile(io.BytesIO(response.content)) as zip_file:
+        assert sorted(zip_file.namelist()) == sorted(contents)
+        for name, data in contents.items():
+            assert zip_file.read(name) == data
+
+def test_download_zip_rejects_invalid_requests(client):
+    assert client.post('/download_zip', json={"files": {}, "compression": 1}).status_code == 400
+    assert client.post('/download_zip', json={"files": ["QmA"]}).status_code == 400
+
+def test_many_concurrent_streams_share_one_event_loop(app, fake_ipfs):
+    cid = fake_ipfs.put(CONTENT)
+
+    async def download_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            responses = await asyncio.gather(*[client.get(f'/download_raw?cid={cid}') for _ in range(100)])
+        await async_routes.ipfs_client.aclose()
+        return responses
+
+    responses = asyncio.run(download_all())
+
+    assert all(response.status_code == 200 and response.content == CONTENT for response in responses)
+
+def put_split_model(fake_ipfs, model):
+    """Store `model` in the tensors layout the way the Flask app's upload does."""
+    graph, tensors = split_model(lambda offset, length: model[offset:offset + length], len(model), 1024)
+    file = io.BytesIO(model)
+    manifest_tensors = [{
+        "name": tensor["name"], "location": tensor["location"], "size": tensor["length"],
+        "cid": fake_ipfs.put(b''.join(iter_tensor_data(file, tensor))),
+    } for tensor in tensors]
+    manifest = {
+        "format": MANIFEST_FORMAT, "graph": fake_ipfs.put(graph), "graph_size": len(graph), "size": len(model),
+        "tensors": manifest_tensors,
+    }
+    return fake_ipfs.put(json.dumps(manifest).encode()), manifest
+
+def test_manifests_are_served_as_the_model(client, fake_ipfs):
+    model = make_model(weight_shape=(16, 32), initializers=2)
+    cid, manifest = put_split_model(fake_ipfs, model)
+    async_routes.metadata_store.put_manifest(cid, manifest)
+    async_routes.metadata_store.put(cid, size=len(model))
+
+    for endpoint in ('download', 'download_raw'):
+        response = client.get(f'/{endpoint}?cid={cid}')
+        assert response.status_code == 200
+        assert int(response.headers['Content-Length']) == len(response.content) == len(model)
+        assert onnx.load_from_string(response.content) == onnx.load_from_string(model)
+    partial = client.get(f'/download_raw?cid={cid}', headers={'Range': 'bytes=100-2999'})
+    assert partial.status_code == 206
+    assert partial.content == response.content[100:3000]
+    assert client.get(f'/get_file_size?cid={cid}').json()['size'] == len(model)
+
+def test_layout_hint_reads_manifests_by_cid(client, fake_ipfs):
+    model = make_model(weight_shape=(16, 32))
+    cid, _ = put_split_model(fake_ipfs, model)
+
+    assert len(client.get(f'/download_raw?cid={cid}&layout=tensors').content) == len(model)
+    assert client.get(f'/get_file_size?cid={cid}&layout=tensors').json()['size'] == len(model)
+    assert client.get(f'/download?cid={fake_ipfs.put(CONTENT)}&layout=tensors').status_code == 400
@@ -0,0 +1,56 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+from api import routes
+
+INPUT_TYPES = [{"name": "input", "type": "tensor(float)", "shape": [1, 3]}]
+
+def test_batch_info_combines_stored_metadata_and_ipfs_lookups(client, fake_ipfs, metadata_store):
+    metadata_store.put('QmKnown', size=10, filename='model.onnx', input_types=INPUT_TYPES)
+    cids = [fake_ipfs.put(bytes([i]) * (100 + i)) for i in range(3)]
+
+    response = client.post('/batch_info', json={'cids': ['QmKnown', *cids, cids[0], 'QmMissing']})
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert results[0] == {"cid": "QmKnown", "size": 10, "filename": "model.onnx", "input_types": INPUT_TYPES}
+    assert [result['size'] for result in results[1:5]] == [100, 101, 102, 100]
+    assert results[5]['cid'] == 'QmMissing'
+    assert 'error' in results[5]
+    # Each unknown CID is looked up once, and found sizes are remembered
+    assert [path for path, _ in fake_ipfs.requests].count('/api/v0/ls') == 4
+    assert metadata_store.get(cids[1])['size'] == 101
+
+def test_batch_info_bounds_concurrent_lookups(client, monkeypatch):
+    monkeypatch.setattr(routes, 'batch_info_executor', ThreadPoolExecutor(max_workers=3))
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+
+    def get_file_size(cid):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.02)
+        with lock:
+            active -= 1
+        return len(cid)
+
+    monkeypatch.setattr(routes.ipfs_client, 'get_file_size', get_file_size)
+
+    results = client.post('/batch_info', json={'cids': [f'Qm{i}' for i in range(12)]}).get_json()['results']
+
+    assert [result['size'] for result in results] == [len(f'Qm{i}') for i in range(12)]
+    assert peak == 3
+
+@pytest.mark.parametrize('body', [None, {}, {'cids': 'QmA'}, {'cids': ['QmA', 7]}, {'cids': ['']}])
+def test_batch_info_rejects_invalid_bodies(client, body):
+    assert client.post('/batch_info', json=body).status_code == 400
+
+def test_batch_info_limits_cids_per_request(client, monkeypatch):
+    monkeypatch.setattr(routes, 'BATCH_INFO_MAX_CIDS', 2)
+
+    assert client.post('/batch_info', json={'cids': ['QmA', 'QmB', 'QmC']}).status_code == 400
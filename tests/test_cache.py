@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+import pytest
+
+from api import routes
+from api.cache import STALE_TEMP_SECONDS, CIDCache
+
+class CountingFetch:
+    def __init__(self, contents, delay=0):
+        self.contents = contents
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, cid):
+        self.calls.append(cid)
+        if cid not in self.contents:
+            raise ValueError(f"{cid} not found")
+        data = self.contents[cid]
+        for i in range(0, len(data), 4):
+            time.sleep(self.delay)
+            yield data[i:i + 4]
+
+@pytest.fixture
+def cache(tmp_path):
+    return CIDCache(str(tmp_path / 'cache'), max_bytes=64)
+
+def test_cache_miss_then_hit(cache):
+    fetch = CountingFetch({'QmA': b'model bytes'})
+
+    assert b''.join(cache.stream('QmA', fetch)) == b'model bytes'
+    assert b''.join(cache.stream('QmA', fetch)) == b'model bytes'
+
+    assert fetch.calls == ['QmA']
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+    with cache.open('QmA') as file:
+        assert file.read() == b'model bytes'
+
+def test_cache_evicts_least_recently_used(cache):
+    fetch = CountingFetch({'QmA': b'a' * 30, 'QmB': b'b' * 30, 'QmC': b'c' * 30})
+
+    for cid in ['QmA', 'QmB']:
+        b''.join(cache.stream(cid, fetch))
+    cache.open('QmA').close()
+    b''.join(cache.stream('QmC', fetch))
+
+    assert cache.open('QmB') is None
+    assert cache.open('QmA') is not None
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['size'] == 60
+
+def test_cache_skips_objects_larger_than_budget(cache):
+    fetch = CountingFetch({'QmBig': b'x' * 100})
+
+    assert b''.join(cache.stream('QmBig', fetch)) == b'x' * 100
+
+    assert cache.open('QmBig') is None
+    assert cache.stats()['size'] == 0
+
+def test_cache_coalesces_concurrent_misses(cache):
+    fetch = CountingFetch({'QmA': b'0123456789abcdef'}, delay=0.05)
+    results = []
+
+    def download():
+        results.append(b''.join(cache.stream('QmA', fetch)))
+
+    threads = [threading.Thread(target=download) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [b'0123456789abcdef'] * 8
+    assert fetch.calls == ['QmA']
+    assert cache.stats()['coalesced'] >= 1
+
+def test_cache_failed_fetch_is_not_cached(cache):
+    fetch = CountingFetch({})
+
+    with pytest.raises(ValueError):
+        b''.join(cache.stream('QmMissing', fetch))
+
+    assert cache.open('QmMissing') is None
+    with pytest.raises(ValueError):
+        b''.join(cache.stream('QmMissing', fetch))
+    assert fetch.calls == ['QmMissing', 'QmMissing']
+
+def test_cache_reloads_entries_from_disk(cache):
+    b''.join(cache.stream('QmA', CountingFetch({'QmA': b'persisted'})))
+
+    reloaded = CIDCache(cache.directory, max_bytes=64)
+
+    assert reloaded.stats()['entries'] == 1
+    assert b''.join(reloaded.stream('QmA', CountingFetch({}))) == b'persisted'
+
+def test_disabled_cache_passes_through(tmp_path):
+    cache = CIDCache(str(tmp_path / 'cache'), max_bytes=0)
+    fetch = CountingFetch({'QmA': b'data'})
+
+    b''.join(cache.stream('QmA', fetch))
+    b''.join(cache.stream('QmA', fetch))
+
+    assert fetch.calls == ['QmA', 'QmA']
+    assert not (tmp_path / 'cache').exists()
+
+def test_download_raw_served_from_cache(client, fake_ipfs, monkeypatch, tmp_path):
+    monkeypatch.setattr(routes, 'cid_cache', CIDCache(str(tmp_path / 'cache'), max_bytes=1024 * 1024))
+    cid = fake_ipfs.put(b'onnx model' * 1000)
+
+    first = client.get(f'/download_raw?cid={cid}').data
+    requests_after_first = len(fake_ipfs.requests)
+    second = client.get(f'/download_raw?cid={cid}')
+
+    assert first == second.data == b'onnx model' * 1000
+    assert second.headers['Content-Length'] == str(len(first))
+    assert len(fake_ipfs.requests) == requests_after_first
+    stats = client.get('/cache_stats').get_json()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+def test_cache_index_is_read_in_the_process_that_uses_it(tmp_path, monkeypatch):
+    # Created before the fork, as in a gunicorn --preload master
+    cache = CIDCache(str(tmp_path / 'cache'), max_bytes=64)
+    earlier_worker = CIDCache(cache.directory, max_bytes=64)
+    b''.join(earlier_worker.stream('QmA', CountingFetch({'QmA': b'a' * 40})))
+
+    assert cache.contains('QmA')
+
+    # A recycled worker sees what was written since
+    b''.join(earlier_worker.stream('QmB', CountingFetch({'QmB': b'b' * 20})))
+    monkeypatch.setattr('os.getpid', lambda: -1)
+    assert cache.stats()['size'] == 60
+    b''.join(cache.stream('QmC', CountingFetch({'QmC': b'c' * 20})))
+    assert not cache.contains('QmA')
+
+def test_cache_keeps_temp_files_of_fills_in_progress(tmp_path):
+    directory = tmp_path / 'cache'
+    directory.mkdir()
+    (directory / '.tmp-active').write_bytes(b'partial')
+    (directory / '.tmp-stale').write_bytes(b'partial')
+    stale = time.time() - 2 * STALE_TEMP_SECONDS
+    os.utime(directory / '.tmp-stale', (stale, stale))
+
+    assert CIDCache(str(directory), max_bytes=64).stats()['entries'] == 0
+    assert sorted(os.listdir(directory)) == ['.tmp-active']
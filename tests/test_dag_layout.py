@@ -0,0 +1,52 @@
+import io
+import pytest
+
+from api.ipfs_client import AddOptions, KUBO_ADD_OPTIONS
+
+LAYOUT = 'chunker=size-1048576&raw-leaves=true&cid-version=1&trickle=true'
+
+def upload(client, query=''):
+    return client.post(f'/upload?{query}', data={'file': (io.BytesIO(b'weights' * 1000), 'model.bin')})
+
+def test_add_options_from_params():
+    options = AddOptions.from_params({'chunker': 'size-1048576', 'raw-leaves': 'true', 'hash': 'blake3'}, KUBO_ADD_OPTIONS)
+
+    assert options.to_dict() == {
+        "chunker": "size-1048576", "raw_leaves": True, "cid_version": 0, "hash": "blake3", "trickle": False,
+    }
+    assert options.params()['raw-leaves'] == 'true'
+    assert not options.is_kubo_default
+    assert AddOptions.from_params({}, KUBO_ADD_OPTIONS).is_kubo_default
+
+@pytest.mark.parametrize('params', [
+    {'chunker': 'size-0'}, {'chunker': 'fixed'}, {'cid-version': '2'}, {'cid-version': 'one'},
+    {'hash': 'md5'}, {'raw-leaves': 'yes'}, {'trickle': ''},
+])
+def test_invalid_add_options_are_rejected(params):
+    with pytest.raises(ValueError):
+        AddOptions.from_params(params)
+
+def test_upload_passes_layout_to_ipfs_and_records_it(client, fake_ipfs, metadata_store):
+    body = upload(client, LAYOUT).get_json()
+
+    _, params = [request for request in fake_ipfs.requests if request[0] == '/api/v0/add'][-1]
+    assert params['chunker'] == 'size-1048576'
+    assert (params['raw-leaves'], params['cid-version'], params['trickle']) == ('true', '1', 'true')
+    assert body['cid'].startswith('bafy')
+    assert body['dag_layout']['chunker'] == 'size-1048576'
+    assert metadata_store.get(body['cid'])['dag_layout'] == body['dag_layout']
+
+def test_deduplication_is_per_layout(client, fake_ipfs):
+    default = upload(client).get_json()
+    tuned = upload(client, LAYOUT).get_json()
+    tuned_again = upload(client, LAYOUT).get_json()
+
+    assert default['cid'] != tuned['cid']
+    assert 'deduplicated' not in tuned
+    assert tuned_again['deduplicated'] is True
+    assert tuned_again['cid'] == tuned['cid']
+
+@pytest.mark.parametrize('query', ['', 'stream=true&', 'async=true&'])
+def test_invalid_layout_is_a_bad_request(client, fake_ipfs, query):
+    assert upload(client, f'{query}cid-version=3').status_code == 400
+    assert fake_ipfs.requests == []
@@ -0,0 +1,47 @@
+import os
+import pytest
+
+from api import metrics, routes
+from api.cache import CIDCache
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch, tmp_path):
+    cache = CIDCache(str(tmp_path / 'cache'), max_bytes=1024 * 1024)
+    monkeypatch.setattr(routes, 'cid_cache', cache)
+    return cache
+
+def test_gateway_mode_redirects_without_touching_ipfs(client, fake_ipfs, monkeypatch):
+    monkeypatch.setattr(routes, 'DOWNLOAD_OFFLOAD', 'gateway')
+    monkeypatch.setattr(routes, 'IPFS_GATEWAY_URL', 'http://gateway.internal:8080/')
+    offloaded = metrics.DOWNLOADS_OFFLOADED.value(mode='gateway')
+
+    raw = client.get('/download_raw?cid=QmHash')
+    attachment = client.get('/download?cid=QmHash')
+
+    assert raw.status_code == 302
+    assert raw.headers['Location'] == 'http://gateway.internal:8080/ipfs/QmHash'
+    assert attachment.headers['Location'] == 'http://gateway.internal:8080/ipfs/QmHash?filename=QmHash&download=true'
+    assert fake_ipfs.requests == []
+    assert metrics.DOWNLOADS_OFFLOADED.value(mode='gateway') == offloaded + 2
+
+@pytest.mark.parametrize('mode', ['accel', 'sendfile'])
+def test_proxy_modes_hand_over_cache_hits(client, fake_ipfs, monkeypatch, mode):
+    monkeypatch.setattr(routes, 'DOWNLOAD_OFFLOAD', mode)
+    cid = fake_ipfs.put(b'model bytes')
+
+    # A miss is served, and cached, by the service itself
+    miss = client.get(f'/download_raw?cid={cid}')
+    assert miss.data == b'model bytes'
+    assert 'X-Accel-Redirect' not in miss.headers and 'X-Sendfile' not in miss.headers
+
+    hit = client.get(f'/download?cid={cid}')
+    assert hit.status_code == 200
+    assert hit.data == b''
+    assert hit.headers['ETag'] == f'"{cid}"'
+    assert hit.headers['Content-Disposition'] == f'attachment;filename={cid}'
+    if mode == 'accel':
+        assert hit.headers['X-Accel-Redirect'] == f'/cached/{cid}'
+    else:
+        assert hit.headers['X-Sendfile'] == os.path.abspath(os.path.join(routes.cid_cache.directory, cid))
+        with open(hit.headers['X-Sendfile'], 'rb') as f:
+            assert f.read() == b'model bytes'
@@ -0,0 +1,134 @@
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+from api import routes
+from api.cache import CIDCache
+from api.zip_stream import stream_zip
+
+@pytest.fixture
+def zip_cache(monkeypatch, tmp_path):
+    cache = CIDCache(str(tmp_path / 'zip-cache'), max_bytes=16 * 1024 * 1024)
+    monkeypatch.setattr(routes, 'zip_cache', cache)
+    return cache
+
+def cat_count(fake_ipfs):
+    return [path for path, _ in fake_ipfs.requests].count('/api/v0/cat')
+
+def test_stream_zip_emits_header_before_consuming_data():
+    consumed = []
+
+    def chunks():
+        consumed.append(True)
+        yield b'data'
+
+    archive = stream_zip([('model.onnx', chunks())])
+    first = next(archive)
+
+    assert first.startswith(b'PK\x03\x04')
+    assert not consumed
+    rest = b''.join(archive)
+    with zipfile.ZipFile(io.BytesIO(first + rest)) as zip_file:
+        assert zip_file.read('model.onnx') == b'data'
+
+@pytest.mark.parametrize("compression, compress_type", [
+    (None, zipfile.ZIP_STORED),
+    ('stored', zipfile.ZIP_STORED),
+    ('deflated', zipfile.ZIP_DEFLATED),
+])
+def test_download_zip(client, fake_ipfs, compression, compress_type):
+    contents = {
+        'model.onnx': os.urandom(3 * 1024 * 1024),
+        'config.json': b'{"layers": 12}',
+        'empty.txt': b'',
+    }
+    files = {name: fake_ipfs.put(data) for name, data in contents.items()}
+    payload = {"files": files, "zip_name": "bundle"}
+    if compression:
+        payload["compression"] = compression
+
+    response = client.post('/download_zip', json=payload)
+
+    assert response.status_code == 200
+    assert 'bundle.zip' in response.headers['Content-Disposition']
+    with zipfile.ZipFile(io.BytesIO(response.data)) as zip_file:
+        assert zip_file.testzip() is None
+        assert sorted(zip_file.namelist()) == sorted(contents)
+        for name, data in contents.items():
+            assert zip_file.read(name) == data
+            assert zip_file.getinfo(name).compress_type == compress_type
+
+def test_download_zip_skips_missing_cids(client, fake_ipfs):
+    files = {'present.bin': fake_ipfs.put(b'present'), 'missing.bin': 'QmMissing'}
+
+    response = client.post('/download_zip', json={"files": files})
+
+    with zipfile.ZipFile(io.BytesIO(response.data)) as zip_file:
+        assert zip_file.namelist() == ['present.bin']
+
+@pytest.mark.parametrize('body', [
+    {"files": {}, "compression": "lzma"},
+    {"files": {}, "compression": 1},
+    {"files": ["QmA"]},
+    {"files": {"a.bin": {"cid": "QmA"}}},
+    {"files": {}, "zip_name": None},
+    ["files"],
+])
+def test_download_zip_rejects_invalid_requests(client, body):
+    response = client.post('/download_zip', json=body)
+
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_repeated_bundles_are_served_from_cache(client, fake_ipfs, zip_cache):
+    files = {'b.bin': fake_ipfs.put(b'b' * 5000), 'a.bin': fake_ipfs.put(b'a' * 3000)}
+
+    first = client.post('/download_zip', json={"files": files})
+    assert first.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(first.data)) as zip_file:
+        assert zip_file.namelist() == ['a.bin', 'b.bin']
+    cats = cat_count(fake_ipfs)
+
+    # The same manifest in another order is the same bundle
+    second = client.post('/download_zip', json={"files": dict(reversed(list(files.items()))), "zip_name": "other"})
+    assert second.data == first.data
+    assert second.headers['Content-Length'] == str(len(first.data))
+    assert second.headers['Content-Type'] == 'application/zip'
+    assert 'other.zip' in second.headers['Content-Disposition']
+    assert cat_count(fake_ipfs) == cats
+
+    partial = client.post('/download_zip', json={"files": files}, headers={'Range': 'bytes=10-99'})
+    assert partial.status_code == 206
+    assert partial.data == first.data[10:100]
+
+    client.post('/download_zip', json={"files": files, "compression": "deflated"}).get_data()
+    assert cat_count(fake_ipfs) > cats
+    assert zip_cache.stats()['entries'] == 2
+
+def test_bundles_missing_files_are_not_cached(client, fake_ipfs, zip_cache):
+    files = {'present.bin': fake_ipfs.put(b'present'), 'missing.bin': 'QmMissing'}
+
+    client.post('/download_zip', json={"files": files}).get_data()
+    response = client.post('/download_zip', json={"files": files})
+
+    with zipfile.ZipFile(io.BytesIO(response.data)) as zip_file:
+        assert zip_file.namelist() == ['present.bin']
+    assert zip_cache.stats()['entries'] == 0
+    assert zip_cache.stats()['misses'] == 2
+
+def test_concurrent_identical_bundles_are_built_once(app, fake_ipfs, zip_cache):
+    files = {f'part{i}.bin': fake_ipfs.put(os.urandom(256 * 1024)) for i in range(4)}
+
+    def download(_):
+        return app.test_client().post('/download_zip', json={"files": files}).data
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        bundles = list(executor.map(download, range(6)))
+
+    assert len(set(bundles)) == 1
+    assert cat_count(fake_ipfs) == len(files)
+    stats = zip_cache.stats()
+    assert stats['misses'] == 1
+    assert stats['hits'] + stats['coalesced'] == 5
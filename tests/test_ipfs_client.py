@@ -0,0 +1,35 @@
+import io
+import os
+
+from api.ipfs_client import IPFSClient, iter_adaptive_chunks, iter_file_chunks
+
+def test_adaptive_chunks_grow_to_limit():
+    data = io.BytesIO(os.urandom(1000))
+
+    chunks = list(iter_adaptive_chunks(data.read, chunk_size=64, min_chunk_size=8))
+
+    assert [len(chunk) for chunk in chunks[:5]] == [8, 16, 32, 64, 64]
+    assert b''.join(chunks) == data.getvalue()
+
+def test_file_chunks_reuse_one_buffer():
+    content = os.urandom(10 * 1024 + 7)
+    received = []
+    buffers = set()
+
+    for chunk in iter_file_chunks(io.BytesIO(content), chunk_size=1024):
+        buffers.add(id(chunk.obj))
+        received.append(bytes(chunk))
+
+    assert b''.join(received) == content
+    assert len(buffers) == 1
+
+def test_cat_stream_uses_large_chunks(fake_ipfs):
+    content = os.urandom(4 * 1024 * 1024)
+    cid = fake_ipfs.put(content)
+    client = IPFSClient(base_url=fake_ipfs.base_url)
+
+    chunks = list(client.cat_stream(cid, chunk_size=1024 * 1024))
+
+    assert b''.join(chunks) == content
+    assert len(chunks) < 10
+    assert max(len(chunk) for chunk in chunks) == 1024 * 1024
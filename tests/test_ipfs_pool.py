@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+import pytest
+import requests
+import urllib3
+from fake_ipfs import FakeIPFSServer
+
+from api.ipfs_client import IPFSClient, node_api_url
+from api.ipfs_pool import RetryPolicy
+
+CONTENT = os.urandom(512 * 1024)
+
+@pytest.fixture
+def nodes():
+    servers = [FakeIPFSServer().start() for _ in range(3)]
+    yield servers
+    for server in servers:
+        server.stop()
+
+@pytest.fixture
+def client(nodes):
+    client = IPFSClient(base_url=[node.base_url for node in nodes], health_interval=0)
+    yield client
+    client.close()
+
+def cat_requests(node):
+    return [params for path, params in node.requests if path == '/api/v0/cat']
+
+def test_node_api_url():
+    assert node_api_url('ipfs-1:5001') == 'http://ipfs-1:5001/api/v0'
+    assert node_api_url('https://ipfs.example.com/') == 'https://ipfs.example.com/api/v0'
+    assert node_api_url('http://10.0.0.2:5001/api/v0') == 'http://10.0.0.2:5001/api/v0'
+
+def test_streams_go_to_least_loaded_node(client, nodes):
+    cid = [node.put(CONTENT) for node in nodes][0]
+
+    streams = [client.cat_stream(cid) for _ in range(3)]
+
+    assert [node['outstanding'] for node in client.node_stats()] == [1, 1, 1]
+    assert all(len(cat_requests(node)) == 1 for node in nodes)
+    assert all(b''.join(stream) == CONTENT for stream in streams)
+    assert [node['outstanding'] for node in client.node_stats()] == [0, 0, 0]
+
+def test_cat_fails_over_when_node_is_down(client, nodes):
+    cid = [node.put(CONTENT) for node in nodes][0]
+    nodes[0].stop()
+
+    assert client.cat(cid) == CONTENT
+    assert client.cat(cid) == CONTENT
+
+    stats = client.node_stats()
+    assert not stats[0]['healthy']
+    assert stats[0]['failures'] == 1
+    assert stats[0]['requests'] == 1
+
+def test_ls_fails_over_on_server_error(client, nodes):
+    cid = nodes[2].put(CONTENT)
+
+    assert client.get_file_size(cid) == len(CONTENT)
+    assert all(node['healthy'] for node in client.node_stats())
+
+def test_broken_stream_resumes_on_another_node(client, nodes):
+    cid = [node.put(CONTENT) for node in nodes][0]
+    nodes[0].cat_fail_after = 100000
+
+    data = b''.join(client.cat_stream(cid, offset=1000, length=300000))
+
+    assert data == CONTENT[1000:301000]
+    assert not client.node_stats()[0]['healthy']
+    resumed = [params for node in nodes[1:] for params in cat_requests(node)]
+    assert len(resumed) == 1
+    assert 1000 < int(resumed[0]['offset']) <= 101000
+    assert int(resumed[0]['offset']) + int(resumed[0]['length']) == 301000
+
+def test_health_probe_restores_node(client, nodes):
+    client.pool.mark_failed(client.pool.nodes[0], ConnectionError("down"))
+
+    client.pool.check_health()
+
+    assert client.node_stats()[0]['healthy']
+
+def test_add_is_not_retried(client, nodes):
+    nodes[0].stop()
+
+    with pytest.raises(requests.ConnectionError):
+        client.add_stream(iter([b'data']))
+    assert not client.node_stats()[0]['healthy']
+    assert client.add_stream(iter([b'data'])) == nodes[1].put(b'data')
+
+def test_backoff_delay_grows_and_is_capped():
+    policy = RetryPolicy(attempts=5, backoff=1.0, max_backoff=3.0)
+
+    assert 0.5 <= policy.delay(1) <= 1.0
+    assert 1.0 <= policy.delay(2) <= 2.0
+    assert 1.5 <= policy.delay(5) <= 3.0
+    assert RetryPolicy().delay(3) == 0.0
+
+def test_stalled_request_times_out_and_retries(fake_ipfs):
+    cid = fake_ipfs.put(CONTENT)
+    fake_ipfs.stall_requests = 1
+    policy = RetryPolicy(attempts=2, backoff=0.05, max_backoff=0.05, timeout=(1, 0.2))
+    client = IPFSClient(base_url=fake_ipfs.base_url, retry_policies={'cat': policy})
+
+    assert client.cat(cid) == CONTENT
+    assert client.node_stats()[0]['failures'] == 1
+
+def test_timeout_raised_when_attempts_run_out(fake_ipfs):
+    cid = fake_ipfs.put(CONTENT)
+    fake_ipfs.stall_requests = 1
+    client = IPFSClient(base_url=fake_ipfs.base_url, retry_policies={'ls': RetryPolicy(timeout=(1, 0.2))})
+
+    with pytest.raises(requests.Timeout):
+        client.get_file_size(cid)
+
+def test_pool_wait_is_recorded(fake_ipfs):
+    cid = fake_ipfs.put(CONTENT)
+    client = IPFSClient(base_url=fake_ipfs.base_url, pool_size=1)
+    holder = client.cat_stream(cid)
+    result = []
+
+    waiter = threading.Thread(target=lambda: result.append(client.cat(cid)))
+    waiter.start()
+    deadline = time.time() + 5
+    while client.node_stats()[0]['pool_wait']['waiting'] == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.1)
+    assert b''.join(holder) == CONTENT
+    waiter.join(5)
+
+    pool_wait = client.node_stats()[0]['pool_wait']
+    assert result == [CONTENT]
+    assert pool_wait['waiting'] == 0
+    assert pool_wait['count'] == 2
+    assert pool_wait['max_seconds'] >= 0.1
+
+def test_pool_wait_times_out(fake_ipfs):
+    cid = fake_ipfs.put(CONTENT)
+    client = IPFSClient(base_url=fake_ipfs.base_url, pool_size=1, pool_timeout=0.2)
+    holder = client.cat_stream(cid)
+
+    with pytest.raises(urllib3.exceptions.EmptyPoolError):
+        client.cat(cid)
+    # Running out of connections is not the node's fault
+    assert client.node_stats()[0]['healthy']
+
+    holder.close()
+    assert client.node_stats()[0]['outstanding'] == 0
+    assert client.cat(cid) == CONTENT
+
+def test_health_probe_starts_in_each_process(nodes, monkeypatch):
+    probes = lambda: sum(thread.name == 'ipfs-health' for thread in threading.enumerate())
+    before = probes()
+    client = IPFSClient(base_url=[node.base_url for node in nodes], health_interval=0.05)
+    try:
+        # Nothing runs in the process that imports the app, such as a preloading gunicorn master
+        assert probes() == before
+
+        client.pool.release(client.pool.acquire())
+        assert probes() == before + 1
+
+        # A forked worker has no threads of its own, so its first request starts one
+        monkeypatch.setattr('os.getpid', lambda: -1)
+        node = client.pool.acquire()
+        client.pool.release(node)
+        assert probes() == before + 2
+        client.pool.mark_failed(node, 'connection refused')
+        deadline = time.time() + 5
+        while not client.node_stats()[0]['healthy']:
+            assert time.time() < deadline
+            time.sleep(0.02)
+    finally:
+        client.close()
@@ -0,0 +1,153 @@
+import io
+import sqlite3
+import pytest
+from onnx_models import make_model
+
+from api import routes
+from api.metadata import MetadataStore
+
+INPUT_TYPES = [{"name": "input", "type": "tensor(float)", "shape": [1, 3]}]
+
+def test_put_and_get_round_trip(tmp_path):
+    store = MetadataStore(str(tmp_path / 'metadata.db'))
+
+    store.put('QmA', size=10, filename='model.onnx', input_types=INPUT_TYPES)
+
+    assert store.get('QmA') == {
+        "size": 10, "filename": "model.onnx", "input_types": INPUT_TYPES, "output_types": None, "dag_layout": None,
+    }
+    assert store.get('QmMissing') is None
+
+def test_put_keeps_existing_fields(tmp_path):
+    store = MetadataStore(str(tmp_path / 'metadata.db'))
+
+    store.put('QmA', size=10, filename='model.onnx', input_types=INPUT_TYPES)
+    store.put('QmA', size=10)
+
+    assert store.get('QmA')['filename'] == 'model.onnx'
+    assert store.get('QmA')['input_types'] == INPUT_TYPES
+
+def test_databases_without_dag_layout_are_upgraded(tmp_path):
+    path = str(tmp_path / 'metadata.db')
+    db = sqlite3.connect(path)
+    db.execute(
+        'CREATE TABLE metadata (cid TEXT PRIMARY KEY, size INTEGER, filename TEXT, '
+        'input_types TEXT, output_types TEXT, updated_at REAL)'
+    )
+    db.execute("INSERT INTO metadata (cid, size, filename) VALUES ('QmOld', 7, 'old.onnx')")
+    db.commit()
+    db.close()
+
+    store = MetadataStore(path)
+    store.put('QmNew', size=1, dag_layout={"chunker": "size-1048576"})
+
+    assert store.get('QmOld')['filename'] == 'old.onnx'
+    assert store.get('QmNew')['dag_layout'] == {"chunker": "size-1048576"}
+
+def test_metadata_persists_across_instances(tmp_path):
+    MetadataStore(str(tmp_path / 'metadata.db')).put('QmA', size=42)
+
+    assert MetadataStore(str(tmp_path / 'metadata.db')).get('QmA')['size'] == 42
+
+def test_database_is_opened_in_the_process_that_uses_it(tmp_path, monkeypatch):
+    path = tmp_path / 'metadata.db'
+    store = MetadataStore(str(path))
+    # Creating the store, as importing the app does, opens nothing
+    assert not path.exists()
+    store.put('QmA', size=10)
+    connection = store._connection
+
+    monkeypatch.setattr('os.getpid', lambda: -1)
+    store.put('QmB', size=20)
+
+    assert store._connection is not connection
+    assert (store.get('QmA')['size'], store.get('QmB')['size']) == (10, 20)
+
+def test_lru_is_bounded(tmp_path):
+    store = MetadataStore(str(tmp_path / 'metadata.db'), lru_size=2)
+
+    for i in range(5):
+        store.put(f'Qm{i}', size=i)
+        store.get(f'Qm{i}')
+
+    assert list(store._lru) == ['Qm3', 'Qm4']
+    assert store.get('Qm0')['size'] == 0
+
+def test_get_many_reads_lru_and_database(tmp_path):
+    store = MetadataStore(str(tmp_path / 'metadata.db'))
+    for i in range(3):
+        store.put(f'Qm{i}', size=i)
+    store.get('Qm0')
+
+    records = store.get_many(['Qm0', 'Qm1', 'Qm2', 'QmMissing', 'Qm1'])
+
+    assert {cid: record['size'] for cid, record in records.items()} == {'Qm0': 0, 'Qm1': 1, 'Qm2': 2}
+
+def test_hot_cids_rank_by_download_count(tmp_path):
+    store = MetadataStore(str(tmp_path / 'metadata.db'))
+    for cid, count in (('QmA', 1), ('QmB', 3), ('QmC', 2)):
+        for _ in range(count):
+            store.record_access(cid)
+
+    assert store.hot_cids(2) == ['QmB', 'QmC']
+    store.record_access('QmA')
+    store.record_access('QmA')
+    # Counts are buffered until the next flush, so another instance does not see them yet
+    assert MetadataStore(str(tmp_path / 'metadata.db')).hot_cids(1) == ['QmB']
+    # Ties go to the most recently downloaded CID
+    assert store.hot_cids(1) == ['QmA']
+
+def test_rejects_unknown_fields():
+    with pytest.raises(ValueError):
+        MetadataStore(':memory:').put('QmA', colour='blue')
+
+def test_digest_index_round_trip(tmp_path):
+    store = MetadataStore(str(tmp_path / 'metadata.db'))
+
+    store.put_digest('abc', 'QmA')
+
+    assert MetadataStore(str(tmp_path / 'metadata.db')).find_digest('abc') == 'QmA'
+    assert store.find_digest('missing') is None
+
+def test_get_file_size_only_asks_ipfs_once(client, fake_ipfs, metadata_store):
+    cid = fake_ipfs.put(b'x' * 1234)
+
+    sizes = [client.get(f'/get_file_size?cid={cid}').get_json()['size'] for _ in range(3)]
+
+    assert sizes == [1234] * 3
+    assert [path for path, _ in fake_ipfs.requests] == ['/api/v0/ls']
+    assert metadata_store.get(cid)['size'] == 1234
+
+def test_reupload_is_answered_from_digest_index(client, fake_ipfs):
+    model = make_model()
+    first = client.post('/upload', data={'file': (io.BytesIO(model), 'model.onnx')}).get_json()
+    requests_after_first = len(fake_ipfs.requests)
+
+    second = client.post('/upload', data={'file': (io.BytesIO(model), 'copy.onnx')}).get_json()
+
+    assert len(fake_ipfs.requests) == requests_after_first
+    assert second['deduplicated'] is True
+    assert second['cid'] == first['cid']
+    assert second['filename'] == 'copy.onnx'
+    assert second['size'] == len(model)
+    assert second['input_types'] == first['input_types']
+    assert 'deduplicated' not in first
+
+def test_streamed_upload_is_indexed(client, fake_ipfs):
+    data = b'weights' * 1000
+    streamed = client.post('/upload?stream=true', data={'file': (io.BytesIO(data), 'weights.bin')}).get_json()
+
+    again = client.post('/upload', data={'file': (io.BytesIO(data), 'weights.bin')}).get_json()
+
+    assert again['cid'] == streamed['cid']
+    assert again['deduplicated'] is True
+
+def test_dedup_can_be_disabled(client, fake_ipfs, monkeypatch):
+    monkeypatch.setattr(routes, 'UPLOAD_DEDUP', False)
+    data = b'weights' * 1000
+
+    for _ in range(2):
+        response = client.post('/upload', data={'file': (io.BytesIO(data), 'weights.bin')}).get_json()
+
+    assert 'deduplicated' not in response
+    assert [path for path, _ in fake_ipfs.requests].count('/api/v0/add') == 2
@@ -0,0 +1,116 @@
+import io
+import os
+import pytest
+from onnx_models import make_model
+
+from api import metrics, routes
+from api.cache import CIDCache
+
+def test_histogram_renders_cumulative_buckets():
+    registry = metrics.Registry()
+    histogram = metrics.Histogram('test_seconds', 'Test.', ['endpoint'], buckets=(0.1, 1), registry=registry)
+
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value, endpoint='/a"b')
+
+    assert registry.render().splitlines() == [
+        '# HELP test_seconds Test.',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{endpoint="/a\\"b",le="0.1"} 2',
+        'test_seconds_bucket{endpoint="/a\\"b",le="1.0"} 3',
+        'test_seconds_bucket{endpoint="/a\\"b",le="+Inf"} 4',
+        'test_seconds_sum{endpoint="/a\\"b"} 2.65',
+        'test_seconds_count{endpoint="/a\\"b"} 4',
+    ]
+
+def test_counter_and_gauge():
+    registry = metrics.Registry()
+    counter = metrics.Counter('test_events', 'Events.', ['kind'], registry=registry)
+    gauge = metrics.Gauge('test_open', 'Open.', registry=registry)
+
+    counter.inc(kind='a')
+    counter.inc(2, kind='a')
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+
+    assert 'test_events_total{kind="a"} 3' in registry.render()
+    assert 'test_open 1' in registry.render()
+    with pytest.raises(ValueError):
+        counter.inc(other='x')
+
+def test_download_records_latency_bytes_and_ipfs_calls(client, fake_ipfs):
+    content = os.urandom(300 * 1024)
+    cid = fake_ipfs.put(content)
+    latency_before = metrics.REQUEST_LATENCY.count(endpoint='/download_raw', method='GET', status=200)
+    cat_before = metrics.IPFS_LATENCY.count(operation='cat', outcome='ok')
+    ttfb_before = metrics.RESPONSE_FIRST_BYTE.count(endpoint='/download_raw')
+    inflight_before = metrics.INFLIGHT_STREAMS.value(endpoint='/download_raw')
+
+    response = client.get(f'/download_raw?cid={cid}')
+    assert metrics.INFLIGHT_STREAMS.value(endpoint='/download_raw') == inflight_before + 1
+    assert response.data == content
+    response.close()
+
+    assert metrics.REQUEST_LATENCY.count(endpoint='/download_raw', method='GET', status=200) == latency_before + 1
+    assert metrics.RESPONSE_FIRST_BYTE.count(endpoint='/download_raw') == ttfb_before + 1
+    assert metrics.IPFS_LATENCY.count(operation='cat', outcome='ok') == cat_before + 1
+    assert metrics.INFLIGHT_STREAMS.value(endpoint='/download_raw') == inflight_before
+    exposition = client.get('/metrics').data.decode()
+    assert 'vanna_response_bytes_bucket{endpoint="/download_raw"' in exposition
+    assert 'vanna_ipfs_request_duration_seconds_count{operation="ls",outcome="ok"}' in exposition
+
+class ServerFileWrapper:
+    """Stands in for a server's own `wsgi.file_wrapper`, as gunicorn provides."""
+
+    def __init__(self, file, block_size=8192):
+        self.file = file
+        self.block_size = block_size
+
+    def __iter__(self):
+        return iter(lambda: self.file.read(self.block_size), b'')
+
+    def close(self):
+        self.file.close()
+
+@pytest.mark.parametrize('headers', [{}, {'Range': 'bytes=0-99'}])
+def test_cache_hits_are_recorded(app, fake_ipfs, monkeypatch, tmp_path, headers):
+    monkeypatch.setattr(routes, 'cid_cache', CIDCache(str(tmp_path / 'cache'), max_bytes=1024 * 1024))
+    bodies = []
+    wsgi_app = app.wsgi_app
+    app.wsgi_app = lambda environ, start_response: bodies.append(wsgi_app(environ, start_response)) or bodies[-1]
+    client = app.test_client()
+    cid = fake_ipfs.put(b'x' * 1024)
+    client.get(f'/download_raw?cid={cid}').close()
+    status = 206 if headers else 200
+    latency_before = metrics.REQUEST_LATENCY.count(endpoint='/download_raw', method='GET', status=status)
+    inflight_before = metrics.INFLIGHT_STREAMS.value(endpoint='/download_raw')
+
+    for _ in range(3):
+        response = client.get(
+            f'/download_raw?cid={cid}', headers=headers, environ_overrides={'wsgi.file_wrapper': ServerFileWrapper},
+        )
+        assert response.status_code == status
+        assert response.get_data()
+        response.close()
+
+    if not headers:
+        # The server gets its own file wrapper back, so it can still use sendfile
+        assert isinstance(bodies[-1], ServerFileWrapper)
+    assert metrics.INFLIGHT_STREAMS.value(endpoint='/download_raw') == inflight_before
+    assert metrics.REQUEST_LATENCY.count(endpoint='/download_raw', method='GET', status=status) == latency_before + 3
+
+def test_upload_records_phases_and_request_bytes(client):
+    model = make_model()
+    phases_before = {phase: metrics.UPLOAD_PHASE.count(phase=phase) for phase in ('receive', 'inspect', 'ipfs_add')}
+    inspections_before = metrics.ONNX_INSPECTION.count(method='lazy')
+
+    response = client.post('/upload', data={'file': (io.BytesIO(model), 'model.onnx')})
+    response.close()
+
+    assert response.status_code == 200
+    assert all(metrics.UPLOAD_PHASE.count(phase=phase) == count + 1 for phase, count in phases_before.items())
+    assert metrics.ONNX_INSPECTION.count(method='lazy') == inspections_before + 1
+    exposition = client.get('/metrics').data.decode()
+    sizes = [line for line in exposition.splitlines() if line.startswith('vanna_request_bytes_sum{endpoint="/upload"}')]
+    assert float(sizes[0].split()[-1]) >= len(model)
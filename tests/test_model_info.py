@@ -0,0 +1,130 @@
+import io
+import pytest
+import onnxruntime as ort
+from onnx_models import make_model
+
+from api import routes
+from api.cache import CIDCache
+from api.onnx_metadata import read_onnx_signature, read_onnx_signature_from_file
+
+def session_signature(model_bytes):
+    session = ort.InferenceSession(model_bytes)
+    describe = lambda args: [{"name": a.name, "type": a.type, "shape": a.shape} for a in args]
+    return describe(session.get_inputs()), describe(session.get_outputs())
+
+@pytest.mark.parametrize("initializer_as_input", [False, True])
+def test_signature_matches_onnxruntime(initializer_as_input):
+    model = make_model(initializers=3, initializer_as_input=initializer_as_input)
+
+    signature = read_onnx_signature_from_file(io.BytesIO(model))
+
+    assert (signature['input_types'], signature['output_types']) == session_signature(model)
+    assert signature['ir_version'] == 8
+    assert signature['producer_name'] == 'vanna-tests'
+    assert signature['opset_import'] == [{"domain": '', "version": 17}]
+
+def test_signature_skips_weights():
+    model = make_model(weight_shape=(1024, 1024), initializers=4)
+    reads = []
+
+    def read_at(offset, length):
+        reads.append(length)
+        return model[offset:offset + length]
+
+    signature = read_onnx_signature(read_at, len(model), window=4096)
+
+    assert len(model) > 16 * 1024 * 1024
+    assert signature['bytes_read'] < 64 * 1024
+    assert [i['name'] for i in signature['input_types']] == ['X', 'N']
+
+def test_rejects_non_onnx_data():
+    data = b'this is not a model' * 100
+
+    with pytest.raises(ValueError):
+        read_onnx_signature(lambda offset, length: data[offset:offset + length], len(data))
+
+def test_model_info_reads_uncached_model_with_ranges(client, fake_ipfs, metadata_store):
+    model = make_model(weight_shape=(512, 512), initializers=2)
+    cid = fake_ipfs.put(model)
+
+    response = client.get(f'/model_info?cid={cid}')
+
+    assert response.status_code == 200
+    inputs, outputs = session_signature(model)
+    assert response.get_json()['input_types'] == inputs
+    assert response.get_json()['output_types'] == outputs
+    cat_lengths = [int(params['length']) for path, params in fake_ipfs.requests if path == '/api/v0/cat']
+    assert sum(cat_lengths) < len(model) // 4
+    assert metadata_store.get(cid)['input_types'] == inputs
+
+def test_model_info_served_from_metadata(client, fake_ipfs, metadata_store):
+    cid = fake_ipfs.put(make_model())
+    client.get(f'/model_info?cid={cid}')
+    requests_before = len(fake_ipfs.requests)
+
+    response = client.get(f'/model_info?cid={cid}')
+
+    assert response.status_code == 200
+    assert len(fake_ipfs.requests) == requests_before
+
+def test_model_info_reads_from_download_cache(client, fake_ipfs, monkeypatch, tmp_path):
+    cache = CIDCache(str(tmp_path / 'cache'), max_bytes=1024 * 1024)
+    monkeypatch.setattr(routes, 'cid_cache', cache)
+    model = make_model()
+    cid = fake_ipfs.put(model)
+    b''.join(cache.stream(cid, routes.ipfs_client.cat_stream))
+    requests_before = len(fake_ipfs.requests)
+
+    response = client.get(f'/model_info?cid={cid}')
+
+    assert response.get_json()['input_types'] == session_signature(model)[0]
+    assert len(fake_ipfs.requests) == requests_before
+
+def test_model_info_rejects_non_onnx(client, fake_ipfs):
+    cid = fake_ipfs.put(b'plain text file')
+
+    response = client.get(f'/model_info?cid={cid}')
+
+    assert response.status_code == 422
+
+def test_model_info_requires_cid(client):
+    assert client.get('/model_info').status_code == 400
+
+def upload_model(client, model):
+    return client.post('/upload', data={'file': (io.BytesIO(model), 'model.onnx')})
+
+def test_upload_reads_signature_without_session(client, monkeypatch):
+    model = make_model(initializers=2)
+    inputs, outputs = session_signature(model)
+    monkeypatch.setattr(routes.ort, 'InferenceSession', None)
+
+    data = upload_model(client, model).get_json()
+
+    assert data['input_types'] == inputs
+    assert data['output_types'] == outputs
+    assert data['onnx_info']['producer_name'] == 'vanna-tests'
+    assert data['onnx_info']['opset_import'] == [{"domain": '', "version": 17}]
+
+def test_upload_falls_back_to_session(client, monkeypatch):
+    model = make_model()
+
+    def broken_parser(file):
+        raise ValueError("unsupported")
+
+    monkeypatch.setattr(routes, 'read_onnx_signature_from_file', broken_parser)
+
+    data = upload_model(client, model).get_json()
+
+    assert data['input_types'] == session_signature(model)[0]
+    assert 'onnx_info' not in data
+
+def test_upload_records_signature_for_model_info(client, fake_ipfs):
+    model = make_model()
+    cid = upload_model(client, model).get_json()['cid']
+    requests_before = len(fake_ipfs.requests)
+
+    response = client.get(f'/model_info?cid={cid}')
+
+    assert response.get_json()['filename'] == 'model.onnx'
+    assert response.get_json()['input_types'] == session_signature(model)[0]
+    assert len(fake_ipfs.requests) == requests_before
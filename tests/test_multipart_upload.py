@@ -0,0 +1,178 @@
+import hashlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from onnx_models import make_model
+
+from api import routes
+from api.multipart_uploads import MultipartUploadManager, PartsReader
+
+@pytest.fixture(autouse=True)
+def uploads(monkeypatch, tmp_path):
+    manager = MultipartUploadManager(spool_dir=str(tmp_path / 'multipart'))
+    monkeypatch.setattr(routes, 'multipart_uploads', manager)
+    return manager
+
+def split(data, part_size):
+    return [data[start:start + part_size] for start in range(0, len(data), part_size)]
+
+def start_upload(client, filename):
+    response = client.post('/multipart_upload', json={'filename': filename})
+    assert response.status_code == 201
+    return response.get_json()['upload_id']
+
+def test_parts_reader_reads_and_seeks_across_parts(tmp_path):
+    parts = [b'abc', b'', b'defg', b'h']
+    paths = []
+    for index, part in enumerate(parts):
+        path = tmp_path / str(index)
+        path.write_bytes(part)
+        paths.append(str(path))
+
+    with PartsReader(paths) as reader:
+        assert reader.read() == b'abcdefgh'
+        reader.seek(2)
+        assert reader.read(3) == b'cde'
+        assert reader.read(10) == b'fgh'
+        reader.seek(-2, 2)
+        assert reader.read() == b'gh'
+        assert reader.size == 8
+
+def test_parallel_parts_are_assembled_in_order(client, fake_ipfs, uploads):
+    data = os.urandom(300 * 1024 + 17)
+    upload_id = start_upload(client, 'weights.bin')
+    parts = split(data, 64 * 1024)
+
+    def put(numbered):
+        number, part = numbered
+        return client.put(f'/multipart_upload/{upload_id}/{number}', data=part).get_json()
+
+    with ThreadPoolExecutor(4) as executor:
+        receipts = list(executor.map(put, reversed(list(enumerate(parts, start=1)))))
+    assert {receipt['part']: receipt['sha256'] for receipt in receipts} == {
+        number: hashlib.sha256(part).hexdigest() for number, part in enumerate(parts, start=1)
+    }
+
+    result = client.post(f'/multipart_upload/{upload_id}/complete').get_json()
+
+    assert fake_ipfs.blobs[result['cid']] == data
+    assert result['size'] == len(data)
+    assert os.listdir(uploads.spool_dir) == []
+    # Completing again returns the same result without another add
+    assert client.post(f'/multipart_upload/{upload_id}/complete').get_json()['cid'] == result['cid']
+    assert [path for path, _ in fake_ipfs.requests].count('/api/v0/add') == 1
+    assert client.get(f'/multipart_upload/{upload_id}').get_json()['state'] == 'done'
+
+def test_retried_part_replaces_previous_attempt(client, fake_ipfs):
+    upload_id = start_upload(client, 'model.onnx')
+    model = make_model()
+    first, second = model[:100], model[100:]
+
+    client.put(f'/multipart_upload/{upload_id}/1', data=b'garbage')
+    client.put(f'/multipart_upload/{upload_id}/2', data=second)
+    client.put(f'/multipart_upload/{upload_id}/1', data=first)
+    status = client.get(f'/multipart_upload/{upload_id}').get_json()
+    result = client.post(f'/multipart_upload/{upload_id}/complete', json={'parts': [1, 2]}).get_json()
+
+    assert [part['size'] for part in status['parts']] == [100, len(second)]
+    assert fake_ipfs.blobs[result['cid']] == model
+    assert [i['name'] for i in result['input_types']] == ['X', 'N']
+
+def test_small_parts_are_inspected_and_split(client, fake_ipfs, monkeypatch, metadata_store):
+    monkeypatch.setattr(routes, 'ONNX_TENSOR_MIN_BYTES', 1024)
+    model = make_model(weight_shape=(16, 32), initializers=2)
+    upload_id = start_upload(client, 'model.onnx')
+    for number, part in enumerate(split(model, 100), start=1):
+        client.put(f'/multipart_upload/{upload_id}/{number}', data=part)
+
+    result = client.post(f'/multipart_upload/{upload_id}/complete?layout=tensors').get_json()
+
+    # Both read the model through many short parts
+    assert 'onnx_info' in result
+    assert (result['layout'], result['tensors']) == ('tensors', 2)
+    assert client.get(f"/download?cid={result['cid']}").data == model
+
+def test_complete_reports_missing_parts_and_stays_open(client):
+    upload_id = start_upload(client, 'weights.bin')
+    client.put(f'/multipart_upload/{upload_id}/1', data=b'a')
+    client.put(f'/multipart_upload/{upload_id}/3', data=b'c')
+
+    response = client.post(f'/multipart_upload/{upload_id}/complete', json={'parts': [1, 2, 3, 4]})
+
+    assert response.status_code == 400
+    assert response.get_json()['missing_parts'] == [2, 4]
+    assert client.put(f'/multipart_upload/{upload_id}/2', data=b'b').status_code == 200
+
+def test_failed_add_reopens_upload(client, monkeypatch):
+    upload_id = start_upload(client, 'weights.bin')
+    client.put(f'/multipart_upload/{upload_id}/1', data=b'data')
+
+    def fail(file):
+        raise ConnectionError("IPFS is down")
+
+    monkeypatch.setattr(routes.ipfs_client, 'add_stream', fail)
+    assert client.post(f'/multipart_upload/{upload_id}/complete').status_code == 500
+    assert client.get(f'/multipart_upload/{upload_id}').get_json()['state'] == 'open'
+
+def test_part_limits_and_abort(client, monkeypatch, uploads):
+    monkeypatch.setattr(routes, 'MULTIPART_MAX_PART_SIZE', 4)
+    upload_id = start_upload(client, 'weights.bin')
+
+    assert client.put(f'/multipart_upload/{upload_id}/1', data=b'12345').status_code == 413
+    assert client.put(f'/multipart_upload/{upload_id}/0', data=b'1').status_code == 400
+    assert client.put('/multipart_upload/missing/1', data=b'1').status_code == 404
+    assert client.post(f'/multipart_upload/{upload_id}/complete').status_code == 400
+
+    assert client.delete(f'/multipart_upload/{upload_id}').status_code == 200
+    assert client.get(f'/multipart_upload/{upload_id}').status_code == 404
+    assert os.listdir(uploads.spool_dir) == []
+
+class AbortingStream(io.BytesIO):
+    """A part body during whose upload the multipart upload is aborted."""
+
+    def __init__(self, data, abort):
+        super().__init__(data)
+        self.abort = abort
+
+    def _abort_once(self):
+        if self.abort is not None:
+            self.abort, abort = None, self.abort
+            abort()
+
+    def read(self, *args):
+        self._abort_once()
+        return super().read(*args)
+
+    def readinto(self, buffer):
+        self._abort_once()
+        return super().readinto(buffer)
+
+@pytest.mark.parametrize('discard', ['abort', 'expire'])
+def test_parts_sent_while_an_upload_is_discarded_conflict(client, uploads, discard):
+    upload_id = start_upload(client, 'weights.bin')
+    upload = uploads.get(upload_id)
+
+    def abort():
+        if discard == 'abort':
+            assert uploads.abort(upload)
+        else:
+            upload.updated_at = 0
+            uploads.get(upload_id)
+
+    data = b'x' * 1000
+    response = client.put(
+        f'/multipart_upload/{upload_id}/1', input_stream=AbortingStream(data, abort),
+        headers={'Content-Length': str(len(data))},
+    )
+
+    assert response.status_code == 409
+    assert os.listdir(uploads.spool_dir) == []
+
+def test_inactive_uploads_expire(uploads):
+    uploads.ttl = 0
+    upload = uploads.create('weights.bin')
+    upload.updated_at -= 1
+
+    assert uploads.get(upload.id) is None
+    assert not os.path.exists(upload.path)
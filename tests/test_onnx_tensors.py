@@ -0,0 +1,154 @@
+import io
+import time
+import numpy as np
+import onnx
+import pytest
+from onnx import numpy_helper
+from onnx_models import make_model
+
+from api import routes
+from api.cache import CIDCache
+from api.onnx_tensors import TensorData, iter_tensor_data, reassembly_pieces, split_model
+from api.upload_jobs import UploadJobManager
+
+@pytest.fixture(autouse=True)
+def small_tensors(monkeypatch):
+    monkeypatch.setattr(routes, 'ONNX_TENSOR_MIN_BYTES', 1024)
+
+def initializers(data):
+    return {tensor.name: numpy_helper.to_array(tensor) for tensor in onnx.load_from_string(data).graph.initializer}
+
+def upload(client, data, filename='model.onnx', layout='tensors', mode=''):
+    return client.post(f'/upload?layout={layout}&{mode}', data={'file': (io.BytesIO(data), filename)})
+
+def add_count(fake_ipfs):
+    return [path for path, _ in fake_ipfs.requests].count('/api/v0/add')
+
+def test_split_and_reassemble_round_trip():
+    model = make_model(weight_shape=(16, 32), initializers=3)
+    graph, tensors = split_model(lambda offset, length: model[offset:offset + length], len(model), 1024)
+
+    assert [tensor['name'] for tensor in tensors] == ['W0', 'W1', 'W2']
+    assert len(graph) < len(model) - sum(tensor['length'] for tensor in tensors) + 1024
+    # The graph alone is a valid model that refers to its tensors as external data
+    external = onnx.load_from_string(graph).graph.initializer
+    assert all(tensor.data_location == onnx.TensorProto.EXTERNAL for tensor in external)
+
+    file = io.BytesIO(model)
+    data = {tensor['location']: b''.join(iter_tensor_data(file, tensor)) for tensor in tensors}
+    pieces = reassembly_pieces(graph, {location: len(content) for location, content in data.items()})
+    rebuilt = b''.join(data[piece.location] if isinstance(piece, TensorData) else piece for piece in pieces)
+
+    assert len(rebuilt) == len(model)
+    assert onnx.load_from_string(rebuilt) == onnx.load_from_string(model)
+
+def test_tensors_upload_downloads_as_one_model(client, fake_ipfs, metadata_store):
+    model = make_model(weight_shape=(16, 32), initializers=2)
+
+    response = upload(client, model)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['layout'], body['tensors'], body['tensors_reused']) == ('tensors', 2, 0)
+    assert body['input_types'][0]['name'] == 'X'
+    manifest = metadata_store.get_manifest(body['cid'])
+    assert [tensor['name'] for tensor in manifest['tensors']] == ['W0', 'W1']
+
+    downloaded = client.get(f'/download?cid={body["cid"]}')
+    assert downloaded.status_code == 200
+    assert downloaded.content_length == len(downloaded.data) == len(model)
+    assert metadata_store.get(body['cid'])['size'] == len(model)
+    original = initializers(model)
+    for name, array in initializers(downloaded.data).items():
+        np.testing.assert_array_equal(array, original[name])
+
+    # A range spanning graph bytes and the middle of a tensor
+    partial = client.get(f'/download?cid={body["cid"]}', headers={'Range': 'bytes=100-2999'})
+    assert partial.status_code == 206
+    assert partial.data == downloaded.data[100:3000]
+
+@pytest.mark.parametrize('offload', ['off', 'gateway', 'accel'])
+def test_raw_download_and_size_are_of_the_model(client, fake_ipfs, monkeypatch, tmp_path, offload):
+    monkeypatch.setattr(routes, 'cid_cache', CIDCache(str(tmp_path / 'cache'), max_bytes=1024 * 1024))
+    monkeypatch.setattr(routes, 'DOWNLOAD_OFFLOAD', offload)
+    model = make_model(weight_shape=(16, 32), initializers=2)
+    cid = upload(client, model).get_json()['cid']
+    # The manifest's own bytes in the cache must not be served for it
+    b''.join(routes.cid_cache.stream(cid, routes.ipfs_client.cat_stream))
+
+    for _ in range(2):
+        raw = client.get(f'/download_raw?cid={cid}')
+        assert raw.status_code == 200
+        assert raw.content_length == len(raw.data) == len(model)
+        assert initializers(raw.data).keys() == initializers(model).keys()
+    assert client.get(f'/get_file_size?cid={cid}').get_json()['size'] == len(model)
+
+def test_manifest_is_found_by_cid_on_another_instance(client, fake_ipfs, monkeypatch):
+    model = make_model(weight_shape=(16, 32))
+    cid = upload(client, model).get_json()['cid']
+    monkeypatch.setattr(routes, 'metadata_store', type(routes.metadata_store)(':memory:'))
+
+    # Without the layout hint the manifest itself is served
+    assert client.get(f'/download?cid={cid}').data.startswith(b'{')
+    assert len(client.get(f'/download?cid={cid}&layout=tensors').data) == len(model)
+    assert len(client.get(f'/download_raw?cid={cid}&layout=tensors').data) == len(model)
+    assert client.get(f'/get_file_size?cid={cid}&layout=tensors').get_json()['size'] == len(model)
+
+def test_variant_upload_reuses_shared_tensors(client, fake_ipfs):
+    model = make_model(weight_shape=(16, 32), initializers=3)
+    variant = onnx.load_from_string(model)
+    variant.graph.initializer[2].CopyFrom(numpy_helper.from_array(np.ones((32, 32), dtype=np.float32), 'W2'))
+
+    upload(client, model)
+    adds = add_count(fake_ipfs)
+    body = upload(client, variant.SerializeToString(), filename='variant.onnx').get_json()
+
+    assert body['tensors_reused'] == 2
+    # One new tensor, the graph and the manifest
+    assert add_count(fake_ipfs) - adds == 3
+    np.testing.assert_array_equal(initializers(client.get(f'/download?cid={body["cid"]}').data)['W2'], 1)
+
+def test_files_that_cannot_be_split_are_stored_whole(client, fake_ipfs):
+    body = upload(client, b'not a model', filename='broken.onnx').get_json()
+
+    assert 'layout' not in body
+    assert client.get(f'/download?cid={body["cid"]}').data == b'not a model'
+    assert upload(client, b'x', layout='shards').status_code == 400
+
+def test_async_upload_is_split(client, fake_ipfs, monkeypatch, tmp_path):
+    monkeypatch.setattr(routes, 'upload_jobs', UploadJobManager(spool_dir=str(tmp_path / 'spool'), max_workers=1))
+    model = make_model(weight_shape=(16, 32), initializers=2)
+
+    response = upload(client, model, mode='async=true')
+    assert response.status_code == 202
+    deadline = time.time() + 10
+    while (status := client.get(f'/upload_status?job={response.get_json()["job"]}').get_json())['phase'] != 'done':
+        assert status['phase'] != 'failed' and time.time() < deadline
+        time.sleep(0.02)
+
+    assert (status['layout'], status['tensors']) == ('tensors', 2)
+    assert status['bytes_processed'] == len(model)
+    assert len(client.get(f'/download?cid={status["cid"]}').data) == len(model)
+    assert upload(client, model).get_json()['cid'] == status['cid']
+
+def test_streaming_upload_refuses_the_tensors_layout(client, fake_ipfs, monkeypatch):
+    model = make_model(weight_shape=(16, 32))
+
+    assert upload(client, model, mode='stream=true').status_code == 400
+    assert upload(client, model, layout='blob', mode='stream=true').get_json()['cid'] in fake_ipfs.blobs
+    # The configured default is refused too, but only matters for models
+    monkeypatch.setattr(routes, 'ONNX_STORAGE_LAYOUT', 'tensors')
+    stream = lambda data, filename: client.post('/upload?stream=true', data={'file': (io.BytesIO(data), filename)})
+    assert stream(model, 'model.onnx').status_code == 400
+    assert stream(b'weights', 'weights.bin').status_code == 200
+
+def test_layout_hint_reads_a_bounded_prefix(client, fake_ipfs, monkeypatch):
+    monkeypatch.setattr(routes, 'MANIFEST_MAX_BYTES', 1024)
+    cid = fake_ipfs.put(b'x' * 100000)
+
+    assert client.get(f'/download?cid={cid}&layout=tensors').status_code == 400
+    assert client.get(f'/download_raw?cid={cid}&layout=tensors').status_code == 400
+    assert client.get(f'/get_file_size?cid={cid}&layout=tensors').status_code == 400
+    cats = [params for path, params in fake_ipfs.requests if path == '/api/v0/cat']
+    assert [int(params['length']) for params in cats] == [1025] * 3
+    assert client.get(f'/download?cid={fake_ipfs.put(b"[1, 2]")}&layout=tensors').status_code == 400
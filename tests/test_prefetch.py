@@ -0,0 +1,83 @@
+import time
+import pytest
+
+from api.prefetch import CIDPrefetcher
+
+def slow_fetch(delay, chunk_size=1024, chunks=4):
+    def fetch(cid):
+        time.sleep(delay)
+        for i in range(chunks):
+            yield f"{cid}:{i}:".encode().ljust(chunk_size, b'.')
+    return fetch
+
+def collect(prefetcher):
+    try:
+        return [(name, b''.join(chunks)) for name, chunks in prefetcher.entries()]
+    finally:
+        prefetcher.close()
+
+def test_prefetch_preserves_order():
+    files = [(f"file_{i}", f"cid{i}") for i in range(10)]
+    fetch = slow_fetch(0)
+
+    result = collect(CIDPrefetcher(fetch, files, max_workers=4))
+
+    assert [name for name, _ in result] == [name for name, _ in files]
+    for (name, data), (_, cid) in zip(result, files):
+        assert data == b''.join(fetch(cid))
+
+def test_prefetch_fetches_concurrently():
+    files = [(f"file_{i}", f"cid{i}") for i in range(8)]
+
+    start = time.time()
+    collect(CIDPrefetcher(slow_fetch(0.2), files, max_workers=8))
+    elapsed = time.time() - start
+
+    assert elapsed < 0.2 * len(files) / 2
+
+def test_prefetch_respects_inflight_budget():
+    files = [(f"file_{i}", f"cid{i}") for i in range(6)]
+    budget = 4 * 1024
+    prefetcher = CIDPrefetcher(slow_fetch(0, chunks=16), files, max_workers=6, max_inflight_bytes=budget)
+    peak = 0
+
+    for name, chunks in prefetcher.entries():
+        for _ in chunks:
+            time.sleep(0.001)
+            peak = max(peak, prefetcher._inflight_bytes)
+    prefetcher.close()
+
+    # The file being consumed may hold one chunk beyond the budget
+    assert peak <= budget + 1024
+
+def test_prefetch_skips_files_that_fail_to_open():
+    def fetch(cid):
+        if cid == 'missing':
+            raise ValueError("block was not found locally")
+        yield cid.encode()
+
+    result = collect(CIDPrefetcher(fetch, [('a', 'one'), ('b', 'missing'), ('c', 'three')]))
+
+    assert result == [('a', b'one'), ('c', b'three')]
+
+def test_prefetch_raises_errors_after_partial_data():
+    def fetch(cid):
+        yield b'partial'
+        raise IOError("connection reset")
+
+    prefetcher = CIDPrefetcher(fetch, [('a', 'cid')])
+    name, chunks = next(prefetcher.entries())
+
+    with pytest.raises(IOError):
+        b''.join(chunks)
+    prefetcher.close()
+
+def test_prefetch_close_releases_blocked_workers():
+    files = [(f"file_{i}", f"cid{i}") for i in range(4)]
+    prefetcher = CIDPrefetcher(slow_fetch(0, chunks=64), files, max_workers=4, max_inflight_bytes=2048)
+    next(prefetcher.entries())
+
+    prefetcher.close()
+    prefetcher._executor.shutdown(wait=True)
+
+    assert not [t for t in prefetcher._executor._threads if t.is_alive()]
@@ -0,0 +1,95 @@
+import io
+import os
+import threading
+import time
+import pytest
+from onnx_models import make_model
+
+from api import profiling, routes
+from api.cache import CIDCache
+
+@pytest.fixture(autouse=True)
+def profile_store(monkeypatch):
+    store = profiling.ProfileStore()
+    monkeypatch.setattr(routes, 'profile_store', store)
+    return store
+
+def test_profile_store_keeps_most_recent():
+    store = profiling.ProfileStore(max_entries=2)
+    for index in range(3):
+        store.add({"id": str(index), "endpoint": '/x', "method": 'GET', "status": 200, "started_at": index, "duration": 0.1})
+
+    assert store.get('0') is None
+    assert [summary['id'] for summary in store.summaries()] == ['2', '1']
+
+def test_sampler_collects_collapsed_stacks():
+    trace = profiling.start_trace('/busy', 'GET', sample=True)
+    deadline = time.perf_counter() + 0.1
+    while time.perf_counter() < deadline:
+        pass
+    profile = profiling.end_trace(trace, 200)
+
+    assert profile['samples'] > 0
+    assert any('test_sampler_collects_collapsed_stacks' in stack for stack in profile['stacks'])
+
+def test_requested_profile_records_phases_and_stacks(client, monkeypatch):
+    monkeypatch.setattr(routes, 'PROFILING_ENABLED', True)
+
+    response = client.post('/upload?profile=true', data={'file': (io.BytesIO(make_model()), 'model.onnx')})
+    response.close()
+
+    assert response.status_code == 200
+    profile_id = response.headers['X-Profile-Id']
+    profile = client.get(f'/profiles/{profile_id}').get_json()
+    assert profile['endpoint'] == '/upload'
+    assert profile['status'] == 200
+    names = [phase['name'] for phase in profile['phases']]
+    assert {'upload_phase:receive', 'upload_phase:inspect', 'upload_phase:ipfs_add', 'ipfs:add_stream'} <= set(names)
+    assert 'stacks' in profile
+    collapsed = client.get(f'/profiles/{profile_id}?format=collapsed')
+    assert collapsed.mimetype == 'text/plain'
+    assert [summary['id'] for summary in client.get('/profiles').get_json()] == [profile_id]
+
+def test_profile_header_is_ignored_when_disabled(client, monkeypatch):
+    monkeypatch.setattr(routes, 'PROFILING_ENABLED', False)
+    monkeypatch.setattr(routes, 'PROFILE_SLOW_THRESHOLD', 0)
+
+    response = client.get('/cache_stats', headers={'X-Profile': '1'})
+
+    assert 'X-Profile-Id' not in response.headers
+    assert client.get('/profiles').status_code == 404
+    assert client.get('/profiles/missing').status_code == 404
+
+def test_slow_requests_are_captured_automatically(client, fake_ipfs, monkeypatch):
+    monkeypatch.setattr(routes, 'PROFILING_ENABLED', False)
+    cid = fake_ipfs.put(os.urandom(1024))
+
+    monkeypatch.setattr(routes, 'PROFILE_SLOW_THRESHOLD', 60)
+    client.get(f'/download_raw?cid={cid}').close()
+    assert client.get('/profiles').get_json() == []
+
+    monkeypatch.setattr(routes, 'PROFILE_SLOW_THRESHOLD', 1e-9)
+    response = client.get(f'/download_raw?cid={cid}')
+    response.close()
+
+    assert 'X-Profile-Id' not in response.headers
+    summaries = client.get('/profiles').get_json()
+    assert [summary['endpoint'] for summary in summaries] == ['/download_raw']
+    profile = client.get(f"/profiles/{summaries[0]['id']}").get_json()
+    assert 'stacks' not in profile
+    assert any(phase['name'] == 'ipfs:cat' for phase in profile['phases'])
+
+def test_cache_hit_profiles_finish(client, fake_ipfs, monkeypatch, tmp_path):
+    monkeypatch.setattr(routes, 'PROFILING_ENABLED', True)
+    monkeypatch.setattr(routes, 'cid_cache', CIDCache(str(tmp_path / 'cache'), max_bytes=1024 * 1024))
+    cid = fake_ipfs.put(os.urandom(1024))
+    client.get(f'/download_raw?cid={cid}').close()
+
+    # Cache hits are passed through to the server, so the trace ends when it closes the body
+    response = client.get(f'/download_raw?cid={cid}', headers={'X-Profile': '1'})
+    response.get_data()
+    response.close()
+
+    profile = client.get(f"/profiles/{response.headers['X-Profile-Id']}").get_json()
+    assert profile['status'] == 200
+    assert not any(thread.name == 'request-profiler' for thread in threading.enumerate())
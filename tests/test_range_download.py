@@ -0,0 +1,99 @@
+import os
+import pytest
+
+from api import routes
+from api.cache import CIDCache
+from api.ipfs_client import IPFSClient
+
+CONTENT = os.urandom(256 * 1024)
+
+@pytest.fixture(params=['ipfs', 'cache'])
+def setup(request, client, fake_ipfs, monkeypatch, tmp_path):
+    cache = CIDCache(str(tmp_path / 'cache'), max_bytes=1024 * 1024)
+    monkeypatch.setattr(routes, 'cid_cache', cache)
+    cid = fake_ipfs.put(CONTENT)
+    if request.param == 'cache':
+        b''.join(cache.stream(cid, routes.ipfs_client.cat_stream))
+    return client, cid, request.param
+
+@pytest.mark.parametrize("endpoint", ['/download', '/download_raw'])
+def test_single_range(setup, fake_ipfs, endpoint):
+    client, cid, source = setup
+
+    response = client.get(f'{endpoint}?cid={cid}', headers={'Range': 'bytes=1000-1999'})
+
+    assert response.status_code == 206
+    assert response.data == CONTENT[1000:2000]
+    assert response.headers['Content-Range'] == f'bytes 1000-1999/{len(CONTENT)}'
+    assert response.headers['Content-Length'] == '1000'
+    assert response.headers['ETag'] == f'"{cid}"'
+    if source == 'ipfs':
+        assert ('/api/v0/cat', {'arg': cid, 'offset': '1000', 'length': '1000'}) in fake_ipfs.requests
+
+@pytest.mark.parametrize("endpoint", ['/download', '/download_raw'])
+def test_suffix_range_to_resume(setup, endpoint):
+    client, cid, _ = setup
+
+    response = client.get(f'{endpoint}?cid={cid}', headers={'Range': 'bytes=200000-'})
+
+    assert response.status_code == 206
+    assert response.data == CONTENT[200000:]
+
+def test_full_download_advertises_ranges(setup):
+    client, cid, _ = setup
+
+    response = client.get(f'/download_raw?cid={cid}')
+
+    assert response.status_code == 200
+    assert response.data == CONTENT
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['ETag'] == f'"{cid}"'
+
+def test_if_range_mismatch_sends_whole_object(setup):
+    client, cid, _ = setup
+
+    response = client.get(f'/download_raw?cid={cid}', headers={'Range': 'bytes=0-99', 'If-Range': '"QmOther"'})
+
+    assert response.status_code == 200
+    assert response.data == CONTENT
+
+def test_if_range_match_sends_range(setup):
+    client, cid, _ = setup
+
+    response = client.get(f'/download_raw?cid={cid}', headers={'Range': 'bytes=0-99', 'If-Range': f'"{cid}"'})
+
+    assert response.status_code == 206
+    assert response.data == CONTENT[:100]
+
+def test_multiple_ranges_send_whole_object(setup):
+    client, cid, _ = setup
+
+    response = client.get(f'/download_raw?cid={cid}', headers={'Range': 'bytes=0-9,20-29'})
+
+    assert response.status_code == 200
+    assert response.data == CONTENT
+
+@pytest.mark.parametrize("endpoint", ['/download', '/download_raw'])
+def test_unsatisfiable_range(setup, endpoint):
+    client, cid, _ = setup
+
+    response = client.get(f'{endpoint}?cid={cid}', headers={'Range': f'bytes={len(CONTENT)}-'})
+
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(CONTENT)}'
+
+def test_abandoned_ranges_release_their_ipfs_connection(client, fake_ipfs, monkeypatch):
+    ipfs = IPFSClient(base_url=fake_ipfs.base_url, pool_size=2, pool_timeout=5)
+    monkeypatch.setattr(routes, 'ipfs_client', ipfs)
+    cid = fake_ipfs.put(CONTENT)
+    headers = {'Range': 'bytes=0-99'}
+
+    # HEAD never iterates the body, and a client that disconnects stops early
+    for _ in range(3):
+        with client.head(f'/download_raw?cid={cid}', headers=headers) as response:
+            assert response.status_code == 206
+        with client.get(f'/download_raw?cid={cid}', headers=headers, buffered=False) as response:
+            next(response.response)
+
+    assert ipfs.node_stats()[0]['outstanding'] == 0
+    assert client.get(f'/download_raw?cid={cid}', headers=headers).data == CONTENT[:100]
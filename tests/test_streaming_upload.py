@@ -0,0 +1,104 @@
+import hashlib
+import os
+import tracemalloc
+import pytest
+from fake_ipfs import FakeIPFSServer, fake_cid
+
+from api import routes
+from api.ipfs_client import IPFSClient
+
+STREAM_TEST_SIZE_MB = int(os.environ.get('STREAM_TEST_SIZE_MB', 2048))
+MEMORY_CEILING_MB = 64
+BOUNDARY = 'streamingtestboundary'
+
+def sparse_digest(size, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    zeros = bytes(chunk_size)
+    remaining = size
+    while remaining:
+        n = min(chunk_size, remaining)
+        digest.update(zeros[:n])
+        remaining -= n
+    return digest.hexdigest()
+
+def create_multipart_file(path, filename, size, content=None, fields=None):
+    """Write a multipart/form-data body to disk; the file part is sparse unless content is given."""
+    head = b''.join(
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in (fields or {}).items()
+    )
+    head += (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        'Content-Type: application/octet-stream\r\n\r\n'
+    ).encode()
+    with open(path, 'wb') as f:
+        f.write(head)
+        if content is not None:
+            f.write(content)
+        else:
+            f.seek(size, 1)
+        f.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+    return path
+
+def post_multipart(client, path):
+    with open(path, 'rb') as body:
+        return client.post(
+            '/upload?stream=true',
+            input_stream=body,
+            content_type=f'multipart/form-data; boundary={BOUNDARY}',
+        )
+
+@pytest.fixture
+def streaming_ipfs(app, monkeypatch):
+    server = FakeIPFSServer(store_content=False).start()
+    monkeypatch.setattr(routes, 'ipfs_client', IPFSClient(base_url=server.base_url))
+    yield server
+    server.stop()
+
+def test_add_stream_sends_file_in_chunks(fake_ipfs):
+    ipfs_client = IPFSClient(base_url=fake_ipfs.base_url)
+    data = os.urandom(3 * 1024 * 1024 + 17)
+
+    cid = ipfs_client.add_stream(iter([data[:1000], data[1000:]]))
+
+    assert cid == fake_cid(hashlib.sha256(data).hexdigest())
+    assert ipfs_client.cat(cid) == data
+
+def test_streaming_upload_small_file(client, fake_ipfs, monkeypatch, tmp_path):
+    content = os.urandom(100 * 1024)
+    path = create_multipart_file(tmp_path / 'body', 'model.bin', len(content), content, fields={'stream': 'true'})
+
+    response = post_multipart(client, path)
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['filename'] == 'model.bin'
+    assert data['size'] == 100 * 1024
+    assert fake_ipfs.blobs[data['cid']] == content
+
+def test_streaming_upload_rejects_oversized_request(client, streaming_ipfs, monkeypatch):
+    monkeypatch.setattr(routes, 'MAX_FILE_SIZE', 1024)
+
+    response = client.post(
+        '/upload?stream=true',
+        data={'file': (open(__file__, 'rb'), 'big.bin')},
+    )
+
+    assert response.status_code == 413
+
+def test_streaming_upload_memory_is_bounded(client, streaming_ipfs, tmp_path):
+    size = STREAM_TEST_SIZE_MB * 1024 * 1024
+    path = create_multipart_file(tmp_path / 'body', 'large_model.bin', size)
+
+    # Traces this upload's allocations alone, unlike the process-wide peak RSS
+    tracemalloc.start()
+    try:
+        response = post_multipart(client, path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert response.status_code == 200
+    assert response.get_json()['size'] == size
+    assert response.get_json()['cid'] == fake_cid(sparse_digest(size))
+    assert peak < MEMORY_CEILING_MB * 1024 * 1024
@@ -0,0 +1,85 @@
+import io
+import os
+import time
+import pytest
+from onnx_models import make_model
+
+from api import routes
+from api.upload_jobs import UploadJobManager
+
+@pytest.fixture(autouse=True)
+def jobs(monkeypatch, tmp_path):
+    manager = UploadJobManager(spool_dir=str(tmp_path / 'spool'), max_workers=1)
+    monkeypatch.setattr(routes, 'upload_jobs', manager)
+    return manager
+
+def wait_for_job(client, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(f'/upload_status?job={job_id}').get_json()
+        if status['phase'] in ('done', 'failed'):
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"Upload job {job_id} did not finish")
+
+def test_async_upload_returns_job_and_completes(client, fake_ipfs, jobs, metadata_store):
+    model = make_model()
+
+    response = client.post('/upload?async=true', data={'file': (io.BytesIO(model), 'model.onnx')})
+
+    assert response.status_code == 202
+    job_id = response.get_json()['job']
+    status = wait_for_job(client, job_id)
+    assert status['phase'] == 'done'
+    assert fake_ipfs.blobs[status['cid']] == model
+    assert status['bytes_total'] == status['bytes_processed'] == len(model)
+    assert [i['name'] for i in status['input_types']] == ['X', 'N']
+    assert status['onnx_info']['producer_name'] == 'vanna-tests'
+    assert metadata_store.get(status['cid'])['filename'] == 'model.onnx'
+    assert os.listdir(jobs.spool_dir) == []
+
+def test_async_upload_of_known_content_skips_ipfs(client, fake_ipfs):
+    model = make_model()
+    first = client.post('/upload', data={'file': (io.BytesIO(model), 'model.onnx')}).get_json()
+    requests_after_first = len(fake_ipfs.requests)
+
+    response = client.post('/upload?async=true', data={'file': (io.BytesIO(model), 'model.onnx')})
+    status = wait_for_job(client, response.get_json()['job'])
+
+    assert status['phase'] == 'done'
+    assert status['cid'] == first['cid']
+    assert status['deduplicated'] is True
+    assert status['input_types'] == first['input_types']
+    assert len(fake_ipfs.requests) == requests_after_first
+
+def test_async_upload_reports_failure(client, monkeypatch):
+    def broken_add(chunks, **kwargs):
+        raise ConnectionError("IPFS node unreachable")
+
+    monkeypatch.setattr(routes.ipfs_client, 'add_stream', broken_add)
+
+    job_id = client.post('/upload?async=true', data={'file': (io.BytesIO(b'data'), 'a.bin')}).get_json()['job']
+    status = wait_for_job(client, job_id)
+
+    assert status['phase'] == 'failed'
+    assert 'IPFS node unreachable' in status['error']
+    assert 'cid' not in status
+
+def test_async_upload_rejects_oversized_file(client, monkeypatch, jobs):
+    monkeypatch.setattr(routes, 'MAX_FILE_SIZE', 1024)
+
+    response = client.post('/upload?async=true', data={'file': (io.BytesIO(b'x' * 4096), 'big.bin')})
+
+    assert response.status_code == 413
+
+def test_finished_jobs_expire(jobs):
+    jobs.ttl = 0
+    job = jobs.create('a.bin')
+    jobs.fail(job, "cancelled")
+    time.sleep(0.01)
+
+    assert jobs.get(job.id) is None
+
+def test_upload_status_errors(client):
+    assert client.get('/upload_status').status_code == 400
+    assert client.get('/upload_status?job=unknown').status_code == 404
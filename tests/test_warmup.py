@@ -0,0 +1,82 @@
+import os
+import runpy
+import threading
+from types import SimpleNamespace
+import pytest
+
+from api import routes
+from api.cache import CIDCache
+from api.warmup import Warmup
+
+@pytest.fixture(autouse=True)
+def warmup(monkeypatch):
+    warmup = Warmup(workers=2)
+    monkeypatch.setattr(routes, 'warmup', warmup)
+    return warmup
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    cache = CIDCache(str(tmp_path / 'cache'), max_bytes=10 * 1024 * 1024)
+    monkeypatch.setattr(routes, 'cid_cache', cache)
+    return cache
+
+def test_warmup_pins_and_caches(client, fake_ipfs, warmup, cache):
+    first = fake_ipfs.put(b'a' * 1000)
+    second = fake_ipfs.put(b'b' * 2000)
+
+    response = client.post('/warmup', json={'cids': [first, second, 'QmMissing']})
+    assert response.status_code == 202
+    assert warmup.wait(10)
+
+    status = client.get('/warmup').get_json()
+    assert (status['state'], status['total'], status['done'], status['failed']) == ('finished', 3, 2, 1)
+    assert status['bytes_cached'] == 3000
+    assert fake_ipfs.pins == {first, second}
+    assert cache.contains(first) and cache.contains(second)
+
+    # Warm CIDs are served from the cache without going to IPFS
+    requests_before = len(fake_ipfs.requests)
+    assert client.get(f'/download_raw?cid={first}').data == b'a' * 1000
+    assert len(fake_ipfs.requests) == requests_before
+
+def test_cached_cids_are_only_pinned(client, fake_ipfs, warmup, cache):
+    cid = fake_ipfs.put(b'a' * 1000)
+    b''.join(cache.stream(cid, routes.ipfs_client.cat_stream))
+
+    client.post('/warmup', json={'cids': [cid]})
+    assert warmup.wait(10)
+
+    assert warmup.status()['cids'][0]['bytes_cached'] == 0
+    assert [path for path, _ in fake_ipfs.requests].count('/api/v0/cat') == 1
+    assert fake_ipfs.pins == {cid}
+
+def test_only_one_warmup_runs_at_a_time(client, warmup):
+    release = threading.Event()
+
+    assert warmup.start(['QmA'], pin=lambda cid: release.wait(10))
+    assert client.get('/warmup').get_json()['state'] == 'running'
+    assert client.post('/warmup', json={'cids': ['QmB']}).status_code == 409
+    release.set()
+    assert warmup.wait(10)
+    assert client.post('/warmup', json={'cids': 'QmB'}).status_code == 400
+
+def test_warmup_cids_combine_configured_and_most_downloaded(client, monkeypatch, metadata_store):
+    monkeypatch.setattr(routes, 'WARMUP_CIDS', 'QmConfigured, QmHot')
+    monkeypatch.setattr(routes, 'WARMUP_TOP', 2)
+    for cid, count in (('QmHot', 3), ('QmWarm', 2), ('QmCold', 1)):
+        for _ in range(count):
+            client.get(f'/download_raw?cid={cid}')
+
+    assert routes.warmup_cids() == ['QmConfigured', 'QmHot', 'QmWarm']
+
+def test_gunicorn_workers_start_the_configured_warmup(client, fake_ipfs, monkeypatch, warmup, cache):
+    cid = fake_ipfs.put(b'a' * 1000)
+    monkeypatch.setattr(routes, 'WARMUP_CIDS', cid)
+    config = runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'gunicorn.conf.py'))
+
+    # Called in each worker after it is forked and has loaded the app
+    config['post_worker_init'](SimpleNamespace(cfg=SimpleNamespace(threads=5)))
+
+    assert warmup.wait(10)
+    assert warmup.status()['done'] == 1
+    assert cache.contains(cid)